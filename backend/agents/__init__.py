@@ -1,4 +1,12 @@
-from .orchestrator import DiagramOrchestrator
-from .base_agent import BaseAgent
-
 __all__ = ['DiagramOrchestrator', 'BaseAgent']
+
+
+def __getattr__(name):
+    # Importing a single agent module should not load the whole pipeline
+    if name == 'DiagramOrchestrator':
+        from .orchestrator import DiagramOrchestrator
+        return DiagramOrchestrator
+    if name == 'BaseAgent':
+        from .base_agent import BaseAgent
+        return BaseAgent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
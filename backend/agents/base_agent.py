@@ -1,7 +1,9 @@
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Optional
 from pydantic import BaseModel
-import google.generativeai as genai
+from services.metrics import LLM_CACHE_HITS, LLM_TOKENS, span
+from .llm_client import get_llm_client
+from .cache import get_response_cache, response_cache_bypassed, LLM_CACHE_ENABLED, LLM_CACHE_DISABLED_AGENTS
 
 
 class AgentResult(BaseModel):
@@ -12,17 +14,59 @@ class AgentResult(BaseModel):
 
 
 class BaseAgent(ABC):
+    cache_responses = True
+
     def __init__(self, model_name: str = "gemini-pro"):
-        self.model = genai.GenerativeModel(model_name)
+        self.model_name = model_name
+        self.llm = get_llm_client(model_name)
         self.agent_name = self.__class__.__name__
+        self.cache = None
+        if LLM_CACHE_ENABLED and self.cache_responses and self.agent_name not in LLM_CACHE_DISABLED_AGENTS:
+            self.cache = get_response_cache()
 
     @abstractmethod
     async def execute(self, input_data: Dict[str, Any]) -> AgentResult:
         pass
 
-    async def generate_content(self, prompt: str) -> str:
+    async def generate_content(
+        self,
+        prompt: str,
+        on_chunk: Optional[Callable[[str], None]] = None
+    ) -> str:
         try:
-            response = self.model.generate_content(prompt)
-            return response.text
+            with span('llm', self.agent_name, model=self.model_name) as attributes:
+                cache_key = None
+                if self.cache is not None:
+                    cache_key = self.cache.make_key(self.model_name, prompt)
+                    # A bypassed lookup still stores the fresh response over the old one
+                    cached = None if response_cache_bypassed() else await self.cache.get(cache_key)
+                    if cached is not None:
+                        attributes['cached'] = True
+                        LLM_CACHE_HITS.labels(self.agent_name).inc()
+                        text = cached.decode('utf-8')
+                        if on_chunk:
+                            on_chunk(text)
+                        return text
+
+                if on_chunk:
+                    chunks = []
+                    async for chunk in self.llm.generate_stream(prompt):
+                        chunks.append(chunk)
+                        on_chunk(chunk)
+                    text = ''.join(chunks)
+                else:
+                    text = await self.llm.generate(prompt)
+
+                LLM_TOKENS.labels(self.agent_name, 'prompt').inc(attributes.get('prompt_tokens', 0))
+                LLM_TOKENS.labels(self.agent_name, 'response').inc(attributes.get('response_tokens', 0))
+
+                if cache_key is not None:
+                    await self.cache.set(cache_key, text.encode('utf-8'))
+                return text
         except Exception as e:
             raise Exception(f"{self.agent_name} generation error: {str(e)}")
+
+    async def forget(self, prompt: str) -> None:
+        # Drops a cached response whose output turned out to be unusable
+        if self.cache is not None:
+            await self.cache.delete(self.cache.make_key(self.model_name, prompt))
@@ -0,0 +1,222 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+
+class ContentCache:
+    def __init__(
+        self,
+        name: str,
+        max_entries: int = 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_seconds: float = 86400,
+        disk_dir: Optional[str] = None,
+        disk_max_bytes: int = 512 * 1024 * 1024
+    ):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.stats = {'hits': 0, 'misses': 0, 'disk_hits': 0, 'evictions': 0}
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._disk_bytes: Optional[int] = None
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        value = self._memory_get(key)
+        if value is not None:
+            self.stats['hits'] += 1
+            return value
+
+        if self.disk_dir:
+            value = await asyncio.to_thread(self._disk_get, key)
+            if value is not None:
+                self.stats['hits'] += 1
+                self.stats['disk_hits'] += 1
+                self._memory_set(key, value)
+                return value
+
+        self.stats['misses'] += 1
+        return None
+
+    async def set(self, key: str, value: bytes) -> None:
+        self._memory_set(key, value)
+        if self.disk_dir:
+            await asyncio.to_thread(self._disk_set, key, value)
+
+    async def delete(self, key: str) -> None:
+        if key in self._entries:
+            self._memory_remove(key)
+        if self.disk_dir:
+            await asyncio.to_thread(self._disk_delete, key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def summary(self) -> Dict[str, int]:
+        return {**self.stats, 'entries': len(self._entries), 'bytes': self._bytes}
+
+    def _memory_get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._memory_remove(key)
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def _memory_set(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._memory_remove(key)
+
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._bytes += len(value)
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._memory_remove(oldest)
+            self.stats['evictions'] += 1
+
+    def _memory_remove(self, key: str) -> None:
+        _, value = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], key)
+
+    def _disk_get(self, key: str) -> Optional[bytes]:
+        path = self._disk_path(key)
+        try:
+            if os.path.getmtime(path) + self.ttl_seconds < time.time():
+                os.remove(path)
+                return None
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _disk_delete(self, key: str) -> None:
+        path = self._disk_path(key)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        if self._disk_bytes is not None:
+            self._disk_bytes -= size
+
+    def _disk_set(self, key: str, value: bytes) -> None:
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(value)
+        os.replace(tmp_path, path)
+
+        if self._disk_bytes is None:
+            self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+        else:
+            self._disk_bytes += len(value)
+
+        if self._disk_bytes > self.disk_max_bytes:
+            self._disk_evict()
+
+    def _disk_files(self):
+        for root, _, files in os.walk(self.disk_dir):
+            for filename in files:
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _disk_evict(self) -> None:
+        # Drop expired and least recently written files until 90% of the budget is free
+        files = sorted(self._disk_files(), key=lambda f: f[2])
+        total = sum(size for _, size, _ in files)
+        target = self.disk_max_bytes * 0.9
+        cutoff = time.time() - self.ttl_seconds
+
+        for path, size, mtime in files:
+            if total <= target and mtime >= cutoff:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                self.stats['evictions'] += 1
+            except OSError:
+                pass
+
+        self._disk_bytes = total
+
+
+def cache_from_env(name: str, prefix: str, max_entries: int, max_mb: int, disk_max_mb: int) -> ContentCache:
+    return ContentCache(
+        name,
+        max_entries=int(os.getenv(f"{prefix}_MAX_ENTRIES", str(max_entries))),
+        max_bytes=int(os.getenv(f"{prefix}_MAX_MB", str(max_mb))) * 1024 * 1024,
+        ttl_seconds=float(os.getenv(f"{prefix}_TTL_SECONDS", "86400")),
+        disk_dir=os.getenv(f"{prefix}_DIR") or None,
+        disk_max_bytes=int(os.getenv(f"{prefix}_DISK_MAX_MB", str(disk_max_mb))) * 1024 * 1024
+    )
+
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_DISABLED_AGENTS = {
+    name.strip() for name in os.getenv("LLM_CACHE_DISABLED_AGENTS", "").split(",") if name.strip()
+}
+
+# Set for the whole generation when a user retries, so no agent replays a
+# response that may be what made the first attempt fail
+_cache_bypass: ContextVar[bool] = ContextVar('llm_cache_bypass', default=False)
+
+_response_cache: Optional[ContentCache] = None
+_render_cache: Optional[ContentCache] = None
+
+
+def get_response_cache() -> ContentCache:
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = cache_from_env('llm_responses', 'LLM_CACHE', 1024, 64, 512)
+    return _response_cache
+
+
+def get_render_cache() -> ContentCache:
+    global _render_cache
+    if _render_cache is None:
+        _render_cache = cache_from_env('renders', 'RENDER_CACHE', 256, 256, 2048)
+    return _render_cache
+
+
+def bypass_response_cache() -> None:
+    _cache_bypass.set(True)
+
+
+def response_cache_bypassed() -> bool:
+    return _cache_bypass.get()
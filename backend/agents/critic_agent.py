@@ -1,5 +1,37 @@
-from typing import Any, Dict
+from typing import Annotated, Any, Dict, List, Optional, Type, TypeVar
+import re
+from pydantic import BaseModel, Field, ValidationError
 from .base_agent import BaseAgent, AgentResult
+from .token_budget import format_improvements
+
+
+Score = Annotated[int, Field(ge=0, le=10)]
+
+
+class CriticVerdict(BaseModel):
+    score: Score
+    accept: bool
+    improvements: List[str] = []
+
+
+class CandidateVerdict(BaseModel):
+    candidate_scores: List[Score]
+    accept: bool
+    improvements: List[str] = []
+
+
+VerdictModel = TypeVar('VerdictModel', bound=BaseModel)
+
+VERDICT_FORMAT = """
+        Respond with a single JSON object and nothing else:
+        {schema}
+
+        "accept" is true when the figure is ready for publication as is. "improvements"
+        lists specific, actionable changes ordered from most to least important, one
+        short sentence each, at most five; leave it empty when accepting.
+"""
+VERDICT_SCHEMA = '{"score": <1-10>, "accept": <true|false>, "improvements": ["..."]}'
+CANDIDATE_VERDICT_SCHEMA = '{"candidate_scores": [<1-10>, ...], "accept": <true|false>, "improvements": ["..."]}'
 
 
 class CriticAgent(BaseAgent):
@@ -9,7 +41,13 @@ class CriticAgent(BaseAgent):
             diagram_type = input_data.get('diagram_type', 'diagram')
             domain = input_data.get('domain', 'general')
             iteration = input_data.get('iteration', 1)
+            max_iterations = input_data.get('max_iterations', 3)
             has_image = input_data.get('has_image', False)
+            lint = input_data.get('lint')
+            candidates = input_data.get('candidates')
+
+            if candidates:
+                return await self._evaluate_candidates(input_data, candidates)
 
             critique_prompt = f"""
             Evaluate this scientific diagram specification for publication quality.
@@ -21,51 +59,30 @@ class CriticAgent(BaseAgent):
             Domain: {domain}
             Iteration: {iteration}
             Image Generated: {has_image}
-
-            Provide constructive feedback on:
-
-            1. **Scientific Accuracy**
-               - Are all elements technically correct?
-               - Is the representation appropriate for the domain?
-               - Are units, scales, and labels accurate?
-
-            2. **Visual Clarity**
-               - Is the diagram easy to understand?
-               - Is there cognitive overload or clutter?
-               - Are relationships between elements clear?
-
-            3. **Aesthetic Quality**
-               - Does it meet publication standards?
-               - Is the color scheme effective?
-               - Is typography professional?
-
-            4. **Completeness**
-               - Are all necessary elements present?
-               - Is context/legend sufficient?
-               - Are annotations clear?
-
-            5. **Improvements Needed**
-               - Specific actionable changes
-               - Priority order (high/medium/low)
-
-            Provide:
-            - Overall Quality Score (1-10)
-            - Accept/Refine decision
-            - List of specific improvements if refinement needed
+            {self._format_lint(lint)}
+
+            Judge it on:
+            1. Scientific accuracy: correct elements, appropriate representation, accurate units, scales and labels
+            2. Visual clarity: easy to read, no clutter, clear relationships between elements
+            3. Aesthetic quality: publication standard, effective colors, professional typography
+            4. Completeness: all necessary elements, sufficient legend and annotations
+            {VERDICT_FORMAT.format(schema=VERDICT_SCHEMA)}
             """
 
-            evaluation = await self.generate_content(critique_prompt)
+            evaluation = await self.generate_content(critique_prompt, input_data.get('on_chunk'))
 
-            should_refine, quality_score = self._parse_evaluation(evaluation, iteration)
+            verdict = self._parse_verdict(evaluation, CriticVerdict)
+            if verdict is None:
+                should_refine, quality_score = self._parse_evaluation(evaluation, iteration, max_iterations)
+                verdict = CriticVerdict(
+                    score=min(quality_score, 10),
+                    accept=not should_refine,
+                    improvements=self._extract_improvements(evaluation)
+                )
 
             return AgentResult(
                 success=True,
-                data={
-                    'evaluation': evaluation,
-                    'should_refine': should_refine,
-                    'quality_score': quality_score,
-                    'iteration': iteration
-                },
+                data=self._verdict_data(verdict, verdict.score, iteration, max_iterations),
                 metadata={'agent': 'CriticAgent', 'iteration': iteration}
             )
         except Exception as e:
@@ -76,10 +93,125 @@ class CriticAgent(BaseAgent):
                 metadata={'agent': 'CriticAgent'}
             )
 
-    def _parse_evaluation(self, evaluation: str, iteration: int) -> tuple:
+    async def _evaluate_candidates(self, input_data: Dict[str, Any], candidates: List[Dict[str, Any]]) -> AgentResult:
+        specification = input_data.get('enhanced_specification', '')
+        diagram_type = input_data.get('diagram_type', 'diagram')
+        domain = input_data.get('domain', 'general')
+        iteration = input_data.get('iteration', 1)
+        max_iterations = input_data.get('max_iterations', 3)
+
+        formatted_candidates = "\n".join(
+            f"""
+            --- Candidate {index + 1} (image rendered: {candidate.get('has_image', False)}) ---
+            {self._format_lint(candidate.get('lint'))}
+            {candidate.get('code', '')}
+            """
+            for index, candidate in enumerate(candidates)
+        )
+
+        critique_prompt = f"""
+        Compare these candidate implementations of one scientific diagram and judge which
+        best meets publication quality for the specification.
+
+        Specification:
+        {specification}
+
+        Type: {diagram_type}
+        Domain: {domain}
+        Iteration: {iteration}
+
+        Candidates (matplotlib code):
+        {formatted_candidates}
+
+        Judge each candidate on scientific accuracy, visual clarity, aesthetic quality and
+        completeness. "candidate_scores" holds one 1-10 score per candidate, in order;
+        "accept" and "improvements" refer to the best candidate.
+        {VERDICT_FORMAT.format(schema=CANDIDATE_VERDICT_SCHEMA)}
+        """
+
+        evaluation = await self.generate_content(critique_prompt, input_data.get('on_chunk'))
+
+        verdict = self._parse_verdict(evaluation, CandidateVerdict)
+        if verdict is None or len(verdict.candidate_scores) != len(candidates):
+            candidate_scores = self._parse_candidate_scores(evaluation, len(candidates))
+            verdict = CandidateVerdict(
+                candidate_scores=candidate_scores,
+                accept=max(candidate_scores) >= 8,
+                improvements=self._extract_improvements(evaluation)
+            )
+
+        candidate_scores = verdict.candidate_scores
+        best_candidate = max(range(len(candidates)), key=lambda index: candidate_scores[index])
+        data = self._verdict_data(verdict, candidate_scores[best_candidate], iteration, max_iterations)
+        data['candidate_scores'] = candidate_scores
+        data['best_candidate'] = best_candidate
+
+        return AgentResult(
+            success=True,
+            data=data,
+            metadata={'agent': 'CriticAgent', 'iteration': iteration, 'candidates': len(candidates)}
+        )
+
+    def _verdict_data(
+        self,
+        verdict: BaseModel,
+        quality_score: int,
+        iteration: int,
+        max_iterations: int
+    ) -> Dict[str, Any]:
+        improvements = [improvement.strip() for improvement in verdict.improvements if improvement.strip()]
+        should_refine = iteration < max_iterations and not verdict.accept
+        summary = f"Score: {quality_score}/10 - {'Refine' if should_refine else 'Accept'}"
+        if improvements:
+            summary += f"\n{format_improvements(improvements)}"
+
+        return {
+            'evaluation': summary,
+            'improvements': improvements,
+            'should_refine': should_refine,
+            'quality_score': quality_score,
+            'iteration': iteration
+        }
+
+    def _format_lint(self, lint: Optional[Dict[str, Any]]) -> str:
+        if not lint:
+            return ""
+        if not lint['issues']:
+            return f"Automated layout checks on the rendered figure: {lint['score']}/10, no issues found"
+        issues = "\n".join(f"- [{issue['severity']}] {issue['message']}" for issue in lint['issues'])
+        return f"Automated layout checks on the rendered figure: {lint['score']}/10\n{issues}"
+
+    def _parse_verdict(self, evaluation: str, model: Type[VerdictModel]) -> Optional[VerdictModel]:
+        # Models sometimes wrap the object in a code fence or a sentence
+        start = evaluation.find('{')
+        end = evaluation.rfind('}')
+        if start == -1 or end < start:
+            return None
+        try:
+            return model.model_validate_json(evaluation[start:end + 1])
+        except ValidationError:
+            return None
+
+    def _parse_candidate_scores(self, evaluation: str, count: int) -> List[int]:
+        scores = [0] * count
+        for index, score in re.findall(r'candidate\s*#?(\d+)\D{0,20}?(\d+)\s*/\s*10', evaluation.lower()):
+            index = int(index) - 1
+            if 0 <= index < count and scores[index] == 0:
+                scores[index] = min(int(score), 10)
+        return scores
+
+    def _extract_improvements(self, evaluation: str) -> List[str]:
+        # The improvement list is the last section the prompt asks for
+        index = evaluation.lower().rfind('improvement')
+        if index == -1:
+            return []
+        lines = evaluation[index:].splitlines()[1:]
+        return [line.strip().lstrip('-*0123456789.) ').strip() for line in lines if line.strip()]
+
+    def _parse_evaluation(self, evaluation: str, iteration: int, max_iterations: int) -> tuple:
         evaluation_lower = evaluation.lower()
 
-        if iteration >= 3:
+        if iteration >= max_iterations:
             return False, 7
 
         if 'accept' in evaluation_lower and 'refine' not in evaluation_lower.split('accept')[0]:
@@ -87,7 +219,6 @@ class CriticAgent(BaseAgent):
 
         if 'quality score' in evaluation_lower or 'score' in evaluation_lower:
             try:
-                import re
                 scores = re.findall(r'(\d+)/10|score[:\s]+(\d+)', evaluation_lower)
                 if scores:
                     score = int(scores[0][0] or scores[0][1])
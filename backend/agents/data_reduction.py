@@ -0,0 +1,153 @@
+import os
+from typing import TYPE_CHECKING, Any, Dict, Optional
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+RENDER_POINT_BUDGET = int(os.getenv("RENDER_POINT_BUDGET", "20000"))
+
+COUNT_COLUMN = 'point_count'
+
+# Specific phrases only: specifications mention "line width" or "grid lines"
+# for every kind of chart.
+CHART_KEYWORDS = [
+    ('scatter', ('scatter', 'bubble chart', 'point cloud')),
+    ('distribution', ('histogram', 'distribution', 'box plot', 'boxplot', 'violin', 'density', 'kde', 'ecdf')),
+    ('line', ('line chart', 'line plot', 'line graph', 'time series', 'timeseries', 'trend'))
+]
+
+
+def _as_float(values: "pd.Series") -> np.ndarray:
+    # Only the render worker reduces frames, so the API process never loads pandas here
+    import pandas as pd
+
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.to_numpy(dtype='datetime64[ns]').astype(np.int64).astype(np.float64)
+    return pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Buckets between the fixed first and last points. Classic LTTB anchors each
+    # bucket on the point picked in the previous one, which forces a Python loop;
+    # anchoring on the previous bucket's mean keeps the whole pass vectorized.
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+    sizes = ends - starts
+    bucket = np.repeat(np.arange(len(sizes)), sizes)
+
+    inner_x, inner_y = x[1:n - 1], y[1:n - 1]
+    mean_x = np.add.reduceat(inner_x, starts - 1) / sizes
+    mean_y = np.add.reduceat(inner_y, starts - 1) / sizes
+
+    ax = np.concatenate([[x[0]], mean_x[:-1]])[bucket]
+    ay = np.concatenate([[y[0]], mean_y[:-1]])[bucket]
+    cx = np.concatenate([mean_x[1:], [x[-1]]])[bucket]
+    cy = np.concatenate([mean_y[1:], [y[-1]]])[bucket]
+    area = np.abs((ax - cx) * (inner_y - ay) - (ax - inner_x) * (cy - ay))
+
+    peaks = np.maximum.reduceat(area, starts - 1)
+    hits = np.flatnonzero(area == peaks[bucket])
+    _, first = np.unique(bucket[hits], return_index=True)
+    picked = hits[first] + 1
+    return np.concatenate([[0], picked, [n - 1]])
+
+
+def bin_2d_indices(x: np.ndarray, y: np.ndarray, bins: int):
+    def _bin(values: np.ndarray) -> np.ndarray:
+        low, high = values.min(), values.max()
+        scale = (bins - 1) / (high - low) if high > low else 0.0
+        return ((values - low) * scale).astype(np.int64)
+
+    cells = _bin(x) * bins + _bin(y)
+    _, first, counts = np.unique(cells, return_index=True, return_counts=True)
+    return first, counts
+
+
+def quantile_indices(values: np.ndarray, points: int) -> np.ndarray:
+    # Rows at evenly spaced ranks share the full column's quantiles, so
+    # histograms and box plots of the reduced frame keep their shape.
+    order = np.argsort(values, kind='stable')
+    if points >= len(order):
+        return order
+    return order[np.unique(np.linspace(0, len(order) - 1, points).round().astype(np.int64))]
+
+
+def reduce_frame(frame: "pd.DataFrame", plan: Dict[str, Any]) -> "pd.DataFrame":
+    budget = plan.get('budget', RENDER_POINT_BUDGET)
+    if len(frame) <= budget:
+        return frame
+
+    kind = plan['kind']
+    y = _as_float(frame[plan['y']])
+    if kind == 'distribution':
+        valid = np.flatnonzero(~np.isnan(y))
+        return frame.iloc[valid[quantile_indices(y[valid], budget)]].reset_index(drop=True)
+
+    x = _as_float(frame[plan['x']])
+    valid = np.flatnonzero(~(np.isnan(x) | np.isnan(y)))
+    x, y = x[valid], y[valid]
+    if not len(valid):
+        return frame
+
+    if kind == 'line':
+        steps = np.diff(x)
+        if (steps >= 0).all() or (steps <= 0).all():
+            rows = valid[lttb_indices(x, y, budget)]
+        else:
+            # Trajectories and hysteresis loops are drawn in row order, so sorting
+            # by x would redraw them as a different curve; thin them evenly instead
+            rows = valid[np.unique(np.linspace(0, len(valid) - 1, budget).round().astype(np.int64))]
+        return frame.iloc[rows].reset_index(drop=True)
+
+    if kind == 'scatter':
+        first, counts = bin_2d_indices(x, y, max(int(np.sqrt(budget)), 2))
+        reduced = frame.iloc[valid[first]].reset_index(drop=True)
+        reduced[COUNT_COLUMN] = counts
+        return reduced
+
+    return frame
+
+
+def chart_kind(diagram_type: str, description: str) -> Optional[str]:
+    if 'line' in (diagram_type or '').lower().replace('_', ' ').split():
+        return 'line'
+    for text in (diagram_type, description):
+        text = (text or '').lower().replace('_', ' ')
+        for kind, keywords in CHART_KEYWORDS:
+            if any(keyword in text for keyword in keywords):
+                return kind
+    return None
+
+
+def reduction_plan(
+    diagram_type: str,
+    description: str,
+    data_info: Dict[str, Any],
+    budget: int = RENDER_POINT_BUDGET
+) -> Optional[Dict[str, Any]]:
+    if not data_info or not data_info.get('dataset_id') or data_info.get('row_count', 0) <= budget:
+        return None
+
+    kind = chart_kind(diagram_type, description)
+    if kind is None:
+        return None
+
+    stats = data_info.get('column_stats') or {}
+    numeric = [name for name, column in stats.items() if str(column.get('dtype', '')).startswith(('int', 'uint', 'float'))]
+    temporal = [name for name, column in stats.items() if str(column.get('dtype', '')).startswith('datetime')]
+
+    if kind == 'distribution':
+        if not numeric:
+            return None
+        return {'kind': kind, 'x': None, 'y': numeric[0], 'budget': budget}
+
+    axes = (temporal + numeric) if kind == 'line' else numeric
+    if len(axes) < 2:
+        return None
+    return {'kind': kind, 'x': axes[0], 'y': axes[1], 'budget': budget}
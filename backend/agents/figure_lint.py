@@ -0,0 +1,261 @@
+from typing import Any, Dict, List, Tuple
+import numpy as np
+from matplotlib.axes import Axes
+from matplotlib.colors import to_rgba
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+from matplotlib.text import Text
+
+
+# Scored on the critic's 1-10 scale so the two can be compared directly
+ERROR_PENALTY = 3
+WARNING_PENALTY = 1
+
+MIN_TEXT_CONTRAST = 3.0
+MIN_MARK_CONTRAST = 1.3
+TEXT_OVERLAP_FRACTION = 0.2
+
+
+# No check for text past the figure edge: renders are saved with bbox_inches='tight',
+# which grows the output to include it
+def lint_figure(figure: Figure) -> Dict[str, Any]:
+    # Layout is only final once the figure has been drawn
+    figure.draw_without_rendering()
+    renderer = figure.canvas.get_renderer()
+
+    axes = [ax for ax in figure.get_axes() if ax.get_visible() and not _is_colorbar(ax)]
+    issues = []
+    for index, ax in enumerate(axes):
+        name = _axes_name(ax, index, len(axes))
+        if _is_empty(ax):
+            # Axes switched off are spacers or hold only a legend
+            if ax.axison:
+                issues.append(_issue('empty_axes', 'error', f"{name} has nothing plotted on it; remove it or plot data"))
+            continue
+        issues += _check_labels(ax, name)
+        issues += _check_legend(ax, name, figure)
+        issues += _check_mark_contrast(ax, name)
+
+    texts = _visible_texts(figure, axes)
+    issues += _check_overlaps(texts, renderer, _tick_label_ids(axes))
+    issues += _check_text_contrast(texts, figure)
+
+    errors = sum(1 for issue in issues if issue['severity'] == 'error')
+    warnings = len(issues) - errors
+    return {
+        'score': max(0, 10 - errors * ERROR_PENALTY - warnings * WARNING_PENALTY),
+        'errors': errors,
+        'warnings': warnings,
+        'issues': issues
+    }
+
+
+def _issue(check: str, severity: str, message: str) -> Dict[str, str]:
+    return {'check': check, 'severity': severity, 'message': message}
+
+
+def _axes_name(ax: Axes, index: int, count: int) -> str:
+    title = ax.get_title()
+    if title:
+        return f"The '{title}' panel"
+    return "The plot" if count == 1 else f"Panel {index + 1}"
+
+
+def _is_colorbar(ax: Axes) -> bool:
+    return hasattr(ax, '_colorbar') or ax.get_label() == '<colorbar>'
+
+
+def _data_artists(ax: Axes) -> list:
+    return ax.lines + ax.collections + ax.patches + ax.images + ax.tables
+
+
+def _is_empty(ax: Axes) -> bool:
+    # Schematics drawn with the axis switched off still count through their texts
+    visible = [artist for artist in _data_artists(ax) + ax.texts if artist.get_visible()]
+    return not visible
+
+
+def _check_labels(ax: Axes, name: str) -> List[Dict[str, str]]:
+    if not ax.axison or not _data_artists(ax) or ax.images and not ax.lines + ax.collections:
+        return []
+
+    missing = []
+    if ax.xaxis.get_visible() and not ax.get_xlabel() and _has_numeric_ticks(ax.get_xticklabels()):
+        missing.append('x')
+    if ax.yaxis.get_visible() and not ax.get_ylabel() and _has_numeric_ticks(ax.get_yticklabels()):
+        missing.append('y')
+    if not missing:
+        return []
+    return [_issue('missing_axis_label', 'warning', f"{name} has no {' or '.join(missing)} axis label; add one with units")]
+
+
+def _has_numeric_ticks(labels: List[Text]) -> bool:
+    # Categorical axes are usually self-explanatory; numeric ones need a quantity and unit
+    texts = [label.get_text().replace('−', '-') for label in labels if label.get_text()]
+    if not texts:
+        return False
+    try:
+        [float(text) for text in texts]
+        return True
+    except ValueError:
+        return False
+
+
+def _check_legend(ax: Axes, name: str, figure: Figure) -> List[Dict[str, str]]:
+    if ax.get_legend() is not None or figure.legends:
+        return []
+
+    # Pie wedges carry labels too, but they are drawn next to the wedge
+    series = ax.lines + ax.collections + ax.containers
+    labelled = [artist for artist in series if not artist.get_label().startswith('_')]
+    if len(labelled) >= 2 and not {artist.get_label() for artist in labelled} <= _legend_labels(figure):
+        return [_issue('missing_legend', 'error', f"{name} labels {len(labelled)} series but shows no legend; call legend()")]
+    # Artists the code never labelled get '_child' names; helpers like error bars use '_nolegend_'
+    unlabelled = [line for line in ax.lines if line.get_visible() and line.get_label().startswith('_child')]
+    if len(unlabelled) >= 3 and not labelled:
+        return [_issue('missing_legend', 'warning', f"{name} has several unlabelled series and no legend")]
+    return []
+
+
+def _legend_labels(figure: Figure) -> set:
+    # A legend may sit on another panel, such as a spare axes switched off to hold it
+    legends = [ax.get_legend() for ax in figure.get_axes() if ax.get_legend() is not None]
+    return {text.get_text() for legend in legends for text in legend.get_texts()}
+
+
+def _drawn_ticks(axis) -> set:
+    # Mirrors how an axis picks ticks to draw: one tick per locator position,
+    # kept when the position falls inside the view limits in scale space
+    transform = axis.get_transform()
+    low, high = sorted(transform.transform(np.asarray(axis.get_view_interval(), dtype=float)))
+    tolerance = (high - low) * 1e-10 if np.isfinite(high - low) else 0
+    drawn = set()
+    for locations, ticks in (
+        (axis.get_majorticklocs(), axis.get_major_ticks),
+        (axis.get_minorticklocs(), axis.get_minor_ticks)
+    ):
+        locations = np.asarray(locations, dtype=float)
+        if not len(locations):
+            continue
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scaled = transform.transform(locations)
+        inside = (scaled >= low - tolerance) & (scaled <= high + tolerance)
+        drawn.update(id(tick) for tick, keep in zip(ticks(len(locations)), inside) if keep)
+    return drawn
+
+
+def _visible_texts(figure: Figure, axes: List[Axes]) -> List[Text]:
+    # Labels of ticks outside the view limits stay visible but are never drawn
+    undrawn = set()
+    for ax in axes:
+        for axis in (ax.xaxis, ax.yaxis):
+            ticks = axis.get_major_ticks() + axis.get_minor_ticks()
+            drawn = _drawn_ticks(axis)
+            undrawn.update(id(label) for tick in ticks if id(tick) not in drawn for label in (tick.label1, tick.label2))
+
+    texts = [text for text in figure.findobj(Text) if text.get_visible() and text.get_text().strip()]
+    return [
+        text for text in texts
+        if id(text) not in undrawn and (text.axes is None or text.axes.get_visible())
+    ]
+
+
+def _extents(texts: List[Text], renderer) -> np.ndarray:
+    return np.array([
+        [box.x0, box.y0, box.x1, box.y1]
+        for box in (text.get_window_extent(renderer) for text in texts)
+    ]).reshape(-1, 4)
+
+
+def _tick_label_ids(axes: List[Axes]) -> set:
+    return {id(label) for ax in axes for label in ax.get_xticklabels() + ax.get_yticklabels()}
+
+
+def _check_overlaps(texts: List[Text], renderer, tick_label_ids: set) -> List[Dict[str, str]]:
+    if len(texts) < 2:
+        return []
+
+    boxes = _extents(texts, renderer)
+    x0, y0, x1, y1 = boxes.T
+    width = np.maximum(np.minimum(x1[:, None], x1[None, :]) - np.maximum(x0[:, None], x0[None, :]), 0)
+    height = np.maximum(np.minimum(y1[:, None], y1[None, :]) - np.maximum(y0[:, None], y0[None, :]), 0)
+    area = (x1 - x0) * (y1 - y0)
+    smaller = np.maximum(np.minimum(area[:, None], area[None, :]), 1e-9)
+    overlapping = np.triu(width * height / smaller > TEXT_OVERLAP_FRACTION, k=1)
+
+    pairs = list(zip(*np.nonzero(overlapping)))
+    if not pairs:
+        return []
+
+    first, second = pairs[0]
+    example = f"'{_short(texts[first])}' and '{_short(texts[second])}'"
+    if all(id(texts[i]) in tick_label_ids and id(texts[j]) in tick_label_ids for i, j in pairs):
+        message = f"{len(pairs)} pairs of tick labels overlap (e.g. {example}); use fewer ticks or rotate them"
+    else:
+        message = f"{len(pairs)} pairs of text elements overlap (e.g. {example}); move or resize them"
+    return [_issue('overlapping_text', 'error', message)]
+
+
+def _luminance(color) -> float:
+    rgb = np.array(to_rgba(color)[:3])
+    linear = np.where(rgb <= 0.03928, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    return float(linear @ [0.2126, 0.7152, 0.0722])
+
+
+def contrast_ratio(foreground, background) -> float:
+    lighter, darker = sorted((_luminance(foreground), _luminance(background)), reverse=True)
+    return (lighter + 0.05) / (darker + 0.05)
+
+
+def _background(text: Text, figure: Figure) -> Tuple:
+    bbox_patch = text.get_bbox_patch()
+    if bbox_patch is not None and bbox_patch.get_visible() and bbox_patch.get_fill():
+        return bbox_patch.get_facecolor()
+    # Only texts placed in data coordinates sit on the axes; labels and ticks are outside it
+    if text.axes is not None and text.axes.patch.get_visible() and text in text.axes.texts:
+        return text.axes.get_facecolor()
+    return figure.get_facecolor()
+
+
+def _check_text_contrast(texts: List[Text], figure: Figure) -> List[Dict[str, str]]:
+    low = [text for text in texts if contrast_ratio(text.get_color(), _background(text, figure)) < MIN_TEXT_CONTRAST]
+    if not low:
+        return []
+    return [_issue(
+        'text_contrast', 'warning',
+        f"{len(low)} text elements have low contrast against their background (e.g. '{_short(low[0])}')"
+    )]
+
+
+def _mark_colors(artist) -> list:
+    if isinstance(artist, Line2D):
+        return [artist.get_color()] if artist.get_linestyle() != 'None' or artist.get_marker() != 'None' else []
+    colors = np.vstack([
+        np.reshape(artist.get_facecolors(), (-1, 4)),
+        np.reshape(artist.get_edgecolors(), (-1, 4))
+    ])
+    return [tuple(color) for color in colors if color[3] > 0]
+
+
+def _check_mark_contrast(ax: Axes, name: str) -> List[Dict[str, str]]:
+    if not ax.patch.get_visible():
+        return []
+
+    background = ax.get_facecolor()
+    faint = 0
+    for artist in ax.lines + ax.collections:
+        colors = _mark_colors(artist)
+        if colors and all(contrast_ratio(color, background) < MIN_MARK_CONTRAST for color in colors[:64]):
+            faint += 1
+    if not faint:
+        return []
+    return [_issue(
+        'mark_contrast', 'warning',
+        f"{name} has {faint} series that are barely visible against the background; use darker colors"
+    )]
+
+
+def _short(text: Text, limit: int = 30) -> str:
+    value = ' '.join(text.get_text().split())
+    return value if len(value) <= limit else f"{value[:limit - 3]}..."
+
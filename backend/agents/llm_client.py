@@ -0,0 +1,139 @@
+import asyncio
+import os
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Optional
+from services.metrics import CANCELLATIONS, annotate
+
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+
+stats = {'requests': 0, 'timeouts': 0, 'cancelled': 0}
+
+_semaphore: Optional[asyncio.Semaphore] = None
+_clients: Dict[str, "LLMClient"] = {}
+_model_factory: Optional[Callable[[str], Any]] = None
+_api_key: Optional[str] = None
+_configured = False
+
+
+def estimate_tokens(text: str) -> int:
+    # Rough Gemini ratio for English prose and code; used when usage is not reported
+    return max(1, len(text) // 4) if text else 0
+
+
+def _record_usage(prompt: str, text: str, usage: Any) -> None:
+    if usage is not None and getattr(usage, 'prompt_token_count', None):
+        annotate(prompt_tokens=usage.prompt_token_count, response_tokens=usage.candidates_token_count)
+    else:
+        annotate(prompt_tokens=estimate_tokens(prompt), response_tokens=estimate_tokens(text), tokens_estimated=True)
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _semaphore
+
+
+def set_max_concurrency(limit: int) -> None:
+    global _semaphore, LLM_MAX_CONCURRENCY
+    LLM_MAX_CONCURRENCY = limit
+    _semaphore = asyncio.Semaphore(limit)
+
+
+def configure(api_key: Optional[str]) -> None:
+    global _api_key, _configured
+    _api_key = api_key
+    _configured = False
+
+
+def _gemini_model(model_name: str) -> Any:
+    # google.generativeai takes most of a second to import, so it is loaded
+    # by the first call (or the startup warm-up) rather than at import time
+    global _configured
+    import google.generativeai as genai
+
+    if not _configured and _api_key:
+        genai.configure(api_key=_api_key)
+        _configured = True
+    return genai.GenerativeModel(model_name)
+
+
+def set_model_factory(factory: Callable[[str], Any]) -> None:
+    # Lets the benchmark harness swap Gemini for an offline model; clients
+    # created before the swap are dropped.
+    global _model_factory
+    _model_factory = factory
+    _clients.clear()
+
+
+class LLMClient:
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._model = None
+
+    @property
+    def model(self) -> Any:
+        if self._model is None:
+            self._model = (_model_factory or _gemini_model)(self.model_name)
+        return self._model
+
+    async def generate(self, prompt: str) -> str:
+        async with _get_semaphore():
+            stats['requests'] += 1
+            try:
+                response = await asyncio.wait_for(
+                    self.model.generate_content_async(prompt),
+                    timeout=LLM_TIMEOUT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                stats['timeouts'] += 1
+                raise TimeoutError(f"{self.model_name} did not respond within {LLM_TIMEOUT_SECONDS:.0f}s")
+            except asyncio.CancelledError:
+                stats['cancelled'] += 1
+                CANCELLATIONS.labels('llm').inc()
+                raise
+        _record_usage(prompt, response.text, getattr(response, 'usage_metadata', None))
+        return response.text
+
+    async def generate_stream(self, prompt: str) -> AsyncIterator[str]:
+        async with _get_semaphore():
+            stats['requests'] += 1
+            try:
+                response = await asyncio.wait_for(
+                    self.model.generate_content_async(prompt, stream=True),
+                    timeout=LLM_TIMEOUT_SECONDS
+                )
+                chunks = response.__aiter__()
+                texts = []
+                usage = None
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout=LLM_TIMEOUT_SECONDS)
+                    except StopAsyncIteration:
+                        break
+                    usage = getattr(chunk, 'usage_metadata', None) or usage
+                    if chunk.parts:
+                        texts.append(chunk.text)
+                        yield chunk.text
+                _record_usage(prompt, ''.join(texts), usage)
+            except asyncio.TimeoutError:
+                stats['timeouts'] += 1
+                raise TimeoutError(f"{self.model_name} stalled for more than {LLM_TIMEOUT_SECONDS:.0f}s")
+            except asyncio.CancelledError:
+                stats['cancelled'] += 1
+                CANCELLATIONS.labels('llm').inc()
+                raise
+
+
+def get_llm_client(model_name: str) -> LLMClient:
+    client = _clients.get(model_name)
+    if client is None:
+        client = LLMClient(model_name)
+        _clients[model_name] = client
+    return client
+
+
+def warm_up(model_names: Iterable[str]) -> None:
+    for model_name in model_names:
+        get_llm_client(model_name).model
@@ -1,21 +1,55 @@
-from typing import Any, Dict, Optional, AsyncGenerator
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, AsyncGenerator
+import asyncio
 import json
+import logging
+import os
+import uuid
+from services.blob_store import BlobStore, create_blob_store
+from services.metrics import CRITIC_SKIPS, SEMANTIC_CACHE_LOOKUPS, STYLE_PRESET_USES, span, start_trace
+from services.persistence import PersistenceQueue
+from .base_agent import BaseAgent, AgentResult
+from .cache import ContentCache, bypass_response_cache
 from .retriever_agent import RetrieverAgent
 from .planner_agent import PlannerAgent
 from .stylist_agent import StylistAgent
 from .visualizer_agent import VisualizerAgent
 from .critic_agent import CriticAgent
+from .semantic_cache import SEMANTIC_CACHE_ENABLED, get_semantic_cache
+from .style_presets import STYLE_PRESETS_ENABLED, get_style_preset, wants_custom_style
+from .token_budget import TokenBudget, format_improvements
+
+
+STYLE_KEYWORDS = (
+    'color', 'colour', 'palette', 'font', 'typograph', 'style', 'styling',
+    'contrast', 'theme', 'aesthetic', 'colorblind', 'line width', 'marker'
+)
+
+logger = logging.getLogger(__name__)
+
+# Wraps a unit of work (a generator factory) so it runs when the caller allows
+WorkSlot = Callable[[Callable[[], AsyncIterator[Dict[str, Any]]]], AsyncIterator[Dict[str, Any]]]
 
 
 class DiagramOrchestrator:
-    def __init__(self, supabase_client, model_name: str = "gemini-pro"):
+    def __init__(self, supabase_client, model_name: str = "gemini-pro", blob_store: Optional[BlobStore] = None):
         self.supabase = supabase_client
+        self.model_name = model_name
+        self.blob_store = blob_store or create_blob_store(supabase_client)
+        self.persistence = PersistenceQueue(supabase_client)
         self.retriever = RetrieverAgent(supabase_client, model_name)
         self.planner = PlannerAgent(model_name)
         self.stylist = StylistAgent(model_name)
-        self.visualizer = VisualizerAgent(model_name)
+        self.visualizer = VisualizerAgent(model_name, self.blob_store)
         self.critic = CriticAgent(model_name)
         self.max_iterations = 3
+        self.candidate_count = int(os.getenv("VISUALIZER_CANDIDATES", "1"))
+        self.max_candidate_count = int(os.getenv("VISUALIZER_MAX_CANDIDATES", "4"))
+        self.refinement_mode = os.getenv("REFINEMENT_MODE", "patch")
+        self.lint_skip_critic = os.getenv("FIGURE_LINT_SKIP_CRITIC", "false").lower() == "true"
+        self.lint_accept_score = float(os.getenv("FIGURE_LINT_ACCEPT_SCORE", "10"))
+        self.token_budget = TokenBudget()
+        self.semantic_cache = get_semantic_cache() if SEMANTIC_CACHE_ENABLED else None
+        self.batch_concurrency = int(os.getenv("BATCH_MAX_CONCURRENCY", "3"))
 
     async def generate_diagram(
         self,
@@ -24,35 +58,88 @@ class DiagramOrchestrator:
         domain: str,
         user_id: str,
         project_id: Optional[str] = None,
-        data_info: Optional[Dict[str, Any]] = None
+        data_info: Optional[Dict[str, Any]] = None,
+        candidates: Optional[int] = None,
+        include_trace: bool = False,
+        refresh: bool = False,
+        references: Optional[Dict[str, Any]] = None,
+        style_guide: Optional[str] = None,
+        batch_id: Optional[str] = None
     ) -> AsyncGenerator[Dict[str, Any], None]:
+        # references, style_guide and batch_id are passed in by generate_batch,
+        # which retrieves and styles once for every figure in the batch
+        candidate_count = max(1, min(candidates or self.candidate_count, self.max_candidate_count))
+        # The stylist LLM is only needed when the request asks for its own look
+        style_preset = None
+        if STYLE_PRESETS_ENABLED and not style_guide and not wants_custom_style(prompt):
+            style_preset = get_style_preset(domain, diagram_type)
+        rc_params = style_preset['rc_params'] if style_preset else None
+        if refresh:
+            bypass_response_cache()
+        trace = start_trace()
+        figure_id = str(uuid.uuid4())
+        figure_row = None
         try:
             yield self._create_event('status', {'message': 'Starting diagram generation...', 'stage': 'init'})
 
-            yield self._create_event('status', {'message': 'Retrieving reference diagrams...', 'stage': 'retrieval'})
-            retriever_result = await self.retriever.execute({
-                'prompt': prompt,
-                'type': diagram_type,
-                'domain': domain
-            })
+            if references is None:
+                yield self._create_event('status', {'message': 'Retrieving reference diagrams...', 'stage': 'retrieval'})
+                retriever_result = await self._timed('retrieval', self.retriever.execute({
+                    'prompt': prompt,
+                    'type': diagram_type,
+                    'domain': domain
+                }))
 
-            if not retriever_result.success:
-                yield self._create_event('error', {'message': f'Retrieval failed: {retriever_result.error}'})
-                return
+                if not retriever_result.success:
+                    yield self._create_event('error', {'message': f'Retrieval failed: {retriever_result.error}'})
+                    return
 
-            yield self._create_event('agent_complete', {
-                'agent': 'RetrieverAgent',
-                'data': retriever_result.data
-            })
+                yield self._create_event('agent_complete', {
+                    'agent': 'RetrieverAgent',
+                    'data': retriever_result.data
+                })
+                references = retriever_result.data
 
-            yield self._create_event('status', {'message': 'Planning diagram structure...', 'stage': 'planning'})
-            planner_result = await self.planner.execute({
-                'prompt': prompt,
-                'type': diagram_type,
-                'domain': domain,
-                'references': retriever_result.data,
-                'data_info': data_info or {}
-            })
+            # A near-duplicate of an earlier request reuses its plan and first styling pass
+            cache_scope = self._cache_scope(user_id, diagram_type, domain, data_info)
+            # Figures of one paper read alike but each needs its own plan
+            cached_plan = None if refresh else self._lookup_plan(prompt, cache_scope, batch_id)
+            cache_entry = cached_plan[0] if cached_plan else None
+
+            if cached_plan:
+                _, similarity, cached = cached_plan
+                yield self._create_event('status', {
+                    'message': f'Reusing the plan of a similar request (similarity {similarity:.2f})...',
+                    'stage': 'planning'
+                })
+                planner_result = AgentResult(
+                    success=True,
+                    data={
+                        'specification': cached['specification'],
+                        'diagram_type': diagram_type,
+                        'domain': domain,
+                        'cached_similarity': round(similarity, 4)
+                    },
+                    metadata={'agent': 'PlannerAgent', 'cached': True}
+                )
+            else:
+                yield self._create_event('status', {'message': 'Planning diagram structure...', 'stage': 'planning'})
+                async for item in self._stream_agent(self.planner, {
+                    'prompt': prompt,
+                    'type': diagram_type,
+                    'domain': domain,
+                    'references': references,
+                    'data_info': data_info or {}
+                }, stage='planning'):
+                    if isinstance(item, AgentResult):
+                        planner_result = item
+                    else:
+                        yield item
+
+                if planner_result.success and self.semantic_cache is not None:
+                    cache_entry = self.semantic_cache.store(
+                        prompt, cache_scope, {'specification': planner_result.data['specification']}, batch_id
+                    )
 
             if not planner_result.success:
                 yield self._create_event('error', {'message': f'Planning failed: {planner_result.error}'})
@@ -63,31 +150,88 @@ class DiagramOrchestrator:
                 'data': planner_result.data
             })
 
+            # Only stylist output is cached, so a near-duplicate of a request that asked for
+            # its own look is styled the same way instead of getting the preset
+            cached_styling = cached_plan[2].get('enhanced_specification') if cached_plan and not style_guide else None
+            if cached_styling:
+                style_preset = None
+                rc_params = None
+
             iteration = 1
-            current_spec = planner_result.data['specification']
+            planner_spec = planner_result.data['specification']
+            current_spec = planner_spec
+            stylist_result = None
+            previous_code = None
+            improvements = None
 
             while iteration <= self.max_iterations:
-                yield self._create_event('status', {
-                    'message': f'Applying styling (iteration {iteration})...',
-                    'stage': 'styling',
-                    'iteration': iteration
-                })
-
-                stylist_result = await self.stylist.execute({
-                    'specification': current_spec,
-                    'domain': domain,
-                    'diagram_type': diagram_type
-                })
-
-                if not stylist_result.success:
-                    yield self._create_event('error', {'message': f'Styling failed: {stylist_result.error}'})
-                    return
+                if stylist_result is not None and not self._needs_restyle(improvements):
+                    yield self._create_event('status', {
+                        'message': f'Keeping styling from iteration {iteration - 1} (feedback does not affect styling)...',
+                        'stage': 'styling',
+                        'iteration': iteration
+                    })
+                elif style_guide:
+                    stylist_result = self._apply_style_guide(current_spec, style_guide, domain, diagram_type)
+                    yield self._create_event('status', {
+                        'message': f'Applying the shared style guide (iteration {iteration})...',
+                        'stage': 'styling',
+                        'iteration': iteration
+                    })
+                elif stylist_result is None and cached_styling:
+                    yield self._create_event('status', {
+                        'message': 'Reusing the styling of a similar request...',
+                        'stage': 'styling',
+                        'iteration': iteration
+                    })
+                    stylist_result = AgentResult(
+                        success=True,
+                        data={
+                            'enhanced_specification': cached_styling,
+                            'domain': domain,
+                            'diagram_type': diagram_type
+                        },
+                        metadata={'agent': 'StylistAgent', 'cached': True}
+                    )
+                elif style_preset:
+                    stylist_result = self._apply_style_preset(current_spec, style_preset, domain, diagram_type)
+                    STYLE_PRESET_USES.labels(style_preset['name']).inc()
+                    yield self._create_event('status', {
+                        'message': f"Applying the {style_preset['name']} style preset (iteration {iteration})...",
+                        'stage': 'styling',
+                        'iteration': iteration
+                    })
+                else:
+                    yield self._create_event('status', {
+                        'message': f'Applying styling (iteration {iteration})...',
+                        'stage': 'styling',
+                        'iteration': iteration
+                    })
 
-                yield self._create_event('agent_complete', {
-                    'agent': 'StylistAgent',
-                    'data': stylist_result.data,
-                    'iteration': iteration
-                })
+                    async for item in self._stream_agent(self.stylist, {
+                        'specification': current_spec,
+                        'domain': domain,
+                        'diagram_type': diagram_type
+                    }, iteration, 'styling'):
+                        if isinstance(item, AgentResult):
+                            stylist_result = item
+                        else:
+                            yield item
+
+                    if not stylist_result.success:
+                        yield self._create_event('error', {'message': f'Styling failed: {stylist_result.error}'})
+                        return
+
+                    if iteration == 1 and cache_entry is not None:
+                        self.semantic_cache.update(
+                            cache_entry, enhanced_specification=stylist_result.data['enhanced_specification']
+                        )
+
+                    yield self._create_event('agent_complete', {
+                        'agent': 'StylistAgent',
+                        'data': stylist_result.data,
+                        'iteration': iteration
+                    })
 
                 yield self._create_event('status', {
                     'message': f'Generating visualization (iteration {iteration})...',
@@ -95,61 +239,154 @@ class DiagramOrchestrator:
                     'iteration': iteration
                 })
 
-                visualizer_result = await self.visualizer.execute({
-                    'enhanced_specification': stylist_result.data['enhanced_specification'],
-                    'diagram_type': diagram_type,
-                    'domain': domain,
-                    'data_info': data_info or {}
-                })
+                visualizer_results = await self._timed('visualization', asyncio.gather(*[
+                    self.visualizer.execute({
+                        'enhanced_specification': stylist_result.data['enhanced_specification'],
+                        'diagram_type': diagram_type,
+                        'domain': domain,
+                        'data_info': data_info or {},
+                        'candidate': candidate,
+                        'candidate_count': candidate_count,
+                        'previous_code': previous_code,
+                        'improvements': improvements,
+                        'rc_params': rc_params
+                    })
+                    for candidate in range(candidate_count)
+                ]), iteration=iteration, candidates=candidate_count)
+                successful_results = [result for result in visualizer_results if result.success]
 
-                if not visualizer_result.success:
-                    yield self._create_event('error', {'message': f'Visualization failed: {visualizer_result.error}'})
+                if not successful_results:
+                    yield self._create_event('error', {'message': f'Visualization failed: {visualizer_results[0].error}'})
                     return
 
-                yield self._create_event('agent_complete', {
-                    'agent': 'VisualizerAgent',
-                    'data': visualizer_result.data,
-                    'iteration': iteration
-                })
+                for visualizer_result in successful_results:
+                    yield self._create_event('agent_complete', {
+                        'agent': 'VisualizerAgent',
+                        'data': visualizer_result.data,
+                        'iteration': iteration
+                    })
 
-                if visualizer_result.data.get('image_data'):
+                # With several candidates the preview waits until the critic has picked one
+                if len(successful_results) == 1 and visualizer_result.data.get('image'):
                     yield self._create_event('image_preview', {
-                        'image_data': visualizer_result.data['image_data'],
+                        'image': visualizer_result.data['image'],
                         'iteration': iteration
                     })
 
-                yield self._create_event('status', {
-                    'message': f'Evaluating quality (iteration {iteration})...',
-                    'stage': 'critique',
-                    'iteration': iteration
-                })
+                # Obvious layout failures and clean renders are decided locally,
+                # without a critic round-trip
+                critic_result = None
+                if len(successful_results) == 1:
+                    critic_result = self._lint_verdict(visualizer_result.data.get('lint'), iteration)
 
-                critic_result = await self.critic.execute({
-                    'enhanced_specification': stylist_result.data['enhanced_specification'],
-                    'diagram_type': diagram_type,
-                    'domain': domain,
-                    'iteration': iteration,
-                    'has_image': visualizer_result.data.get('image_data') is not None
-                })
+                if critic_result is not None:
+                    yield self._create_event('status', {
+                        'message': f'Automated checks decided iteration {iteration} (critic skipped)...',
+                        'stage': 'critique',
+                        'iteration': iteration
+                    })
+                    yield self._create_event('agent_complete', {
+                        'agent': 'FigureLinter',
+                        'data': critic_result.data,
+                        'iteration': iteration
+                    })
+                else:
+                    yield self._create_event('status', {
+                        'message': f'Evaluating quality (iteration {iteration})...',
+                        'stage': 'critique',
+                        'iteration': iteration
+                    })
 
-                if not critic_result.success:
-                    yield self._create_event('error', {'message': f'Critique failed: {critic_result.error}'})
-                    return
+                    critic_input = {
+                        'enhanced_specification': stylist_result.data['enhanced_specification'],
+                        'diagram_type': diagram_type,
+                        'domain': domain,
+                        'iteration': iteration,
+                        'max_iterations': self.max_iterations,
+                        'has_image': successful_results[0].data.get('image') is not None,
+                        'lint': successful_results[0].data.get('lint')
+                    }
+                    if len(successful_results) > 1:
+                        critic_input['candidates'] = [
+                            {
+                                'code': result.data.get('code', ''),
+                                'has_image': result.data.get('image') is not None,
+                                'lint': result.data.get('lint')
+                            }
+                            for result in successful_results
+                        ]
+
+                    async for item in self._stream_agent(self.critic, critic_input, iteration, 'critique'):
+                        if isinstance(item, AgentResult):
+                            critic_result = item
+                        else:
+                            yield item
+
+                    if not critic_result.success:
+                        yield self._create_event('error', {'message': f'Critique failed: {critic_result.error}'})
+                        return
+
+                    yield self._create_event('agent_complete', {
+                        'agent': 'CriticAgent',
+                        'data': critic_result.data,
+                        'iteration': iteration
+                    })
 
-                yield self._create_event('agent_complete', {
-                    'agent': 'CriticAgent',
-                    'data': critic_result.data,
-                    'iteration': iteration
-                })
+                if len(successful_results) > 1:
+                    visualizer_result = successful_results[critic_result.data.get('best_candidate', 0)]
+                    if visualizer_result.data.get('image'):
+                        yield self._create_event('image_preview', {
+                            'image': visualizer_result.data['image'],
+                            'iteration': iteration
+                        })
+
+                # Each iteration is written as it finishes, so a run that fails or
+                # is cancelled later still keeps the iterations it completed
+                figure_row = self._figure_record(
+                    figure_id, user_id, project_id, prompt, diagram_type, domain, {
+                        **visualizer_result.data,
+                        'quality_score': critic_result.data.get('quality_score'),
+                        'iterations': iteration
+                    }, 'generating'
+                )
+                self.persistence.enqueue(figure_row, [{
+                    **self._generation_record(prompt, iteration, visualizer_result.data, critic_result.data, improvements),
+                    'figure_id': figure_id
+                }])
 
                 if not critic_result.data['should_refine'] or iteration >= self.max_iterations:
+                    exports = {}
+                    if visualizer_result.data.get('image'):
+                        yield self._create_event('status', {
+                            'message': 'Rendering full-resolution figure...',
+                            'stage': 'finalizing',
+                            'iteration': iteration
+                        })
+                        try:
+                            exports = await self._timed('finalize', self.visualizer.finalize(
+                                visualizer_result.data['code'],
+                                data_info or {},
+                                visualizer_result.data.get('reduction'),
+                                rc_params
+                            ))
+                            if not exports.get('full'):
+                                raise Exception("the renderer returned no full-resolution image")
+                        except Exception as e:
+                            # The preview is not publication resolution, so it is
+                            # never passed off as the final figure
+                            logger.exception("Final render failed")
+                            yield self._create_event('error', {'message': f'Final render failed: {str(e)}'})
+                            return
+
                     yield self._create_event('status', {
                         'message': 'Diagram generation complete!',
                         'stage': 'complete'
                     })
 
                     final_data = {
-                        'image_data': visualizer_result.data.get('image_data'),
+                        'image': exports.pop('full', None),
+                        'thumbnail': visualizer_result.data.get('thumbnail'),
+                        'exports': exports,
                         'a2ui_payload': visualizer_result.data.get('a2ui_payload'),
                         'code': visualizer_result.data.get('code'),
                         'specification': stylist_result.data['enhanced_specification'],
@@ -158,68 +395,384 @@ class DiagramOrchestrator:
                         'iterations': iteration
                     }
 
-                    figure_id = await self._save_to_database(
-                        user_id, project_id, prompt, diagram_type, domain, final_data
-                    )
+                    with span('stage', 'persist'):
+                        figure_row = self._figure_record(
+                            figure_id, user_id, project_id, prompt, diagram_type, domain, final_data, 'completed'
+                        )
+                        self.persistence.enqueue(figure_row, [])
 
-                    yield self._create_event('complete', {
+                    complete_data = {
                         'figure_id': figure_id,
                         'data': final_data
-                    })
+                    }
+                    if include_trace:
+                        complete_data['trace'] = trace.to_dict()
+                    yield self._create_event('complete', complete_data)
                     return
 
-                current_spec = f"{stylist_result.data['enhanced_specification']}\n\nFeedback from previous iteration:\n{critic_result.data['evaluation']}"
+                ranked_improvements = critic_result.data.get('improvements') or []
+                current_spec = self.token_budget.refinement_spec(planner_spec, ranked_improvements)
+                if self.refinement_mode == 'patch':
+                    previous_code = visualizer_result.data.get('code')
+                    improvements = format_improvements(
+                        self.token_budget.select_improvements(ranked_improvements)
+                    ) or critic_result.data['evaluation']
                 iteration += 1
 
         except Exception as e:
             yield self._create_event('error', {'message': f'Orchestration error: {str(e)}'})
+        finally:
+            if figure_row is not None and figure_row['status'] == 'generating':
+                self.persistence.enqueue({**figure_row, 'status': 'failed'}, [])
 
-    async def _save_to_database(
+    async def generate_batch(
+        self,
+        figures: List[Dict[str, Any]],
+        domain: str,
+        user_id: str,
+        project_id: Optional[str] = None,
+        style_notes: Optional[str] = None,
+        concurrency: Optional[int] = None,
+        include_trace: bool = False,
+        refresh: bool = False,
+        in_slot: Optional[WorkSlot] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        # Events of every figure are multiplexed into one stream and tagged with
+        # the figure's index; per-figure outcomes use figure_complete and
+        # figure_error so only the batch itself ends the stream. in_slot wraps
+        # each unit of work, which is how the caller's scheduler limits a batch.
+        in_slot = in_slot or (lambda generate: generate())
+        if refresh:
+            bypass_response_cache()
+        trace = start_trace()
+        tasks: List[asyncio.Task] = []
+        try:
+            yield self._create_event('status', {
+                'message': f'Starting batch of {len(figures)} figures...',
+                'stage': 'init',
+                'figures': len(figures)
+            })
+
+            prepared: Dict[str, Any] = {}
+            async for event in in_slot(lambda: self._prepare_batch(figures, domain, style_notes, prepared)):
+                yield event
+            if 'references' not in prepared:
+                return
+
+            queue: asyncio.Queue = asyncio.Queue()
+            semaphore = asyncio.Semaphore(max(1, min(concurrency or self.batch_concurrency, self.batch_concurrency)))
+
+            async def run_figure(index: int, figure: Dict[str, Any]) -> None:
+                try:
+                    async with semaphore:
+                        async for event in in_slot(lambda: self.generate_diagram(
+                            prompt=figure['prompt'],
+                            diagram_type=figure['type'],
+                            domain=domain,
+                            user_id=user_id,
+                            project_id=project_id,
+                            data_info=figure.get('data_info'),
+                            candidates=figure.get('candidates'),
+                            include_trace=include_trace,
+                            refresh=refresh,
+                            references=prepared['references'],
+                            style_guide=prepared['style_guide'],
+                            batch_id=batch_id
+                        )):
+                            queue.put_nowait((index, event))
+                except Exception as e:
+                    # A full scheduler queue fails this figure, not the batch
+                    queue.put_nowait((index, self._create_event('error', {'message': str(e)})))
+                finally:
+                    queue.put_nowait((index, None))
+
+            batch_id = str(uuid.uuid4())
+            tasks = [asyncio.create_task(run_figure(index, figure)) for index, figure in enumerate(figures)]
+
+            outcomes: List[Dict[str, Any]] = [{'figure': index, 'status': 'error'} for index in range(len(figures))]
+            remaining = len(tasks)
+            while remaining:
+                index, event = await queue.get()
+                if event is None:
+                    remaining -= 1
+                    continue
+
+                event_type = event['type']
+                if event_type == 'complete':
+                    event_type = 'figure_complete'
+                    outcomes[index] = {
+                        'figure': index,
+                        'status': 'complete',
+                        'figure_id': event['data']['figure_id'],
+                        'quality_score': event['data']['data'].get('quality_score')
+                    }
+                elif event_type == 'error':
+                    event_type = 'figure_error'
+                    outcomes[index]['message'] = event['data'].get('message')
+                yield self._create_event(event_type, {**event['data'], 'figure': index})
+
+            completed = sum(1 for outcome in outcomes if outcome['status'] == 'complete')
+            if not completed:
+                yield self._create_event('error', {'message': 'Every figure in the batch failed', 'figures': outcomes})
+                return
+
+            complete_data = {'figures': outcomes, 'completed': completed, 'failed': len(figures) - completed}
+            if include_trace:
+                complete_data['trace'] = trace.to_dict()
+            yield self._create_event('complete', complete_data)
+
+        except Exception as e:
+            yield self._create_event('error', {'message': f'Orchestration error: {str(e)}'})
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _prepare_batch(
+        self,
+        figures: List[Dict[str, Any]],
+        domain: str,
+        style_notes: Optional[str],
+        prepared: Dict[str, Any]
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        # Retrieval and the shared style guide, run once for the whole batch;
+        # results go into prepared, which stays empty if a step failed
+        yield self._create_event('status', {'message': 'Retrieving reference diagrams for the batch...', 'stage': 'retrieval'})
+        types = [figure['type'] for figure in figures]
+        retriever_result = await self._timed('retrieval', self.retriever.execute({
+            'prompt': ' '.join(figure['prompt'] for figure in figures),
+            'type': max(set(types), key=types.count),
+            'domain': domain
+        }), figures=len(figures))
+
+        if not retriever_result.success:
+            yield self._create_event('error', {'message': f'Retrieval failed: {retriever_result.error}'})
+            return
+
+        yield self._create_event('agent_complete', {
+            'agent': 'RetrieverAgent',
+            'data': retriever_result.data
+        })
+
+        # Without style notes every figure gets its domain's preset, which
+        # is already consistent across the paper
+        style_guide = None
+        if style_notes or not STYLE_PRESETS_ENABLED:
+            yield self._create_event('status', {'message': 'Creating a shared style guide...', 'stage': 'styling'})
+            async for item in self._stream_agent(self.stylist, {
+                'specification': self._batch_overview(figures, domain, style_notes),
+                'domain': domain,
+                'diagram_type': 'set of figures for one paper'
+            }, stage='styling'):
+                if isinstance(item, AgentResult):
+                    stylist_result = item
+                else:
+                    yield item
+
+            if not stylist_result.success:
+                yield self._create_event('error', {'message': f'Styling failed: {stylist_result.error}'})
+                return
+
+            yield self._create_event('agent_complete', {
+                'agent': 'StylistAgent',
+                'data': stylist_result.data
+            })
+
+            style_guide = stylist_result.data['enhanced_specification']
+
+        prepared['references'] = retriever_result.data
+        prepared['style_guide'] = style_guide
+
+    def _batch_overview(self, figures: List[Dict[str, Any]], domain: str, style_notes: Optional[str]) -> str:
+        listing = "\n".join(
+            f"{index + 1}. {figure['type']}: {figure['prompt']}" for index, figure in enumerate(figures)
+        )
+        overview = f"""
+        A set of {len(figures)} figures for one {domain} manuscript. They must share one visual
+        identity: palette, typography, line weights, marker set and legend placement. Write the
+        style as a guide that applies to every figure, not to any single one.
+
+        Figures:
+        {listing}
+        """
+        if style_notes:
+            overview += f"\nAuthor's style notes: {style_notes}\n"
+        return overview
+
+    def _apply_style_guide(self, specification: str, style_guide: str, domain: str, diagram_type: str) -> AgentResult:
+        return AgentResult(
+            success=True,
+            data={
+                'enhanced_specification': f"{specification}\n\nShared style guide for every figure in this paper:\n{style_guide}",
+                'domain': domain,
+                'diagram_type': diagram_type
+            },
+            metadata={'agent': 'StylistAgent', 'shared': True}
+        )
+
+    def _apply_style_preset(
+        self,
+        specification: str,
+        style_preset: Dict[str, Any],
+        domain: str,
+        diagram_type: str
+    ) -> AgentResult:
+        return AgentResult(
+            success=True,
+            data={
+                'enhanced_specification': f"{specification}\n\n{style_preset['text']}",
+                'domain': domain,
+                'diagram_type': diagram_type,
+                'style_preset': style_preset['name']
+            },
+            metadata={'agent': 'StylistAgent', 'preset': style_preset['name']}
+        )
+
+    def _cache_scope(
         self,
         user_id: str,
-        project_id: Optional[str],
-        prompt: str,
         diagram_type: str,
         domain: str,
-        data: Dict[str, Any]
+        data_info: Optional[Dict[str, Any]]
     ) -> str:
-        try:
-            figure_data = {
-                'user_id': user_id,
-                'project_id': project_id,
-                'type': diagram_type,
-                'prompt': prompt,
-                'domain': domain,
-                'diagram_data': data.get('a2ui_payload', {}),
-                'parameters': {
-                    'quality_score': data.get('quality_score'),
-                    'iterations': data.get('iterations')
-                },
-                'iteration_count': data.get('iterations', 1),
-                'status': 'completed'
-            }
-
-            result = self.supabase.table('figures').insert(figure_data).execute()
-
-            if result.data and len(result.data) > 0:
-                figure_id = result.data[0]['id']
-
-                generation_data = {
-                    'figure_id': figure_id,
-                    'iteration': data.get('iterations', 1),
-                    'prompt': prompt,
-                    'parameters': data.get('a2ui_payload', {}),
-                    'agent_feedback': data.get('evaluation', ''),
-                    'diagram_data': data.get('a2ui_payload', {})
-                }
+        # Plans only transfer between one user's requests for the same kind of
+        # figure over the same data; a plan quotes the prompt and data it came from
+        data_key = json.dumps(data_info or {}, sort_keys=True, default=str)
+        return ContentCache.make_key(user_id, diagram_type, domain, data_key)
 
-                self.supabase.table('generations').insert(generation_data).execute()
+    def _lookup_plan(self, prompt: str, scope: str, batch_id: Optional[str] = None) -> Optional[tuple]:
+        if self.semantic_cache is None:
+            return None
+        cached = self.semantic_cache.lookup(prompt, scope, batch_id)
+        SEMANTIC_CACHE_LOOKUPS.labels('hit' if cached else 'miss').inc()
+        return cached
 
-                return figure_id
+    def _lint_verdict(self, lint: Optional[Dict[str, Any]], iteration: int) -> Optional[AgentResult]:
+        if not lint:
+            return None
 
+        # Layout errors are certain failures; a clean lint says nothing about
+        # scientific content, so accepting on it alone is opt-in
+        if lint['errors'] and iteration < self.max_iterations:
+            should_refine = True
+        elif self.lint_skip_critic and not lint['errors'] and lint['score'] >= self.lint_accept_score:
+            should_refine = False
+        else:
             return None
-        except Exception as e:
-            raise Exception(f"Database save failed: {str(e)}")
+
+        CRITIC_SKIPS.labels('refine' if should_refine else 'accept').inc()
+        issues = sorted(lint['issues'], key=lambda issue: issue['severity'] != 'error')
+        improvements = [issue['message'] for issue in issues]
+        evaluation = f"Automated checks: {lint['score']}/10 - {'Refine' if should_refine else 'Accept'}"
+        if improvements:
+            evaluation += f"\n{format_improvements(improvements)}"
+
+        return AgentResult(
+            success=True,
+            data={
+                'evaluation': evaluation,
+                'improvements': improvements,
+                'should_refine': should_refine,
+                'quality_score': lint['score'],
+                'iteration': iteration,
+                'source': 'lint'
+            },
+            metadata={'agent': 'FigureLinter', 'iteration': iteration}
+        )
+
+    def _needs_restyle(self, improvements: Optional[str]) -> bool:
+        if self.refinement_mode != 'patch' or not improvements:
+            return True
+        improvements_lower = improvements.lower()
+        return any(keyword in improvements_lower for keyword in STYLE_KEYWORDS)
+
+    async def _stream_agent(
+        self,
+        agent: BaseAgent,
+        input_data: Dict[str, Any],
+        iteration: Optional[int] = None,
+        stage: Optional[str] = None
+    ) -> AsyncGenerator[Any, None]:
+        # Yields agent_delta events while the agent's LLM response streams in,
+        # then the AgentResult itself as the final item.
+        queue: asyncio.Queue = asyncio.Queue()
+        task = asyncio.create_task(self._timed(
+            stage or agent.agent_name,
+            agent.execute({**input_data, 'on_chunk': queue.put_nowait}),
+            iteration=iteration
+        ))
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+
+        try:
+            while True:
+                delta = await queue.get()
+                if delta is None:
+                    break
+
+                event_data = {'agent': agent.agent_name, 'delta': delta}
+                if iteration is not None:
+                    event_data['iteration'] = iteration
+                yield self._create_event('agent_delta', event_data)
+        finally:
+            if not task.done():
+                task.cancel()
+
+        yield task.result()
+
+    async def _timed(self, stage: str, awaitable, **attributes) -> Any:
+        with span('stage', stage, **{key: value for key, value in attributes.items() if value is not None}):
+            return await awaitable
+
+    def _figure_record(
+        self,
+        figure_id: str,
+        user_id: str,
+        project_id: Optional[str],
+        prompt: str,
+        diagram_type: str,
+        domain: str,
+        data: Dict[str, Any],
+        status: str
+    ) -> Dict[str, Any]:
+        # Every row for a figure has the same keys, as a bulk upsert requires
+        return {
+            'id': figure_id,
+            'user_id': user_id,
+            'project_id': project_id,
+            'type': diagram_type,
+            'prompt': prompt,
+            'domain': domain,
+            'diagram_data': data.get('a2ui_payload', {}),
+            'file_url': (data.get('image') or {}).get('url'),
+            'thumbnail_url': (data.get('thumbnail') or {}).get('url'),
+            'parameters': {
+                'quality_score': data.get('quality_score'),
+                'iterations': data.get('iterations')
+            },
+            'iteration_count': data.get('iterations', 1),
+            'status': status
+        }
+
+    def _generation_record(
+        self,
+        prompt: str,
+        iteration: int,
+        visualizer_data: Dict[str, Any],
+        critic_data: Dict[str, Any],
+        changes_made: Optional[str]
+    ) -> Dict[str, Any]:
+        return {
+            'id': str(uuid.uuid4()),
+            'iteration': iteration,
+            'prompt': prompt,
+            'parameters': {
+                'quality_score': critic_data.get('quality_score'),
+                'refinement': visualizer_data.get('refinement')
+            },
+            'agent_feedback': critic_data.get('evaluation', ''),
+            'changes_made': changes_made,
+            'file_url': (visualizer_data.get('image') or {}).get('url'),
+            'diagram_data': visualizer_data.get('a2ui_payload', {})
+        }
 
     def _create_event(self, event_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
         return {
@@ -50,7 +50,7 @@ class PlannerAgent(BaseAgent):
             Format as clear, actionable specifications for the Visualizer agent.
             """
 
-            specification = await self.generate_content(planning_prompt)
+            specification = await self.generate_content(planning_prompt, input_data.get('on_chunk'))
 
             return AgentResult(
                 success=True,
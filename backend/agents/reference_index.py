@@ -0,0 +1,199 @@
+import asyncio
+import math
+import os
+import re
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from services.metrics import span
+
+
+REFERENCE_INDEX_REFRESH_SECONDS = float(os.getenv("REFERENCE_INDEX_REFRESH_SECONDS", "60"))
+REFERENCE_INDEX_FULL_REFRESH_SECONDS = float(os.getenv("REFERENCE_INDEX_FULL_REFRESH_SECONDS", "3600"))
+
+TYPE_MATCH_BOOST = 0.25
+PAGE_SIZE = 1000
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it',
+    'of', 'on', 'or', 'that', 'the', 'this', 'to', 'with', 'show', 'showing', 'create'
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def _flatten_text(value: Any) -> Iterable[str]:
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _flatten_text(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _flatten_text(item)
+
+
+def reference_text(row: Dict[str, Any]) -> str:
+    parts = [row.get('type') or '', row.get('domain') or '', row.get('description') or '']
+    parts.extend(_flatten_text(row.get('metadata') or {}))
+    return ' '.join(parts).replace('_', ' ')
+
+
+class ReferenceIndex:
+    def __init__(
+        self,
+        supabase_client,
+        refresh_seconds: float = REFERENCE_INDEX_REFRESH_SECONDS,
+        full_refresh_seconds: float = REFERENCE_INDEX_FULL_REFRESH_SECONDS
+    ):
+        self.supabase = supabase_client
+        self.refresh_seconds = refresh_seconds
+        self.full_refresh_seconds = full_refresh_seconds
+
+        self.rows: List[Dict[str, Any]] = []
+        self._positions: Dict[str, int] = {}
+        self._vocabulary: Dict[str, int] = {}
+        # Log term frequencies per row; a row holds a few dozen of the corpus-wide
+        # terms, so the weighted matrix is kept as (row, column, weight) triples
+        self._terms: List[Dict[int, float]] = []
+        self._idf = np.zeros(0, dtype=np.float32)
+        self._term_rows = np.zeros(0, dtype=np.int64)
+        self._term_columns = np.zeros(0, dtype=np.int64)
+        self._term_weights = np.zeros(0, dtype=np.float32)
+        self._types = np.array([], dtype=object)
+        self._domains = np.array([], dtype=object)
+
+        self._latest_created_at: Optional[str] = None
+        self._last_refresh = 0.0
+        self._last_full_refresh = 0.0
+        self._lock = asyncio.Lock()
+
+    async def refresh(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_refresh < self.refresh_seconds:
+            return
+
+        async with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_refresh < self.refresh_seconds:
+                return
+
+            # created_at only tells us about new rows, so edits and deletions are
+            # picked up by a periodic full rebuild.
+            full = force or not self.rows or now - self._last_full_refresh >= self.full_refresh_seconds
+            with span('db', 'reference_index', full=full):
+                rows = await asyncio.to_thread(self._fetch_rows, None if full else self._latest_created_at)
+
+            if full:
+                self._reset()
+                self._last_full_refresh = now
+            else:
+                rows = [row for row in rows if row['id'] not in self._positions]
+            self.upsert(rows)
+            self._last_refresh = now
+
+    def upsert(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+
+        for row in {row['id']: row for row in rows}.values():
+            counts: Dict[int, float] = {}
+            for token in tokenize(reference_text(row)):
+                column = self._vocabulary.setdefault(token, len(self._vocabulary))
+                counts[column] = counts.get(column, 0.0) + 1.0
+            terms = {column: 1.0 + math.log(count) for column, count in counts.items()}
+
+            position = self._positions.get(row['id'])
+            if position is None:
+                self._positions[row['id']] = len(self.rows)
+                self.rows.append(row)
+                self._terms.append(terms)
+            else:
+                self.rows[position] = row
+                self._terms[position] = terms
+
+            created_at = row.get('created_at')
+            if created_at and (self._latest_created_at is None or created_at > self._latest_created_at):
+                self._latest_created_at = created_at
+
+        self._reweight()
+
+    def search(self, query: str, diagram_type: str, domain: str, k: int = 3) -> List[Tuple[Dict[str, Any], float]]:
+        if not self.rows:
+            return []
+
+        query_vector = np.zeros(len(self._vocabulary), dtype=np.float32)
+        for token in tokenize(f"{query} {diagram_type} {domain}".replace('_', ' ')):
+            column = self._vocabulary.get(token)
+            if column is not None:
+                query_vector[column] += 1.0
+        np.log1p(query_vector, out=query_vector, where=query_vector > 0)
+        query_vector *= self._idf
+        norm = np.linalg.norm(query_vector)
+        if norm > 0:
+            query_vector /= norm
+
+        scores = np.bincount(
+            self._term_rows,
+            weights=self._term_weights * query_vector[self._term_columns],
+            minlength=len(self.rows)
+        )
+        scores = scores + TYPE_MATCH_BOOST * (self._types == diagram_type)
+
+        # Same-domain references only, unless the domain has none at all
+        candidates = np.flatnonzero(self._domains == domain)
+        if candidates.size == 0:
+            candidates = np.arange(len(self.rows))
+
+        k = min(k, candidates.size)
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(self.rows[position], float(scores[position])) for position in top]
+
+    def _reset(self) -> None:
+        self.rows = []
+        self._positions = {}
+        self._vocabulary = {}
+        self._terms = []
+        self._latest_created_at = None
+
+    def _reweight(self) -> None:
+        lengths = np.array([len(terms) for terms in self._terms], dtype=np.int64)
+        rows = np.repeat(np.arange(len(self._terms)), lengths)
+        columns = np.fromiter((column for terms in self._terms for column in terms), dtype=np.int64, count=len(rows))
+        counts = np.fromiter((count for terms in self._terms for count in terms.values()), dtype=np.float32, count=len(rows))
+
+        document_frequency = np.bincount(columns, minlength=len(self._vocabulary))
+        self._idf = (np.log((1 + len(self._terms)) / (1 + document_frequency)) + 1).astype(np.float32)
+
+        weights = counts * self._idf[columns]
+        norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=len(self._terms)))
+        norms[norms == 0] = 1.0
+        self._term_rows = rows
+        self._term_columns = columns
+        self._term_weights = (weights / norms[rows]).astype(np.float32)
+
+        self._types = np.array([row.get('type') for row in self.rows], dtype=object)
+        self._domains = np.array([row.get('domain') for row in self.rows], dtype=object)
+
+    def _fetch_rows(self, created_after: Optional[str]) -> List[Dict[str, Any]]:
+        rows = []
+        start = 0
+        while True:
+            query = self.supabase.table('diagram_references') \
+                .select('id,type,domain,description,metadata,reference_url,created_at') \
+                .order('created_at')
+            if created_after:
+                # Rows sharing the latest timestamp may have landed after the last
+                # fetch, so that timestamp is read again and known ids skipped
+                query = query.gte('created_at', created_after)
+
+            response = query.range(start, start + PAGE_SIZE - 1).execute()
+            page = response.data or []
+            rows.extend(page)
+            if len(page) < PAGE_SIZE:
+                return rows
+            start += PAGE_SIZE
@@ -0,0 +1,168 @@
+import asyncio
+import multiprocessing
+import os
+from typing import Any, Dict, List, Optional
+from services.metrics import CANCELLATIONS, RENDER_CPU_TIME, RENDER_PEAK_MEMORY, annotate, span
+
+
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(os.cpu_count() or 2)))
+RENDER_MAX_RENDERS_PER_WORKER = int(os.getenv("RENDER_MAX_RENDERS_PER_WORKER", "25"))
+RENDER_CPU_SECONDS = float(os.getenv("RENDER_CPU_SECONDS", "30"))
+RENDER_WALL_SECONDS = float(os.getenv("RENDER_WALL_SECONDS", "60"))
+RENDER_MEMORY_MB = int(os.getenv("RENDER_MEMORY_MB", "2048"))
+
+# Extra time the parent waits past the worker's own wall clock before killing it
+KILL_GRACE_SECONDS = 5.0
+
+# Draws text, a legend and a PNG so fonts, the Agg backend and the linter are all loaded
+WARMUP_CODE = """
+fig, ax = plt.subplots(figsize=(2, 2))
+ax.plot([0, 1], [0, 1], label='warm-up')
+ax.set_title('warm-up')
+ax.legend()
+"""
+
+
+def _worker_entry(conn, limits: Dict[str, Any]) -> None:
+    # Matplotlib, pandas and pyarrow are imported in the worker only, never in the API process
+    from .render_worker import worker_main
+    worker_main(conn, limits)
+
+
+class RenderError(Exception):
+    pass
+
+
+class _RenderWorker:
+    def __init__(self, ctx, limits: Dict[str, Any]):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_entry,
+            args=(child_conn, limits),
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.renders = 0
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def exchange(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        self.conn.send(request)
+        return self.conn.recv()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+
+class RenderPool:
+    def __init__(
+        self,
+        size: int = RENDER_WORKERS,
+        max_renders_per_worker: int = RENDER_MAX_RENDERS_PER_WORKER,
+        cpu_seconds: float = RENDER_CPU_SECONDS,
+        wall_seconds: float = RENDER_WALL_SECONDS,
+        memory_mb: int = RENDER_MEMORY_MB
+    ):
+        self.size = max(1, size)
+        self.max_renders_per_worker = max_renders_per_worker
+        self.wall_seconds = wall_seconds
+        self.limits = {
+            'cpu_seconds': cpu_seconds,
+            'wall_seconds': wall_seconds,
+            'memory_mb': memory_mb
+        }
+        self.stats = {'renders': 0, 'failures': 0, 'timeouts': 0, 'cancelled': 0, 'workers_recycled': 0}
+        self._ctx = multiprocessing.get_context('spawn')
+        self._idle: List[_RenderWorker] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+        return self._slots
+
+    def _acquire_worker(self) -> _RenderWorker:
+        while self._idle:
+            worker = self._idle.pop()
+            if worker.is_alive():
+                return worker
+            worker.kill()
+        return _RenderWorker(self._ctx, self.limits)
+
+    def _release_worker(self, worker: _RenderWorker, healthy: bool) -> None:
+        worker.renders += 1
+        if healthy and worker.is_alive() and worker.renders < self.max_renders_per_worker:
+            self._idle.append(worker)
+            return
+        self.stats['workers_recycled'] += 1
+        worker.kill()
+
+    async def render(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        with span('render', 'render', outputs=[output['name'] for output in request.get('outputs', [])]):
+            return await self._render(request)
+
+    async def _render(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        async with self._get_slots():
+            worker = self._acquire_worker()
+            healthy = False
+            try:
+                # A large request fills the pipe until the worker reads it, so the
+                # send blocks as long as the recv and stays off the event loop too
+                result = await asyncio.wait_for(
+                    asyncio.to_thread(worker.exchange, request),
+                    timeout=self.wall_seconds + KILL_GRACE_SECONDS
+                )
+                healthy = True
+            except asyncio.TimeoutError:
+                self.stats['timeouts'] += 1
+                raise RenderError(f"Render did not finish within {self.wall_seconds:.0f}s")
+            except (EOFError, OSError):
+                self.stats['failures'] += 1
+                raise RenderError("Render worker exited unexpectedly (resource limit exceeded?)")
+            except asyncio.CancelledError:
+                # The worker is left unhealthy, so it is killed mid-render
+                self.stats['cancelled'] += 1
+                CANCELLATIONS.labels('render').inc()
+                raise
+            finally:
+                self._release_worker(worker, healthy)
+
+        self.stats['renders'] += 1
+        usage = result.get('usage')
+        if usage:
+            RENDER_CPU_TIME.observe(usage['cpu_seconds'])
+            RENDER_PEAK_MEMORY.observe(usage['peak_memory_bytes'])
+            annotate(**usage)
+        if 'error' in result:
+            self.stats['failures'] += 1
+            raise RenderError(result['error'])
+        return result
+
+    async def warm_up(self, workers: int = 1) -> None:
+        # Starting workers before the first request moves process spawn, imports
+        # and the matplotlib font cache out of the first generation's latency
+        request = {
+            'code': WARMUP_CODE,
+            'outputs': [{'name': 'warmup', 'format': 'png', 'dpi': 50}],
+            'lint': True
+        }
+        await asyncio.gather(*[self._render(request) for _ in range(min(workers, self.size))])
+
+    def close(self) -> None:
+        while self._idle:
+            self._idle.pop().kill()
+
+
+_pool: Optional[RenderPool] = None
+
+
+def get_render_pool() -> RenderPool:
+    global _pool
+    if _pool is None:
+        _pool = RenderPool()
+    return _pool
@@ -0,0 +1,239 @@
+import os
+
+os.environ.setdefault('OPENBLAS_NUM_THREADS', '1')
+os.environ.setdefault('OMP_NUM_THREADS', '1')
+
+import hashlib
+import io
+import json
+import pickle
+import resource
+import signal
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from .data_reduction import reduce_frame
+from .figure_lint import lint_figure
+
+
+RENDER_DATASET_CACHE_SIZE = int(os.getenv("RENDER_DATASET_CACHE_SIZE", "2"))
+
+# Datasets are content-addressed files, so a cached frame never goes stale
+_datasets: "OrderedDict[str, pd.DataFrame]" = OrderedDict()
+
+
+class RenderLimitExceeded(BaseException):
+    # BaseException so generated code cannot swallow it with a bare `except Exception`
+    pass
+
+
+def _on_cpu_limit(signum, frame):
+    raise RenderLimitExceeded("Render exceeded its CPU time limit")
+
+
+def _on_wall_limit(signum, frame):
+    raise RenderLimitExceeded("Render exceeded its wall time limit")
+
+
+def _apply_memory_limit(memory_mb: int) -> None:
+    if memory_mb <= 0:
+        return
+    limit = memory_mb * 1024 * 1024
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _run_with_limits(request: Dict[str, Any], cpu_seconds: float, wall_seconds: float) -> Dict[str, Any]:
+    # RLIMIT_CPU counts the whole process lifetime, so each render gets a soft
+    # limit relative to what the worker has already used.
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    cpu_limit = int(usage.ru_utime + usage.ru_stime + cpu_seconds) + 1
+    if hard != resource.RLIM_INFINITY:
+        cpu_limit = min(cpu_limit, hard)
+
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, hard))
+    signal.setitimer(signal.ITIMER_REAL, wall_seconds)
+    try:
+        return render(request)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _read_arrow(path: str) -> pd.DataFrame:
+    # Columns without nulls become views of the mapped file rather than copies
+    with pa.memory_map(path) as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True)
+
+
+def _write_arrow(frame: pd.DataFrame, path: str) -> None:
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with pa.ipc.new_file(tmp_path, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def _load_dataset(path: str, reduction: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+    key = path
+    if reduction:
+        params = json.dumps(reduction, sort_keys=True)
+        key = f"{path[:-len('.arrow')]}.{hashlib.sha256(params.encode('utf-8')).hexdigest()[:16]}.arrow"
+
+    frame = _datasets.get(key)
+    if frame is not None:
+        _datasets.move_to_end(key)
+        return frame
+
+    if key == path:
+        frame = _read_arrow(path)
+    elif os.path.exists(key):
+        # Reduced frames are stored beside their dataset and shared by every worker
+        frame = _read_arrow(key)
+    else:
+        frame = reduce_frame(_load_dataset(path), reduction)
+        try:
+            _write_arrow(frame, key)
+        except OSError:
+            pass
+
+    _datasets[key] = frame
+    while len(_datasets) > RENDER_DATASET_CACHE_SIZE:
+        _datasets.popitem(last=False)
+    return frame
+
+
+def _execute(
+    code: str,
+    data_info: Dict[str, Any],
+    dataset_path: Optional[str] = None,
+    reduction: Optional[Dict[str, Any]] = None
+) -> Optional[Figure]:
+    namespace = {
+        '__name__': '__render__',
+        'plt': plt,
+        'np': np,
+        'pd': pd,
+        'io': io,
+        'data_info': data_info
+    }
+    if dataset_path:
+        # A shallow copy keeps column edits by one render out of the cached frame
+        namespace['df'] = _load_dataset(dataset_path, reduction).copy(deep=False)
+
+    # The renderer saves at each requested resolution itself, so calls from the
+    # generated code only record which figure was meant to be saved.
+    saved: List[Figure] = []
+    original_savefig = Figure.savefig
+    Figure.savefig = lambda figure, *args, **kwargs: saved.append(figure)
+    try:
+        exec(code, namespace)
+    finally:
+        Figure.savefig = original_savefig
+
+    if saved:
+        return saved[-1]
+    if plt.get_fignums():
+        return plt.gcf()
+    return None
+
+
+def _save(figure: Figure, output: Dict[str, Any]) -> bytes:
+    dpi = output.get('dpi')
+    if output.get('max_width'):
+        dpi = output['max_width'] / figure.get_figwidth()
+
+    buf = io.BytesIO()
+    figure.savefig(buf, format=output.get('format', 'png'), dpi=dpi or 'figure', bbox_inches='tight')
+    return buf.getvalue()
+
+
+def _cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def render(request: Dict[str, Any]) -> Dict[str, Any]:
+    cpu_start = _cpu_seconds()
+    # Style presets are applied as rcParams for the whole render, so artists
+    # created by the code and the saved output both pick them up
+    with plt.rc_context(request.get('rc_params') or {}):
+        return _render(request, cpu_start)
+
+
+def _render(request: Dict[str, Any], cpu_start: float) -> Dict[str, Any]:
+    try:
+        figure = None
+        if request.get('figure'):
+            try:
+                figure = pickle.loads(request['figure'])
+            except Exception:
+                figure = None
+        if figure is None:
+            figure = _execute(
+                request['code'],
+                request.get('data_info') or {},
+                request.get('dataset_path'),
+                request.get('reduction')
+            )
+
+        result = {'outputs': {}}
+        if figure is not None:
+            result['outputs'] = {output['name']: _save(figure, output) for output in request.get('outputs', [])}
+        if figure is not None and request.get('lint'):
+            # Checked after saving so the linter sees the layout that was rendered
+            try:
+                result['lint'] = lint_figure(figure)
+            except Exception as e:
+                result['lint_error'] = f"{type(e).__name__}: {str(e)}"
+        if figure is not None and request.get('keep_figure'):
+            try:
+                result['figure'] = pickle.dumps(figure)
+            except Exception:
+                pass
+
+        result['usage'] = {
+            'cpu_seconds': round(_cpu_seconds() - cpu_start, 4),
+            # ru_maxrss is in kilobytes on Linux and covers the worker's lifetime
+            'peak_memory_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        }
+        return result
+    finally:
+        plt.close('all')
+
+
+def worker_main(conn, limits: Dict[str, Any]) -> None:
+    _apply_memory_limit(limits['memory_mb'])
+    signal.signal(signal.SIGXCPU, _on_cpu_limit)
+    signal.signal(signal.SIGALRM, _on_wall_limit)
+
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            break
+
+        try:
+            result = _run_with_limits(request, limits['cpu_seconds'], limits['wall_seconds'])
+        except RenderLimitExceeded as e:
+            result = {'error': str(e)}
+        except MemoryError:
+            result = {'error': 'Render exceeded its memory limit'}
+        except BaseException as e:
+            result = {'error': f"{type(e).__name__}: {str(e)}"}
+
+        try:
+            conn.send(result)
+        except (EOFError, OSError):
+            break
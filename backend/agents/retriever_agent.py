@@ -1,11 +1,17 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
+import os
 from .base_agent import BaseAgent, AgentResult
+from .reference_index import ReferenceIndex
+
+
+REFERENCE_TOP_K = int(os.getenv("REFERENCE_TOP_K", "3"))
 
 
 class RetrieverAgent(BaseAgent):
     def __init__(self, supabase_client, model_name: str = "gemini-pro"):
         super().__init__(model_name)
         self.supabase = supabase_client
+        self.index = ReferenceIndex(supabase_client)
 
     async def execute(self, input_data: Dict[str, Any]) -> AgentResult:
         try:
@@ -13,33 +19,17 @@ class RetrieverAgent(BaseAgent):
             domain = input_data.get('domain', 'general')
             prompt = input_data.get('prompt', '')
 
-            references = await self._find_references(diagram_type, domain)
-
-            analysis_prompt = f"""
-            Analyze these reference diagrams and identify which ones are most relevant
-            for the following request:
-
-            Type: {diagram_type}
-            Domain: {domain}
-            User Request: {prompt}
-
-            Available References:
-            {self._format_references(references)}
-
-            Return a JSON list of the top 3 most relevant reference IDs and explain why
-            each is relevant.
-            """
-
-            analysis = await self.generate_content(analysis_prompt)
+            ranked = await self._find_references(prompt, diagram_type, domain)
+            references = [{**row, 'score': round(score, 4)} for row, score in ranked]
 
             return AgentResult(
                 success=True,
                 data={
                     'references': references,
-                    'analysis': analysis,
-                    'selected_count': min(3, len(references))
+                    'analysis': self._format_analysis(ranked),
+                    'selected_count': len(references)
                 },
-                metadata={'agent': 'RetrieverAgent', 'reference_count': len(references)}
+                metadata={'agent': 'RetrieverAgent', 'reference_count': len(self.index.rows)}
             )
         except Exception as e:
             return AgentResult(
@@ -49,36 +39,24 @@ class RetrieverAgent(BaseAgent):
                 metadata={'agent': 'RetrieverAgent'}
             )
 
-    async def _find_references(self, diagram_type: str, domain: str) -> List[Dict[str, Any]]:
+    async def _find_references(self, prompt: str, diagram_type: str, domain: str) -> List[Tuple[Dict[str, Any], float]]:
         try:
-            response = self.supabase.table('diagram_references') \
-                .select('*') \
-                .eq('type', diagram_type) \
-                .eq('domain', domain) \
-                .limit(10) \
-                .execute()
-
-            if not response.data:
-                response = self.supabase.table('diagram_references') \
-                    .select('*') \
-                    .eq('domain', domain) \
-                    .limit(5) \
-                    .execute()
-
-            return response.data or []
+            await self.index.refresh()
         except Exception:
-            return []
+            # A stale index still ranks fine; retry the refresh on the next request
+            pass
+        return self.index.search(prompt, diagram_type, domain, REFERENCE_TOP_K)
 
-    def _format_references(self, references: List[Dict[str, Any]]) -> str:
-        if not references:
+    def _format_analysis(self, ranked: List[Tuple[Dict[str, Any], float]]) -> str:
+        if not ranked:
             return "No references found in database."
 
-        formatted = []
-        for ref in references:
+        formatted = ["Most relevant reference diagrams (cosine similarity to the request):"]
+        for ref, score in ranked:
             formatted.append(
-                f"- ID: {ref['id']}\n"
+                f"- ID: {ref['id']} (similarity {score:.2f})\n"
                 f"  Type: {ref['type']}\n"
                 f"  Domain: {ref['domain']}\n"
-                f"  Description: {ref.get('description', 'N/A')}\n"
+                f"  Description: {ref.get('description') or 'N/A'}"
             )
         return "\n".join(formatted)
@@ -0,0 +1,154 @@
+import hashlib
+import os
+import re
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from .reference_index import tokenize
+
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1024"))
+SEMANTIC_CACHE_DIMENSIONS = int(os.getenv("SEMANTIC_CACHE_DIMENSIONS", "2048"))
+
+# Word features carry most of the weight; character trigrams let
+# "net" match "network" and absorb plurals and typos, and word bigrams keep
+# "height versus weight" apart from "weight versus height"
+WORD_WEIGHT = 1.0
+TRIGRAM_WEIGHT = 0.35
+BIGRAM_WEIGHT = 0.5
+
+# Tokens that change what a figure shows while barely moving the similarity;
+# entries are only reused when these match exactly
+SIGNATURE_PATTERN = re.compile(
+    r"\d+(?:\.\d+)?|\b(?:no|not|without|none|never|neither|nor|except|excluding|exclude|omit|"
+    r"hide|remove|one|two|three|four|five|six|seven|eight|nine|ten|single|double|twice)\b|n't\b"
+)
+
+
+def _bucket(feature: str, dimensions: int) -> int:
+    # Python's hash() is salted per process, so use a stable digest
+    return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little') % dimensions
+
+
+def _features(text: str) -> List[Tuple[str, float]]:
+    features = []
+    tokens = tokenize(text.replace('_', ' '))
+    for token in tokens:
+        features.append((f"w:{token}", WORD_WEIGHT))
+        padded = f"<{token}>"
+        features.extend((f"c:{padded[i:i + 3]}", TRIGRAM_WEIGHT) for i in range(len(padded) - 2))
+    features.extend((f"b:{first} {second}", BIGRAM_WEIGHT) for first, second in zip(tokens, tokens[1:]))
+    return features
+
+
+def signature(text: str) -> str:
+    return ' '.join(sorted(SIGNATURE_PATTERN.findall(text.lower())))
+
+
+def embed(text: str, dimensions: int = SEMANTIC_CACHE_DIMENSIONS) -> np.ndarray:
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for feature, weight in _features(text):
+        vector[_bucket(feature, dimensions)] += weight
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        dimensions: int = SEMANTIC_CACHE_DIMENSIONS
+    ):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.dimensions = dimensions
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+        # Fixed-size index: evicted slots are reused, so lookups are one matrix-vector product
+        self._vectors = np.zeros((max_entries, dimensions), dtype=np.float32)
+        self._scopes = np.full(max_entries, None, dtype=object)
+        self._signatures = np.full(max_entries, None, dtype=object)
+        # Entries stored by one batch never answer lookups from the same batch
+        self._groups = np.full(max_entries, None, dtype=object)
+        self._values: List[Optional[Dict[str, Any]]] = [None] * max_entries
+        self._lru: "OrderedDict[int, None]" = OrderedDict()
+        self._free = list(range(max_entries - 1, -1, -1))
+        self._entry_ids = [0] * max_entries
+        self._slots: Dict[int, int] = {}
+        self._next_id = 1
+
+    def lookup(
+        self,
+        text: str,
+        scope: str,
+        exclude_group: Optional[str] = None
+    ) -> Optional[Tuple[int, float, Dict[str, Any]]]:
+        if not self._lru:
+            self.stats['misses'] += 1
+            return None
+
+        similarities = self._vectors @ embed(text, self.dimensions)
+        similarities[(self._scopes != scope) | (self._signatures != signature(text))] = -1
+        if exclude_group is not None:
+            similarities[self._groups == exclude_group] = -1
+        slot = int(np.argmax(similarities))
+        similarity = float(similarities[slot])
+        if similarity < self.threshold:
+            self.stats['misses'] += 1
+            return None
+
+        self.stats['hits'] += 1
+        self._lru.move_to_end(slot)
+        return self._entry_ids[slot], similarity, self._values[slot]
+
+    def store(self, text: str, scope: str, value: Dict[str, Any], group: Optional[str] = None) -> int:
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot, _ = self._lru.popitem(last=False)
+            del self._slots[self._entry_ids[slot]]
+            self.stats['evictions'] += 1
+
+        entry_id = self._next_id
+        self._next_id += 1
+        self._vectors[slot] = embed(text, self.dimensions)
+        self._scopes[slot] = scope
+        self._signatures[slot] = signature(text)
+        self._groups[slot] = group
+        self._values[slot] = value
+        self._entry_ids[slot] = entry_id
+        self._slots[entry_id] = slot
+        self._lru[slot] = None
+        return entry_id
+
+    def update(self, entry_id: int, **fields: Any) -> None:
+        # Entries can be evicted between being stored and being completed
+        slot = self._slots.get(entry_id)
+        if slot is not None:
+            self._values[slot] = {**self._values[slot], **fields}
+
+    def clear(self) -> None:
+        self._vectors[:] = 0
+        self._scopes[:] = None
+        self._signatures[:] = None
+        self._groups[:] = None
+        self._values = [None] * self.max_entries
+        self._lru.clear()
+        self._free = list(range(self.max_entries - 1, -1, -1))
+        self._slots.clear()
+
+    def summary(self) -> Dict[str, Any]:
+        return {**self.stats, 'entries': len(self._lru), 'threshold': self.threshold}
+
+
+_semantic_cache: Optional[SemanticCache] = None
+
+
+def get_semantic_cache() -> SemanticCache:
+    global _semantic_cache
+    if _semantic_cache is None:
+        _semantic_cache = SemanticCache()
+    return _semantic_cache
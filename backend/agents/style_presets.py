@@ -0,0 +1,194 @@
+import os
+import re
+from typing import Any, Dict, List
+
+
+STYLE_PRESETS_ENABLED = os.getenv("STYLE_PRESETS_ENABLED", "true").lower() == "true"
+
+# Phrases that ask for a look other than the house style. Bare words like "dark" or
+# "color" are left out: "dark matter density" or "colored by temperature" describe data
+CUSTOM_STYLE_PATTERN = re.compile(
+    r"\b(colou?r ?(schemes?|palettes?|themes?|maps?)|palettes?|fonts?|typefaces?|typography|"
+    r"(dark|light|night|black) (mode|theme|background)|"
+    r"(custom|different|own|specific|brand|corporate|journal) (colou?rs?|styles?|styling|themes?|look)|"
+    r"styled|styling|in the style of|in an? [\w-]+ style|[\w]+-style|"
+    r"monochrome|gr[ae]yscale|black and white|pastel|neon|xkcd|hand-drawn)\b"
+)
+
+DOMAIN_ALIASES = {
+    'chemistry': 'matter',
+    'materials': 'matter',
+    'physics': 'motion',
+    'mechanics': 'motion',
+    'biology': 'mind',
+    'neuroscience': 'mind',
+    'psychology': 'mind',
+    'machine_learning': 'mind',
+    'math': 'mathematics'
+}
+
+# Figure types the frontend and reference library use; anything else is treated as a diagram
+CHART_TYPES = {'statistical', 'chart', 'plot', 'graph', 'timeline', 'time_series', 'scatter', 'histogram'}
+
+BASE_RC = {
+    'font.family': 'sans-serif',
+    'font.sans-serif': ['Arial', 'Helvetica', 'Liberation Sans', 'DejaVu Sans'],
+    'font.size': 10,
+    'axes.titlesize': 11,
+    'axes.titleweight': 'bold',
+    'axes.labelsize': 10,
+    'xtick.labelsize': 9,
+    'ytick.labelsize': 9,
+    'legend.fontsize': 9,
+    'figure.titlesize': 12,
+    'axes.linewidth': 0.8,
+    'lines.linewidth': 1.5,
+    'lines.markersize': 5,
+    'patch.linewidth': 0.8,
+    'xtick.major.width': 0.8,
+    'ytick.major.width': 0.8,
+    'text.color': '#222222',
+    'axes.labelcolor': '#222222',
+    'axes.edgecolor': '#333333',
+    'xtick.color': '#333333',
+    'ytick.color': '#333333',
+    'figure.facecolor': 'white',
+    'axes.facecolor': 'white',
+    'legend.frameon': False,
+    # Keep text editable in vector exports
+    'pdf.fonttype': 42,
+    'svg.fonttype': 'none'
+}
+
+CATEGORY_RC = {
+    'chart': {
+        'axes.grid': True,
+        'grid.alpha': 0.3,
+        'grid.linewidth': 0.6,
+        'axes.spines.top': False,
+        'axes.spines.right': False,
+        'axes.axisbelow': True
+    },
+    'diagram': {
+        'axes.grid': False,
+        'patch.linewidth': 1.2,
+        'lines.linewidth': 1.8,
+        'font.size': 11
+    }
+}
+
+DOMAINS = {
+    'mind': {
+        'name': 'Mind',
+        'palette': ['#332288', '#88CCEE', '#44AA99', '#117733', '#999933', '#DDCC77', '#CC6677', '#882255'],
+        'colormap': 'cividis',
+        'rc': {},
+        'notes': 'Cognitive, neural and life-science figures: soft distinct hues for conditions or regions, '
+                 'muted reds reserved for effects of interest.'
+    },
+    'matter': {
+        'name': 'Matter',
+        'palette': ['#0072B2', '#D55E00', '#009E73', '#CC79A7', '#E69F00', '#56B4E9', '#F0E442', '#000000'],
+        'colormap': 'viridis',
+        'rc': {},
+        'notes': 'Chemistry and materials figures: Okabe-Ito colors for species or samples, '
+                 'consistent color per compound across panels.'
+    },
+    'motion': {
+        'name': 'Motion',
+        'palette': ['#4477AA', '#EE6677', '#228833', '#CCBB44', '#66CCEE', '#AA3377', '#BBBBBB'],
+        'colormap': 'plasma',
+        'rc': {'lines.linewidth': 1.8},
+        'notes': 'Physics and dynamics figures: vectors and trajectories in strong hues, '
+                 'measured data as markers and models as lines.'
+    },
+    'mathematics': {
+        'name': 'Mathematics',
+        'palette': ['#004488', '#BB5566', '#DDAA33', '#000000', '#6699CC', '#997700'],
+        'colormap': 'cividis',
+        'rc': {
+            'font.family': 'serif',
+            'font.serif': ['STIX Two Text', 'STIXGeneral', 'DejaVu Serif'],
+            'mathtext.fontset': 'stix'
+        },
+        'notes': 'Mathematical figures: serif text matching LaTeX body text, mathtext for every symbol, '
+                 'few colors and line styles to separate curves in grayscale print.'
+    },
+    'general': {
+        'name': 'General',
+        'palette': ['#0072B2', '#E69F00', '#009E73', '#D55E00', '#CC79A7', '#56B4E9', '#F0E442', '#000000'],
+        'colormap': 'viridis',
+        'rc': {},
+        'notes': 'General scientific figures: Okabe-Ito colors, clean sans-serif text.'
+    }
+}
+
+CATEGORY_TEXT = {
+    'chart': """- Axes: left and bottom spines only, light grid behind the data, every axis labelled with quantity and unit
+- Data: measured values as markers, fits and models as lines, uncertainty as error bars or translucent bands
+- Legend: no frame, placed where it covers no data; omit it for a single series""",
+    'diagram': """- Layout: no axes or ticks, elements aligned to a grid with even spacing and generous whitespace
+- Shapes: rounded boxes with thin dark outlines and light fills from the palette, arrows with consistent head size
+- Labels: inside or directly beside the element they name, no legend unless colors encode a category"""
+}
+
+
+def normalize_domain(domain: str) -> str:
+    domain = (domain or '').strip().lower()
+    domain = DOMAIN_ALIASES.get(domain, domain)
+    return domain if domain in DOMAINS else 'general'
+
+
+def figure_category(diagram_type: str) -> str:
+    return 'chart' if (diagram_type or '').strip().lower() in CHART_TYPES else 'diagram'
+
+
+def wants_custom_style(*requests: str) -> bool:
+    return any(request and CUSTOM_STYLE_PATTERN.search(request.lower()) for request in requests)
+
+
+def _cycler(palette: List[str]) -> str:
+    # rcParams accepts the string form, which keeps presets JSON-serializable for render cache keys
+    return f"cycler('color', {palette!r})"
+
+
+def _style_text(domain: Dict[str, Any], category: str, rc_params: Dict[str, Any]) -> str:
+    fonts = rc_params.get(f"font.{rc_params['font.family']}", [])
+    return f"""
+Style preset: {domain['name']} {category}
+- Palette (in order): {', '.join(domain['palette'])}; continuous data uses the {domain['colormap']} colormap
+- Typography: {rc_params['font.family']} ({', '.join(fonts[:2])}), title {rc_params['axes.titlesize']}pt bold, labels {rc_params['axes.labelsize']}pt, ticks and legend {rc_params['xtick.labelsize']}pt
+- Lines {rc_params['lines.linewidth']}pt, markers {rc_params['lines.markersize']}pt, dark gray text on white
+{CATEGORY_TEXT[category]}
+- {domain['notes']}
+- Colorblind-safe: never rely on red/green alone; add markers or line styles when series exceed four
+These settings are applied through matplotlib rcParams; do not override fonts, sizes or the color cycle.
+""".strip()
+
+
+def _compile() -> Dict[tuple, Dict[str, Any]]:
+    presets = {}
+    for domain_key, domain in DOMAINS.items():
+        for category in CATEGORY_RC:
+            rc_params = {
+                **BASE_RC,
+                **CATEGORY_RC[category],
+                **domain['rc'],
+                'axes.prop_cycle': _cycler(domain['palette']),
+                'image.cmap': domain['colormap']
+            }
+            presets[(domain_key, category)] = {
+                'name': f"{domain_key}-{category}",
+                'domain': domain_key,
+                'category': category,
+                'rc_params': rc_params,
+                'text': _style_text(domain, category, rc_params)
+            }
+    return presets
+
+
+PRESETS = _compile()
+
+
+def get_style_preset(domain: str, diagram_type: str) -> Dict[str, Any]:
+    return PRESETS[(normalize_domain(domain), figure_category(diagram_type))]
@@ -53,7 +53,7 @@ class StylistAgent(BaseAgent):
             Provide enhanced specification with specific style directives.
             """
 
-            enhanced_spec = await self.generate_content(styling_prompt)
+            enhanced_spec = await self.generate_content(styling_prompt, input_data.get('on_chunk'))
 
             return AgentResult(
                 success=True,
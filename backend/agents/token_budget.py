@@ -0,0 +1,52 @@
+import os
+from typing import List, Optional
+from .llm_client import estimate_tokens
+
+
+REFINEMENT_CONTEXT_TOKENS = int(os.getenv("REFINEMENT_CONTEXT_TOKENS", "500"))
+REFINEMENT_MAX_IMPROVEMENTS = int(os.getenv("REFINEMENT_MAX_IMPROVEMENTS", "5"))
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    if estimate_tokens(text) <= budget:
+        return text
+    # Cut on a line boundary where there is one
+    cut = text[:budget * 4]
+    line_end = cut.rfind('\n')
+    if line_end > len(cut) // 2:
+        cut = cut[:line_end]
+    return cut.rstrip() + "\n[...]"
+
+
+def format_improvements(improvements: List[str]) -> str:
+    return '\n'.join(f"{rank}. {improvement}" for rank, improvement in enumerate(improvements, 1))
+
+
+class TokenBudget:
+    def __init__(self, budget: int = REFINEMENT_CONTEXT_TOKENS, max_improvements: int = REFINEMENT_MAX_IMPROVEMENTS):
+        self.budget = budget
+        self.max_improvements = max_improvements
+
+    def select_improvements(self, improvements: List[str], budget: Optional[int] = None) -> List[str]:
+        # Improvements arrive ranked, so the least important ones are dropped first
+        budget = self.budget if budget is None else budget
+        selected = []
+        used = 0
+        for improvement in improvements[:self.max_improvements]:
+            if not selected:
+                improvement = truncate_to_tokens(improvement, budget)
+            cost = estimate_tokens(improvement) + 2
+            if selected and used + cost > budget:
+                break
+            selected.append(improvement)
+            used += cost
+        return selected
+
+    def refinement_spec(self, specification: str, improvements: List[str]) -> str:
+        # Each iteration starts again from the planner's specification plus only
+        # the latest feedback, so the prompt does not grow with the loop. Only
+        # the feedback is budgeted; the visualizer needs the whole specification.
+        feedback = format_improvements(self.select_improvements(improvements))
+        if not feedback:
+            return specification
+        return f"{specification}\n\nFeedback from previous iteration:\n{feedback}"
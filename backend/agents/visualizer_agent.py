@@ -1,51 +1,84 @@
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 import json
-import matplotlib.pyplot as plt
-import matplotlib
-matplotlib.use('Agg')
-import io
-import base64
+import os
+import re
+from services.blob_store import BlobStore, create_blob_store
+from services.metrics import IMAGE_BYTES
 from .base_agent import BaseAgent, AgentResult
+from .cache import get_render_cache
+from .data_reduction import COUNT_COLUMN, reduction_plan
+from .render_pool import get_render_pool
+
+
+PREVIEW_DPI = int(os.getenv("PREVIEW_DPI", "100"))
+THUMBNAIL_WIDTH = int(os.getenv("THUMBNAIL_WIDTH", "320"))
+FINAL_DPI = int(os.getenv("FINAL_DPI", "300"))
+FINAL_EXPORT_FORMATS = [fmt.strip() for fmt in os.getenv("FINAL_EXPORT_FORMATS", "").split(",") if fmt.strip()]
+FIGURE_LINT_ENABLED = os.getenv("FIGURE_LINT_ENABLED", "true").lower() == "true"
+
+PREVIEW_OUTPUTS = [
+    {'name': 'preview', 'format': 'png', 'dpi': PREVIEW_DPI},
+    {'name': 'thumbnail', 'format': 'png', 'max_width': THUMBNAIL_WIDTH}
+]
+FINAL_OUTPUTS = [{'name': 'full', 'format': 'png', 'dpi': FINAL_DPI}] + [
+    {'name': fmt, 'format': fmt} for fmt in FINAL_EXPORT_FORMATS
+]
+
+PATCH_BLOCK_PATTERN = re.compile(
+    r'<{5,7} SEARCH\n(.*?)\n={5,7}\n(.*?)>{5,7} REPLACE',
+    re.DOTALL
+)
 
 
 class VisualizerAgent(BaseAgent):
+    def __init__(self, model_name: str = "gemini-pro", blob_store: Optional[BlobStore] = None):
+        super().__init__(model_name)
+        self.blob_store = blob_store or create_blob_store()
+
     async def execute(self, input_data: Dict[str, Any]) -> AgentResult:
         try:
             enhanced_spec = input_data.get('enhanced_specification', '')
             diagram_type = input_data.get('diagram_type', 'diagram')
             domain = input_data.get('domain', 'general')
             data_info = input_data.get('data_info', {})
+            candidate = input_data.get('candidate', 0)
+            candidate_count = input_data.get('candidate_count', 1)
+            previous_code = input_data.get('previous_code')
+            improvements = input_data.get('improvements')
+            rc_params = input_data.get('rc_params')
 
-            code_prompt = f"""
-            Generate Python matplotlib code to create this scientific diagram.
-
-            Enhanced Specification:
-            {enhanced_spec}
-
-            Type: {diagram_type}
-            Domain: {domain}
-
-            Requirements:
-            1. Use matplotlib and standard scientific plotting libraries
-            2. Create publication-quality output
-            3. Include all labels, legends, and annotations
-            4. Set appropriate figure size (e.g., 10x8 inches for standard)
-            5. Use the color schemes specified in the styling
-            6. Save to a BytesIO buffer for web delivery
-
-            Return ONLY the Python code, no explanations. The code should:
-            - Import necessary libraries (matplotlib, numpy, etc.)
-            - Create the figure and axes
-            - Plot all elements according to spec
-            - Apply styling and colors
-            - Save to buffer: buf = io.BytesIO(); plt.savefig(buf, format='png', dpi=300, bbox_inches='tight'); buf.seek(0)
-            """
+            reduction = reduction_plan(diagram_type, enhanced_spec, data_info)
 
-            code = await self.generate_content(code_prompt)
+            code = None
+            refinement = 'regenerate'
+            if previous_code and improvements:
+                prompt = self._patch_prompt(previous_code, improvements, candidate, candidate_count)
+                code = self._apply_patch(previous_code, await self.generate_content(prompt))
+                if code is not None:
+                    refinement = 'patch'
+                else:
+                    await self.forget(prompt)
 
-            code = self._clean_code(code)
+            if code is None:
+                # A patch that failed to apply still carries the critic's feedback; without
+                # it this prompt would repeat the previous iteration's and hit its cache entry
+                prompt = self._code_prompt(
+                    enhanced_spec, diagram_type, domain, data_info, reduction, candidate, candidate_count,
+                    rc_params is not None, improvements
+                )
+                code = self._clean_code(await self.generate_content(prompt))
 
-            diagram_image = await self._execute_code(code, data_info)
+            try:
+                rendered = await self._execute_code(
+                    code, data_info, PREVIEW_OUTPUTS, reduction, keep_figure=True, lint=FIGURE_LINT_ENABLED,
+                    rc_params=rc_params
+                )
+            except Exception:
+                # Otherwise a retry would replay the same crashing code from the cache
+                await self.forget(prompt)
+                raise
+            image = await self.blob_store.put(rendered['preview']) if rendered.get('preview') else None
+            thumbnail = await self.blob_store.put(rendered['thumbnail']) if rendered.get('thumbnail') else None
 
             a2ui_data = self._generate_a2ui_payload(enhanced_spec, diagram_type)
 
@@ -53,12 +86,18 @@ class VisualizerAgent(BaseAgent):
                 success=True,
                 data={
                     'code': code,
-                    'image_data': diagram_image,
+                    'image': image,
+                    'thumbnail': thumbnail,
                     'a2ui_payload': a2ui_data,
                     'diagram_type': diagram_type,
-                    'domain': domain
+                    'domain': domain,
+                    'candidate': candidate,
+                    'refinement': refinement,
+                    'reduction': reduction,
+                    'rc_params': rc_params,
+                    'lint': json.loads(rendered['lint']) if rendered.get('lint') else None
                 },
-                metadata={'agent': 'VisualizerAgent', 'has_image': diagram_image is not None}
+                metadata={'agent': 'VisualizerAgent', 'has_image': image is not None}
             )
         except Exception as e:
             return AgentResult(
@@ -68,6 +107,140 @@ class VisualizerAgent(BaseAgent):
                 metadata={'agent': 'VisualizerAgent'}
             )
 
+    def _code_prompt(
+        self,
+        enhanced_spec: str,
+        diagram_type: str,
+        domain: str,
+        data_info: Dict[str, Any],
+        reduction: Optional[Dict[str, Any]],
+        candidate: int,
+        candidate_count: int,
+        preset_styled: bool = False,
+        improvements: Optional[str] = None
+    ) -> str:
+        return f"""
+        Generate Python matplotlib code to create this scientific diagram.
+
+        Enhanced Specification:
+        {enhanced_spec}
+
+        Type: {diagram_type}
+        Domain: {domain}
+
+        Requirements:
+        1. Use matplotlib and standard scientific plotting libraries
+        2. Create publication-quality output
+        3. Include all labels, legends, and annotations
+        4. Set appropriate figure size (e.g., 10x8 inches for standard)
+        5. Use the color schemes specified in the styling
+        6. Leave the finished figure open; the renderer saves it at the required resolutions
+
+        Return ONLY the Python code, no explanations. The code should:
+        - Import necessary libraries (matplotlib, numpy, etc.)
+        - Create the figure and axes
+        - Plot all elements according to spec
+        - Apply styling and colors
+        - Not call plt.savefig() or plt.show()
+        {self._format_data_hint(data_info, reduction)}
+        {self._format_candidate_hint(candidate, candidate_count)}
+        {self._format_preset_hint(preset_styled)}
+        {self._format_improvements_hint(improvements)}
+        """
+
+    def _patch_prompt(
+        self,
+        previous_code: str,
+        improvements: str,
+        candidate: int,
+        candidate_count: int
+    ) -> str:
+        return f"""
+        Apply targeted fixes to this matplotlib code for a scientific diagram.
+
+        Current Code:
+        ```python
+        {previous_code}
+        ```
+
+        Requested Improvements:
+        {improvements}
+        {self._format_candidate_hint(candidate, candidate_count)}
+
+        Change only what the improvements require. Return one or more edit blocks and
+        nothing else, each in exactly this form:
+
+        <<<<<<< SEARCH
+        lines copied exactly from the current code
+        =======
+        replacement lines
+        >>>>>>> REPLACE
+        """
+
+    def _apply_patch(self, code: str, patch: str) -> Optional[str]:
+        blocks = PATCH_BLOCK_PATTERN.findall(patch)
+        if not blocks:
+            return None
+
+        for search, replace in blocks:
+            if search not in code:
+                return None
+            code = code.replace(search, replace.rstrip('\n'), 1)
+        return code
+
+    def _format_data_hint(self, data_info: Dict[str, Any], reduction: Optional[Dict[str, Any]] = None) -> str:
+        if not data_info or not data_info.get('dataset_id'):
+            return ""
+
+        hint = f"""
+            The user's dataset is already loaded as a pandas DataFrame named `df`
+            ({data_info.get('row_count', 0)} rows; columns: {', '.join(data_info.get('columns', []))}).
+            Plot from `df` directly. Do not read files or generate placeholder data.
+            """
+        if reduction and reduction['kind'] == 'scatter':
+            hint += f"""
+            `df` has been thinned to one row per occupied cell of a 2D grid over
+            {reduction['x']} and {reduction['y']}; the `{COUNT_COLUMN}` column holds how many
+            original points each row stands for. Use it for marker size or color.
+            """
+        elif reduction:
+            hint += f"""
+            `df` has been downsampled to about {reduction['budget']} rows that preserve the
+            shape of the {reduction['kind']}; plot all of its rows.
+            """
+        return hint
+
+    def _format_candidate_hint(self, candidate: int, candidate_count: int) -> str:
+        if candidate_count <= 1:
+            return ""
+
+        if candidate == 0:
+            approach = "Use the most conventional layout for this figure type."
+        else:
+            approach = "Choose a layout and visual encoding that differs from the obvious default."
+
+        return f"""
+            This is candidate {candidate + 1} of {candidate_count} generated in parallel.
+            {approach} Every requirement above still applies.
+            """
+
+    def _format_preset_hint(self, preset_styled: bool) -> str:
+        if not preset_styled:
+            return ""
+        return """
+            The renderer applies the style preset as matplotlib rcParams (fonts, sizes, line
+            widths, color cycle, grid). Do not call plt.style.use() or set those globally;
+            take series colors from the default cycle unless the specification says otherwise.
+            """
+
+    def _format_improvements_hint(self, improvements: Optional[str]) -> str:
+        if not improvements:
+            return ""
+        return f"""
+            A previous version of this figure was reviewed. Address this feedback:
+            {improvements}
+            """
+
     def _clean_code(self, code: str) -> str:
         code = code.strip()
         if code.startswith('```python'):
@@ -78,32 +251,91 @@ class VisualizerAgent(BaseAgent):
             code = code[:-3]
         return code.strip()
 
-    async def _execute_code(self, code: str, data_info: Dict[str, Any]) -> str:
+    async def finalize(
+        self,
+        code: str,
+        data_info: Dict[str, Any],
+        reduction: Optional[Dict[str, Any]] = None,
+        rc_params: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        rendered = await self._execute_code(code, data_info, FINAL_OUTPUTS, reduction, rc_params=rc_params)
+        exports = {}
+        for output in FINAL_OUTPUTS:
+            if rendered.get(output['name']):
+                exports[output['name']] = await self.blob_store.put(rendered[output['name']], output['format'])
+        return exports
+
+    async def _execute_code(
+        self,
+        code: str,
+        data_info: Dict[str, Any],
+        outputs: List[Dict[str, Any]],
+        reduction: Optional[Dict[str, Any]] = None,
+        keep_figure: bool = False,
+        lint: bool = False,
+        rc_params: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, bytes]:
         try:
-            import io
-            import numpy as np
-            import pandas as pd
-
-            local_vars = {
-                'plt': plt,
-                'np': np,
-                'pd': pd,
-                'io': io,
-                'data_info': data_info
-            }
-
-            exec(code, local_vars)
-
-            if 'buf' in local_vars:
-                buf = local_vars['buf']
-                image_bytes = buf.getvalue()
-                image_base64 = base64.b64encode(image_bytes).decode('utf-8')
-                return f"data:image/png;base64,{image_base64}"
+            render_cache = get_render_cache()
+            render_key = render_cache.make_key(
+                code, self._data_fingerprint(data_info), json.dumps(reduction, sort_keys=True),
+                json.dumps(rc_params, sort_keys=True)
+            )
 
-            return None
+            # Lint findings are cached next to the images as JSON under the name 'lint'
+            rendered = {}
+            for name in [output['name'] for output in outputs] + (['lint'] if lint else []):
+                cached = await render_cache.get(render_cache.make_key(render_key, name))
+                if cached is not None:
+                    rendered[name] = cached
+
+            missing = [output for output in outputs if output['name'] not in rendered]
+            lint_missing = lint and 'lint' not in rendered
+            if missing or lint_missing:
+                request = {
+                    'code': code,
+                    'data_info': data_info,
+                    'dataset_path': self._dataset_path(data_info),
+                    'reduction': reduction,
+                    'rc_params': rc_params,
+                    'outputs': missing,
+                    'keep_figure': keep_figure,
+                    'lint': lint_missing
+                }
+
+                # Reuse the figure pickled by an earlier render instead of re-running the code
+                figure_key = render_cache.make_key(render_key, 'figure')
+                figure = await render_cache.get(figure_key)
+                if figure is not None:
+                    request['figure'] = figure
+                    request['keep_figure'] = False
+
+                result = await get_render_pool().render(request)
+
+                for name, data in result['outputs'].items():
+                    IMAGE_BYTES.labels(name).observe(len(data))
+                    rendered[name] = data
+                    await render_cache.set(render_cache.make_key(render_key, name), data)
+                if result.get('lint') is not None:
+                    rendered['lint'] = json.dumps(result['lint']).encode('utf-8')
+                    await render_cache.set(render_cache.make_key(render_key, 'lint'), rendered['lint'])
+                if result.get('figure'):
+                    await render_cache.set(figure_key, result['figure'])
+
+            return rendered
         except Exception as e:
             raise Exception(f"Code execution failed: {str(e)}")
 
+    def _dataset_path(self, data_info: Dict[str, Any]) -> Optional[str]:
+        if not data_info or not data_info.get('dataset_id'):
+            return None
+        # The dataset store pulls in pandas and pyarrow; most generations have no dataset
+        from services.dataset_store import get_dataset_store
+        return get_dataset_store().path(data_info['dataset_id'])
+
+    def _data_fingerprint(self, data_info: Dict[str, Any]) -> str:
+        return json.dumps(data_info or {}, sort_keys=True, default=str)
+
     def _generate_a2ui_payload(self, spec: str, diagram_type: str) -> Dict[str, Any]:
         return {
             'type': 'diagram',
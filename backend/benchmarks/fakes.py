@@ -0,0 +1,259 @@
+import asyncio
+import copy
+import json
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+SPECIFICATION = """
+1. Layout: single panel, 10x6 inches, white background.
+2. Elements: measured series with markers, fitted trend line, shaded confidence band.
+3. Axes: time (s) on x, response (a.u.) on y, light grid.
+4. Annotations: legend in the upper left, title naming the experiment.
+5. Colors: colorblind-safe palette, dark gray text.
+"""
+
+CODE_VARIANTS = [
+    """
+import numpy as np
+import matplotlib.pyplot as plt
+
+rng = np.random.default_rng(0)
+t = np.linspace(0, 10, 400)
+signal = np.exp(-t / 4) * np.sin(2 * np.pi * t) + rng.normal(0, 0.05, t.size)
+
+fig, ax = plt.subplots(figsize=(10, 6))
+ax.plot(t, signal, color='#0072B2', linewidth=1.5, label='Measured response')
+ax.fill_between(t, signal - 0.1, signal + 0.1, color='#0072B2', alpha=0.2)
+ax.set_xlabel('Time (s)')
+ax.set_ylabel('Response (a.u.)')
+ax.set_title('Damped oscillation')
+ax.grid(alpha=0.3)
+ax.legend(loc='upper left')
+fig.tight_layout()
+""",
+    """
+import numpy as np
+import matplotlib.pyplot as plt
+
+rng = np.random.default_rng(1)
+x = rng.normal(0, 1, 3000)
+y = 0.6 * x + rng.normal(0, 0.8, x.size)
+
+fig, ax = plt.subplots(figsize=(10, 6))
+ax.scatter(x, y, s=6, alpha=0.4, color='#D55E00', label='Samples')
+coef = np.polyfit(x, y, 1)
+xs = np.linspace(x.min(), x.max(), 100)
+ax.plot(xs, np.polyval(coef, xs), color='#333333', linewidth=2, label='Linear fit')
+ax.set_xlabel('Predictor')
+ax.set_ylabel('Outcome')
+ax.set_title('Correlation between predictor and outcome')
+ax.legend(loc='upper left')
+fig.tight_layout()
+""",
+    """
+import numpy as np
+import matplotlib.pyplot as plt
+
+groups = ['Control', 'Dose A', 'Dose B', 'Dose C']
+means = np.array([1.0, 1.4, 2.1, 2.6])
+errors = np.array([0.1, 0.15, 0.2, 0.18])
+
+fig, axes = plt.subplots(1, 2, figsize=(12, 5))
+axes[0].bar(groups, means, yerr=errors, capsize=4, color=['#999999', '#56B4E9', '#009E73', '#E69F00'])
+axes[0].set_ylabel('Relative expression')
+axes[0].set_title('Expression by condition')
+axes[1].hist(np.random.default_rng(2).gamma(2.0, 1.0, 5000), bins=60, color='#CC79A7')
+axes[1].set_xlabel('Cell size (um)')
+axes[1].set_title('Size distribution')
+fig.tight_layout()
+"""
+]
+
+PATCH = """<<<<<<< SEARCH
+fig.tight_layout()
+=======
+fig.suptitle('Revised figure', fontsize=12)
+fig.tight_layout()
+>>>>>>> REPLACE"""
+
+
+class LatencyModel:
+    def __init__(self, median_ms: float = 800.0, sigma: float = 0.5, seed: Optional[int] = None):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self._random = random.Random(seed)
+
+    def sample(self) -> float:
+        # Log-normal, which matches the long right tail of hosted LLM latency
+        if self.median_ms <= 0:
+            return 0.0
+        return self._random.lognormvariate(0, self.sigma) * self.median_ms / 1000
+
+
+class _Usage:
+    def __init__(self, prompt: str, text: str):
+        self.prompt_token_count = max(1, len(prompt) // 4)
+        self.candidates_token_count = max(1, len(text) // 4)
+
+
+class _Response:
+    def __init__(self, text: str, prompt: str):
+        self.text = text
+        self.parts = [text] if text else []
+        self.usage_metadata = _Usage(prompt, text)
+
+
+class _Stream:
+    def __init__(self, text: str, prompt: str, latency: float, chunk_chars: int = 80):
+        self.text = text
+        self.prompt = prompt
+        self.latency = latency
+        self.chunk_chars = chunk_chars
+
+    async def __aiter__(self):
+        pieces = [self.text[i:i + self.chunk_chars] for i in range(0, len(self.text), self.chunk_chars)] or ['']
+        for piece in pieces:
+            await asyncio.sleep(self.latency / len(pieces))
+            yield _Response(piece, self.prompt)
+
+
+class FakeGenerativeModel:
+    def __init__(self, model_name: str, latency: LatencyModel, refine_rate: float = 0.3, seed: Optional[int] = None):
+        self.model_name = model_name
+        self.latency = latency
+        self.refine_rate = refine_rate
+        self._random = random.Random(seed)
+        self.calls = 0
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        self.calls += 1
+        text = self._respond(prompt)
+        if stream:
+            # Time to first token is part of the total, the rest streams in
+            latency = self.latency.sample()
+            await asyncio.sleep(latency * 0.2)
+            return _Stream(text, prompt, latency * 0.8)
+        await asyncio.sleep(self.latency.sample())
+        return _Response(text, prompt)
+
+    def _respond(self, prompt: str) -> str:
+        if 'Apply targeted fixes' in prompt:
+            return PATCH
+        if 'Compare these' in prompt:
+            scores = [self._score() for _ in range(prompt.count('--- Candidate'))]
+            return self._verdict(candidate_scores=scores, accept=max(scores) >= 8)
+        if 'matplotlib code' in prompt:
+            return f"```python\n{self._random.choice(CODE_VARIANTS).strip()}\n```"
+        if 'Evaluate this scientific diagram' in prompt:
+            score = self._score()
+            return self._verdict(score=score, accept=score >= 8)
+        return SPECIFICATION
+
+    def _verdict(self, accept: bool, **scores: Any) -> str:
+        improvements = [] if accept else ['Increase axis label font size', 'Move the legend out of the data']
+        return json.dumps({**scores, 'accept': accept, 'improvements': improvements})
+
+    def _score(self) -> int:
+        return 6 if self._random.random() < self.refine_rate else 9
+
+
+class _Result:
+    def __init__(self, data: List[Dict[str, Any]]):
+        self.data = data
+
+
+class _Query:
+    def __init__(self, database: "FakeSupabase", table: str):
+        self.database = database
+        self.table = table
+        self._filters = []
+        self._order: Optional[str] = None
+        self._range: Optional[tuple] = None
+        self._limit: Optional[int] = None
+        self._write: Optional[tuple] = None
+
+    def select(self, *args, **kwargs) -> "_Query":
+        return self
+
+    def eq(self, column: str, value: Any) -> "_Query":
+        self._filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def gte(self, column: str, value: Any) -> "_Query":
+        self._filters.append(lambda row: row.get(column) is not None and row.get(column) >= value)
+        return self
+
+    def order(self, column: str, desc: bool = False) -> "_Query":
+        self._order = column
+        return self
+
+    def range(self, start: int, end: int) -> "_Query":
+        self._range = (start, end)
+        return self
+
+    def limit(self, count: int) -> "_Query":
+        self._limit = count
+        return self
+
+    def insert(self, rows) -> "_Query":
+        self._write = ('insert', rows)
+        return self
+
+    def upsert(self, rows) -> "_Query":
+        self._write = ('upsert', rows)
+        return self
+
+    def execute(self) -> _Result:
+        latency = self.database.write_latency if self._write else self.database.read_latency
+        if latency:
+            time.sleep(latency)
+
+        with self.database.lock:
+            table = self.database.tables.setdefault(self.table, {})
+
+            if self._write:
+                _, rows = self._write
+                rows = rows if isinstance(rows, list) else [rows]
+                for row in rows:
+                    table[row.get('id') or len(table)] = copy.deepcopy(row)
+                self.database.writes += len(rows)
+                return _Result(rows)
+
+            rows = [row for row in table.values() if all(match(row) for match in self._filters)]
+            if self._order:
+                rows.sort(key=lambda row: row.get(self._order) or '')
+            if self._range:
+                rows = rows[self._range[0]:self._range[1] + 1]
+            if self._limit is not None:
+                rows = rows[:self._limit]
+            return _Result(copy.deepcopy(rows))
+
+
+class FakeSupabase:
+    def __init__(self, read_latency: float = 0.0, write_latency: float = 0.0):
+        self.tables: Dict[str, Dict[Any, Dict[str, Any]]] = {}
+        self.read_latency = read_latency
+        self.write_latency = write_latency
+        self.writes = 0
+        self.lock = threading.Lock()
+
+    def table(self, name: str) -> _Query:
+        return _Query(self, name)
+
+    def seed_references(self, count: int = 50) -> None:
+        domains = ['mind', 'matter', 'motion', 'mathematics']
+        types = ['statistical', 'flowchart', 'schematic', 'timeline']
+        table = self.tables.setdefault('diagram_references', {})
+        for index in range(count):
+            table[f"ref-{index}"] = {
+                'id': f"ref-{index}",
+                'type': types[index % len(types)],
+                'domain': domains[index % len(domains)],
+                'description': f"Reference figure {index} showing a {types[index % len(types)]} layout",
+                'metadata': {'tags': ['publication', 'benchmark']},
+                'reference_url': None,
+                'created_at': f"2024-01-01T00:00:{index:02d}"
+            }
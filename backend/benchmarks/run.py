@@ -0,0 +1,250 @@
+"""Offline end-to-end benchmark for the generation pipeline.
+
+Runs the real FastAPI app under uvicorn in this process, with Gemini and
+Supabase replaced by the fakes in benchmarks/fakes.py, and drives
+/api/figures/generate-stream at a fixed concurrency:
+
+    cd backend
+    python -m benchmarks.run --requests 40 --concurrency 8 --llm-median-ms 600
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=20, help='generations to run in total')
+    parser.add_argument('--concurrency', type=int, default=4, help='generations in flight at once')
+    parser.add_argument('--users', type=int, default=4, help='distinct user ids the requests are spread over')
+    parser.add_argument('--candidates', type=int, default=1, help='visualizer candidates per iteration')
+    parser.add_argument('--llm-median-ms', type=float, default=800.0, help='median fake LLM latency')
+    parser.add_argument('--llm-sigma', type=float, default=0.5, help='log-normal spread of fake LLM latency')
+    parser.add_argument('--refine-rate', type=float, default=0.3, help='probability the critic asks for another iteration')
+    parser.add_argument('--db-latency-ms', type=float, default=5.0, help='fake Supabase latency per query')
+    parser.add_argument('--semantic-cache', action='store_true', help='reuse plans across the near-identical benchmark prompts')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    return parser.parse_args(argv)
+
+
+def _isolate_environment(workdir: str, args: argparse.Namespace) -> None:
+    # Module-level settings are read at import time, so this runs before main is imported
+    os.environ.update({
+        'BLOB_STORE': 'local',
+        'BLOB_STORE_DIR': os.path.join(workdir, 'blobs'),
+        'DATASET_STORE_DIR': os.path.join(workdir, 'datasets'),
+        'JOB_LOG_DIR': os.path.join(workdir, 'jobs'),
+        'LLM_CACHE_ENABLED': 'false',
+        'SEMANTIC_CACHE_ENABLED': 'true' if args.semantic_cache else 'false',
+        'RENDER_CACHE_MAX_ENTRIES': '0',
+        'GENERATION_MAX_CONCURRENCY': str(args.concurrency)
+    })
+    os.environ.pop('RENDER_CACHE_DIR', None)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _current_rss_bytes() -> int:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        # ru_maxrss is a high-water mark, but it is the best we have off Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {'count': 0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'count': len(values), 'p50': round(p50, 1), 'p95': round(p95, 1), 'p99': round(p99, 1)}
+
+
+async def _generate(client, index: int, args: argparse.Namespace) -> Dict[str, Any]:
+    body = {
+        'prompt': f"Damped oscillation of a driven pendulum, run {index}",
+        'type': 'statistical',
+        'domain': ['mind', 'matter', 'motion', 'mathematics'][index % 4],
+        'user_id': f"bench-user-{index % args.users}",
+        'candidates': args.candidates,
+        'trace': True
+    }
+    started = time.perf_counter()
+    first_event = None
+    outcome: Dict[str, Any] = {'status': 'incomplete'}
+
+    async with client.stream('POST', '/api/figures/generate-stream', json=body) as response:
+        if response.status_code != 200:
+            return {'status': f"http {response.status_code}", 'latency_ms': (time.perf_counter() - started) * 1000}
+        async for line in response.aiter_lines():
+            if not line.startswith('data: '):
+                continue
+            if first_event is None:
+                first_event = time.perf_counter()
+            event = json.loads(line[6:])
+            if event['type'] == 'complete':
+                outcome = {
+                    'status': 'complete',
+                    'trace': event['data'].get('trace'),
+                    'iterations': event['data']['data'].get('iterations')
+                }
+            elif event['type'] in ('error', 'cancelled'):
+                outcome = {'status': event['type'], 'message': event['data'].get('message')}
+
+    outcome['latency_ms'] = (time.perf_counter() - started) * 1000
+    outcome['first_event_ms'] = ((first_event or time.perf_counter()) - started) * 1000
+    return outcome
+
+
+async def _drive(base_url: str, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    import httpx
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    timeout = httpx.Timeout(None, connect=10)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout) as client:
+        async def one(index: int) -> Dict[str, Any]:
+            async with semaphore:
+                return await _generate(client, index, args)
+
+        return await asyncio.gather(*[one(index) for index in range(args.requests)])
+
+
+def _report(results: List[Dict[str, Any]], wall_seconds: float, rss_before: int, rss_after: int) -> Dict[str, Any]:
+    stage_ms = defaultdict(list)
+    llm_ms = defaultdict(list)
+    render_ms = []
+    render_cpu = []
+    render_memory = []
+    for result in results:
+        for span in (result.get('trace') or {}).get('spans', []):
+            if span['kind'] == 'stage':
+                stage_ms[span['name']].append(span['duration_ms'])
+            elif span['kind'] == 'llm':
+                llm_ms[span['name']].append(span['duration_ms'])
+            elif span['kind'] == 'render':
+                render_ms.append(span['duration_ms'])
+                if 'cpu_seconds' in span:
+                    render_cpu.append(span['cpu_seconds'] * 1000)
+                    render_memory.append(span['peak_memory_bytes'])
+
+    statuses = defaultdict(int)
+    for result in results:
+        statuses[result['status']] += 1
+    completed = [result for result in results if result['status'] == 'complete']
+
+    return {
+        'requests': len(results),
+        'statuses': dict(statuses),
+        'wall_seconds': round(wall_seconds, 2),
+        'generations_per_second': round(len(completed) / wall_seconds, 3),
+        'renders_per_second': round(len(render_ms) / wall_seconds, 3),
+        'mean_iterations': round(float(np.mean([r['iterations'] for r in completed])), 2) if completed else None,
+        'latency_ms': _percentiles([result['latency_ms'] for result in completed]),
+        'first_event_ms': _percentiles([result['first_event_ms'] for result in results]),
+        'stages_ms': {name: _percentiles(values) for name, values in stage_ms.items()},
+        'llm_ms': {name: _percentiles(values) for name, values in llm_ms.items()},
+        'render_ms': _percentiles(render_ms),
+        'render_cpu_ms': _percentiles(render_cpu),
+        'worker_peak_memory_mb': round(max(render_memory) / 2 ** 20, 1) if render_memory else None,
+        'server_rss_mb': {
+            'before': round(rss_before / 2 ** 20, 1),
+            'after': round(rss_after / 2 ** 20, 1),
+            'growth': round((rss_after - rss_before) / 2 ** 20, 1)
+        }
+    }
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    def row(name: str, stats: Dict[str, Any]) -> str:
+        if not stats.get('count'):
+            return f"  {name:<22} -"
+        return f"  {name:<22} n={stats['count']:<5} p50={stats['p50']:>9.1f}  p95={stats['p95']:>9.1f}  p99={stats['p99']:>9.1f}"
+
+    print(f"requests: {report['requests']}  statuses: {report['statuses']}  wall: {report['wall_seconds']}s")
+    print(f"generations/s: {report['generations_per_second']}  renders/s: {report['renders_per_second']}  "
+          f"mean iterations: {report['mean_iterations']}")
+    print("end to end (ms)")
+    print(row('latency', report['latency_ms']))
+    print(row('first event', report['first_event_ms']))
+    print("stages (ms)")
+    for name, stats in report['stages_ms'].items():
+        print(row(name, stats))
+    print("llm calls (ms)")
+    for name, stats in report['llm_ms'].items():
+        print(row(name, stats))
+    print("renders (ms)")
+    print(row('wall', report['render_ms']))
+    print(row('cpu', report['render_cpu_ms']))
+    rss = report['server_rss_mb']
+    print(f"server rss: {rss['before']} MB -> {rss['after']} MB ({rss['growth']:+} MB)  "
+          f"worker peak: {report['worker_peak_memory_mb']} MB")
+
+
+async def _main(args: argparse.Namespace) -> Dict[str, Any]:
+    import uvicorn
+    import main
+    from agents import llm_client
+    from agents.orchestrator import DiagramOrchestrator
+    from agents.render_pool import get_render_pool
+    from benchmarks.fakes import FakeGenerativeModel, FakeSupabase, LatencyModel
+
+    latency = LatencyModel(args.llm_median_ms, args.llm_sigma, args.seed)
+    llm_client.set_model_factory(
+        lambda model_name: FakeGenerativeModel(model_name, latency, args.refine_rate, args.seed)
+    )
+    database = FakeSupabase(args.db_latency_ms / 1000, args.db_latency_ms / 1000)
+    database.seed_references()
+    main.orchestrator = DiagramOrchestrator(database, blob_store=main.blob_store)
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, host='127.0.0.1', port=port, log_level='warning'))
+    serve = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    try:
+        rss_before = _current_rss_bytes()
+        started = time.perf_counter()
+        results = await _drive(f"http://127.0.0.1:{port}", args)
+        wall_seconds = time.perf_counter() - started
+        await main.orchestrator.persistence.close()
+        rss_after = _current_rss_bytes()
+    finally:
+        server.should_exit = True
+        await serve
+        get_render_pool().close()
+
+    return _report(results, wall_seconds, rss_before, rss_after)
+
+
+def run(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    args = _parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix='4ms-bench-') as workdir:
+        _isolate_environment(workdir, args)
+        report = asyncio.run(_main(args))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print_report(report)
+    return report
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    run()
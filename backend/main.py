@@ -1,19 +1,37 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+import time
+
+# Taken before the heavier imports so the startup report covers them
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, UploadFile, File, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import AsyncIterator, Callable, Optional, List
+import asyncio
+import hashlib
+import importlib
+import logging
 import os
 import json
-import pandas as pd
-import io
 from dotenv import load_dotenv
-import google.generativeai as genai
-from supabase import create_client, Client
-from agents.orchestrator import DiagramOrchestrator
 
+# Agents and services read their settings from the environment at import time
 load_dotenv()
 
+from agents.orchestrator import DiagramOrchestrator
+from agents import llm_client
+from agents.llm_client import get_llm_client
+from agents.render_pool import get_render_pool
+from agents.cache import get_response_cache, get_render_cache
+from agents.semantic_cache import get_semantic_cache
+from services.blob_store import create_blob_store
+from services.jobs import Job, JobManager
+from services.metrics import CONTENT_TYPE_LATEST, render_metrics
+from services.scheduler import GenerationScheduler, QueueFull
+
+logger = logging.getLogger(__name__)
+
 app = FastAPI(title="4Ms API", version="1.0.0")
 
 app.add_middleware(
@@ -22,22 +40,33 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Job-Id", "Retry-After"],
 )
 
 gemini_api_key = os.getenv("GEMINI_API_KEY")
 supabase_url = os.getenv("SUPABASE_URL") or os.getenv("VITE_SUPABASE_URL")
 supabase_key = os.getenv("SUPABASE_ANON_KEY") or os.getenv("VITE_SUPABASE_ANON_KEY")
+BATCH_MAX_FIGURES = int(os.getenv("BATCH_MAX_FIGURES", "16"))
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_RENDER_WORKERS = int(os.getenv("WARMUP_RENDER_WORKERS", "1"))
 
-if gemini_api_key:
-    genai.configure(api_key=gemini_api_key)
+llm_client.configure(gemini_api_key)
 
-supabase: Client = None
+supabase = None
 if supabase_url and supabase_key:
+    from supabase import create_client
     supabase = create_client(supabase_url, supabase_key)
 
+blob_store = create_blob_store(supabase)
+
 orchestrator = None
 if supabase and gemini_api_key:
-    orchestrator = DiagramOrchestrator(supabase)
+    orchestrator = DiagramOrchestrator(supabase, blob_store=blob_store)
+
+jobs = JobManager()
+scheduler = GenerationScheduler()
+
+startup = {'import_seconds': round(time.perf_counter() - _import_started, 3), 'warm': False}
 
 
 class FigureRequest(BaseModel):
@@ -54,6 +83,46 @@ class FigureResponse(BaseModel):
     metadata: dict
 
 
+async def _warm_up() -> None:
+    # Runs after the server is accepting requests, so /health answers straight away
+    started = time.perf_counter()
+    steps = {}
+
+    async def step(name: str, run) -> None:
+        step_started = time.perf_counter()
+        try:
+            await run()
+            steps[name] = round(time.perf_counter() - step_started, 3)
+        except Exception as e:
+            steps[name] = f"failed: {e}"
+
+    if orchestrator:
+        await step('llm_client', lambda: asyncio.to_thread(llm_client.warm_up, [orchestrator.model_name]))
+    await step('data_stack', lambda: asyncio.to_thread(importlib.import_module, 'services.dataset_store'))
+    if WARMUP_RENDER_WORKERS > 0:
+        await step('render_workers', lambda: get_render_pool().warm_up(WARMUP_RENDER_WORKERS))
+
+    startup['warmup'] = steps
+    startup['warmup_seconds'] = round(time.perf_counter() - started, 3)
+    startup['warm'] = True
+    logger.info("Startup: %s", startup)
+
+
+@app.on_event("startup")
+async def on_startup():
+    startup['ready_seconds'] = round(time.perf_counter() - _import_started, 3)
+    if WARMUP_ENABLED:
+        app.state.warm_up = asyncio.create_task(_warm_up())
+    logger.info("Imported in %.2fs, ready in %.2fs", startup['import_seconds'], startup['ready_seconds'])
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    if orchestrator:
+        await orchestrator.persistence.close()
+    get_render_pool().close()
+
+
 @app.get("/")
 async def root():
     return {
@@ -69,10 +138,26 @@ async def health_check():
         "status": "healthy",
         "gemini_configured": gemini_api_key is not None,
         "supabase_configured": supabase is not None,
-        "orchestrator_ready": orchestrator is not None
+        "orchestrator_ready": orchestrator is not None,
+        "startup": startup,
+        "llm_cache": get_response_cache().summary(),
+        "render_cache": get_render_cache().summary(),
+        "semantic_cache": get_semantic_cache().summary(),
+        "jobs": {**jobs.stats, 'active': jobs.active()},
+        "scheduler": scheduler.summary(),
+        "cancellations": {
+            'jobs': jobs.stats['cancelled'],
+            'llm_calls': llm_client.stats['cancelled'],
+            'renders': get_render_pool().stats['cancelled']
+        }
     }
 
 
+@app.get("/metrics")
+async def metrics():
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.post("/api/figures/generate")
 async def generate_figure(request: FigureRequest):
     if not gemini_api_key:
@@ -82,7 +167,7 @@ async def generate_figure(request: FigureRequest):
         )
 
     try:
-        model = genai.GenerativeModel('gemini-pro')
+        llm = get_llm_client('gemini-pro')
 
         prompt_template = f"""
         Generate a detailed description for a {request.type} figure in the {request.domain} domain.
@@ -99,11 +184,11 @@ async def generate_figure(request: FigureRequest):
         Format the response as a detailed technical specification.
         """
 
-        response = model.generate_content(prompt_template)
+        description = await llm.generate(prompt_template)
 
         return {
             "status": "success",
-            "description": response.text,
+            "description": description,
             "type": request.type,
             "domain": request.domain,
             "message": "Figure description generated. Integration with PaperBanana for actual figure generation will be added."
@@ -129,7 +214,7 @@ async def refine_figure(
         )
 
     try:
-        model = genai.GenerativeModel('gemini-pro')
+        llm = get_llm_client('gemini-pro')
 
         prompt = f"""
         Refine a scientific figure based on the following feedback:
@@ -143,12 +228,12 @@ async def refine_figure(
         4. Scientific accuracy considerations
         """
 
-        response = model.generate_content(prompt)
+        suggestions = await llm.generate(prompt)
 
         return {
             "status": "success",
             "figure_id": figure_id,
-            "refinement_suggestions": response.text
+            "refinement_suggestions": suggestions
         }
 
     except Exception as e:
@@ -161,49 +246,38 @@ async def refine_figure(
 @app.post("/api/data/upload")
 async def upload_data(file: UploadFile = File(...)):
     try:
-        content = await file.read()
-
         file_extension = file.filename.split('.')[-1].lower() if file.filename else ''
 
-        if file_extension not in ['csv', 'json', 'xlsx']:
+        # pandas and pyarrow load on the first upload, or earlier during warm-up
+        from services.data_profiler import SUPPORTED_EXTENSIONS
+        from services.dataset_store import get_dataset_store
+
+        if file_extension not in SUPPORTED_EXTENSIONS:
             raise HTTPException(
                 status_code=400,
-                detail="Unsupported file type. Please upload CSV, JSON, or XLSX files."
+                detail="Unsupported file type. Please upload CSV, JSON, JSONL, XLSX, or Parquet files."
             )
 
-        data_info = {}
-        if file_extension == 'csv':
-            df = pd.read_csv(io.BytesIO(content))
-            data_info = {
-                'columns': df.columns.tolist(),
-                'row_count': len(df),
-                'dtypes': df.dtypes.astype(str).tolist(),
-                'sample': df.head(5).to_dict('records')
-            }
-        elif file_extension == 'json':
-            data = json.loads(content.decode('utf-8'))
-            if isinstance(data, list) and len(data) > 0:
-                data_info = {
-                    'columns': list(data[0].keys()) if isinstance(data[0], dict) else [],
-                    'row_count': len(data)
-                }
-        elif file_extension == 'xlsx':
-            df = pd.read_excel(io.BytesIO(content))
-            data_info = {
-                'columns': df.columns.tolist(),
-                'row_count': len(df),
-                'dtypes': df.dtypes.astype(str).tolist()
-            }
+        # The spooled upload is profiled and stored chunk by chunk off the event
+        # loop, so memory stays bounded by the chunk size rather than the file size.
+        data_info = await asyncio.to_thread(get_dataset_store().ingest, file.file, file_extension)
+        size = await asyncio.to_thread(file.file.seek, 0, os.SEEK_END)
 
         return {
             "status": "success",
             "filename": file.filename,
-            "size": len(content),
+            "size": size,
             "type": file_extension,
+            "dataset_id": data_info.get('dataset_id'),
             "data_info": data_info,
             "message": "File uploaded and processed successfully."
         }
 
+    except HTTPException:
+        raise
+    except ValueError as e:
+        # Malformed or unsupported file contents are the client's to fix
+        raise HTTPException(status_code=400, detail=f"Could not read the file: {str(e)}")
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -211,6 +285,26 @@ async def upload_data(file: UploadFile = File(...)):
         )
 
 
+@app.get("/api/blobs/{blob_id}")
+async def get_blob(blob_id: str, request: Request):
+    etag = f'"{blob_id}"'
+    cache_headers = {
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "ETag": etag
+    }
+
+    # Blob ids are content hashes, so a matching ETag only needs the blob to still exist
+    if request.headers.get("if-none-match") == etag and await blob_store.exists(blob_id):
+        return Response(status_code=304, headers=cache_headers)
+
+    blob = await blob_store.get(blob_id)
+    if blob is None:
+        raise HTTPException(status_code=404, detail="Blob not found")
+
+    data, content_type = blob
+    return Response(content=data, media_type=content_type, headers=cache_headers)
+
+
 class StreamingDiagramRequest(BaseModel):
     prompt: str
     type: str
@@ -218,33 +312,125 @@ class StreamingDiagramRequest(BaseModel):
     user_id: str
     project_id: Optional[str] = None
     data_info: Optional[dict] = None
+    candidates: Optional[int] = None
+    priority: str = 'interactive'
+    trace: bool = False
+    # Set on a retry so cached LLM responses and reused plans are not replayed
+    refresh: bool = False
 
 
-@app.post("/api/figures/generate-stream")
-async def generate_figure_stream(request: StreamingDiagramRequest):
+class BatchFigure(BaseModel):
+    prompt: str
+    type: str
+    data_info: Optional[dict] = None
+    candidates: Optional[int] = None
+
+
+class BatchDiagramRequest(BaseModel):
+    domain: str
+    user_id: str
+    project_id: Optional[str] = None
+    figures: List[BatchFigure]
+    style_notes: Optional[str] = None
+    concurrency: Optional[int] = None
+    priority: str = 'batch'
+    trace: bool = False
+    refresh: bool = False
+
+
+def _submit_job(
+    request: BaseModel,
+    generate: Callable[[], AsyncIterator[dict]],
+    detached: bool = False,
+    scheduled: bool = True
+) -> Job:
+    # Unscheduled jobs take scheduler slots themselves for each unit of work
     if not orchestrator:
         raise HTTPException(
             status_code=500,
             detail="Orchestrator not initialized. Check API keys configuration."
         )
 
+    key = hashlib.sha256(
+        json.dumps(
+            {'kind': type(request).__name__, **request.model_dump(exclude={'priority'})},
+            sort_keys=True,
+            default=str
+        ).encode('utf-8')
+    ).hexdigest()
+    existing = jobs.running(key)
+    if existing is not None:
+        return existing
+
+    try:
+        if not scheduled:
+            scheduler.check_admission(request.user_id, request.priority)
+            return jobs.submit(generate, key, detached)
+        ticket = scheduler.reserve(request.user_id, request.priority)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except QueueFull as e:
+        raise HTTPException(
+            status_code=429,
+            detail=f"{str(e)}. Please retry later.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+    # Released by the job's teardown too: a job cancelled before scheduler.run
+    # is first iterated never reaches that generator's finally
+    return jobs.submit(
+        lambda: scheduler.run(ticket, generate), key, detached, on_done=lambda: scheduler.release(ticket)
+    )
+
+
+def _start_generation(request: StreamingDiagramRequest, detached: bool = False) -> Job:
+    return _submit_job(request, lambda: orchestrator.generate_diagram(
+        prompt=request.prompt,
+        diagram_type=request.type,
+        domain=request.domain,
+        user_id=request.user_id,
+        project_id=request.project_id,
+        data_info=request.data_info,
+        candidates=request.candidates,
+        include_trace=request.trace,
+        refresh=request.refresh
+    ), detached)
+
+
+def _start_batch(request: BatchDiagramRequest, detached: bool = False) -> Job:
+    if not request.figures:
+        raise HTTPException(status_code=400, detail="A batch needs at least one figure")
+    if len(request.figures) > BATCH_MAX_FIGURES:
+        raise HTTPException(status_code=400, detail=f"A batch can hold at most {BATCH_MAX_FIGURES} figures")
+
+    # Each figure, and the shared retrieval and styling before them, takes its
+    # own scheduler slot, so a batch counts against the concurrency cap and
+    # per-user fairness like the same number of separate requests
+    def in_slot(generate: Callable[[], AsyncIterator[dict]]) -> AsyncIterator[dict]:
+        return scheduler.run_reserved(request.user_id, request.priority, generate)
+
+    return _submit_job(request, lambda: orchestrator.generate_batch(
+        figures=[figure.model_dump() for figure in request.figures],
+        domain=request.domain,
+        user_id=request.user_id,
+        project_id=request.project_id,
+        style_notes=request.style_notes,
+        concurrency=request.concurrency,
+        include_trace=request.trace,
+        refresh=request.refresh,
+        in_slot=in_slot
+    ), detached, scheduled=False)
+
+
+def _stream_job(job: Job, last_event_id: Optional[str]) -> StreamingResponse:
+    try:
+        after = int(last_event_id) if last_event_id else -1
+    except ValueError:
+        after = -1
+
     async def event_generator():
-        try:
-            async for event in orchestrator.generate_diagram(
-                prompt=request.prompt,
-                diagram_type=request.type,
-                domain=request.domain,
-                user_id=request.user_id,
-                project_id=request.project_id,
-                data_info=request.data_info
-            ):
-                yield f"data: {json.dumps(event)}\n\n"
-        except Exception as e:
-            error_event = {
-                'type': 'error',
-                'data': {'message': str(e)}
-            }
-            yield f"data: {json.dumps(error_event)}\n\n"
+        async for event_id, event in job.follow(after):
+            yield f"id: {event_id}\ndata: {json.dumps(event)}\n\n"
 
     return StreamingResponse(
         event_generator(),
@@ -252,11 +438,60 @@ async def generate_figure_stream(request: StreamingDiagramRequest):
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"
+            "X-Accel-Buffering": "no",
+            "X-Job-Id": job.id
         }
     )
 
 
+@app.post("/api/figures/generate-stream")
+async def generate_figure_stream(request: StreamingDiagramRequest, http_request: Request):
+    job = _start_generation(request)
+    return _stream_job(job, http_request.headers.get('last-event-id'))
+
+
+@app.post("/api/figures/batch-stream")
+async def generate_figure_batch_stream(request: BatchDiagramRequest, http_request: Request):
+    job = _start_batch(request)
+    return _stream_job(job, http_request.headers.get('last-event-id'))
+
+
+@app.post("/api/figures/batch-jobs")
+async def create_figure_batch_job(request: BatchDiagramRequest):
+    return _start_batch(request, detached=True).summary()
+
+
+@app.post("/api/figures/jobs")
+async def create_figure_job(request: StreamingDiagramRequest):
+    # Jobs started here are meant to run unattended, so they survive having no clients
+    return _start_generation(request, detached=True).summary()
+
+
+@app.get("/api/figures/jobs/{job_id}")
+async def get_figure_job(job_id: str):
+    job = await jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.summary()
+
+
+@app.delete("/api/figures/jobs/{job_id}")
+async def cancel_figure_job(job_id: str):
+    job = await jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job.cancel("Cancelled by the user")
+    return job.summary()
+
+
+@app.get("/api/figures/jobs/{job_id}/events")
+async def stream_figure_job(job_id: str, request: Request):
+    job = await jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _stream_job(job, request.headers.get('last-event-id'))
+
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import os
+import re
+import struct
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+BLOB_ID_PATTERN = re.compile(r'^[0-9a-f]{64}\.(png|svg|pdf)$')
+
+# Recent uploads remembered so repeated renders of the same image skip the upload
+UPLOAD_MEMO_SIZE = 4096
+
+CONTENT_TYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+    'pdf': 'application/pdf'
+}
+
+
+def png_dimensions(data: bytes) -> Tuple[Optional[int], Optional[int]]:
+    # Width and height live in the IHDR chunk right after the 8-byte signature
+    if len(data) < 24 or data[:8] != b'\x89PNG\r\n\x1a\n':
+        return None, None
+    width, height = struct.unpack('>II', data[16:24])
+    return width, height
+
+
+class BlobStore(ABC):
+    url_prefix = '/api/blobs'
+
+    async def put(self, data: bytes, extension: str = 'png') -> Dict[str, Any]:
+        blob_id = f"{hashlib.sha256(data).hexdigest()}.{extension}"
+        await self._write(blob_id, data, CONTENT_TYPES[extension])
+
+        ref = {
+            'id': blob_id,
+            'url': f"{self.url_prefix}/{blob_id}",
+            'format': extension,
+            'size': len(data)
+        }
+        if extension == 'png':
+            ref['width'], ref['height'] = png_dimensions(data)
+        return ref
+
+    async def get(self, blob_id: str) -> Optional[Tuple[bytes, str]]:
+        if not BLOB_ID_PATTERN.match(blob_id):
+            return None
+        data = await self._read(blob_id)
+        if data is None:
+            return None
+        return data, CONTENT_TYPES[blob_id.rsplit('.', 1)[1]]
+
+    async def exists(self, blob_id: str) -> bool:
+        return bool(BLOB_ID_PATTERN.match(blob_id)) and await self._exists(blob_id)
+
+    @abstractmethod
+    async def _write(self, blob_id: str, data: bytes, content_type: str) -> None:
+        pass
+
+    @abstractmethod
+    async def _read(self, blob_id: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    async def _exists(self, blob_id: str) -> bool:
+        pass
+
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, blob_id: str) -> str:
+        return os.path.join(self.root, blob_id[:2], blob_id)
+
+    async def _write(self, blob_id: str, data: bytes, content_type: str) -> None:
+        await asyncio.to_thread(self._write_file, self._path(blob_id), data)
+
+    async def _read(self, blob_id: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._read_file, self._path(blob_id))
+
+    async def _exists(self, blob_id: str) -> bool:
+        return await asyncio.to_thread(os.path.exists, self._path(blob_id))
+
+    def _write_file(self, path: str, data: bytes) -> None:
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _read_file(self, path: str) -> Optional[bytes]:
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+
+class SupabaseBlobStore(BlobStore):
+    def __init__(self, supabase_client, bucket: str, prefix: str = 'renders'):
+        self.bucket = supabase_client.storage.from_(bucket)
+        self.prefix = prefix
+        self._uploaded: "OrderedDict[str, None]" = OrderedDict()
+
+    def _path(self, blob_id: str) -> str:
+        return f"{self.prefix}/{blob_id}"
+
+    async def _write(self, blob_id: str, data: bytes, content_type: str) -> None:
+        if blob_id in self._uploaded:
+            self._uploaded.move_to_end(blob_id)
+            return
+        await asyncio.to_thread(
+            self.bucket.upload,
+            self._path(blob_id),
+            data,
+            {'content-type': content_type, 'upsert': 'true'}
+        )
+        self._uploaded[blob_id] = None
+        while len(self._uploaded) > UPLOAD_MEMO_SIZE:
+            self._uploaded.popitem(last=False)
+
+    async def _read(self, blob_id: str) -> Optional[bytes]:
+        try:
+            return await asyncio.to_thread(self.bucket.download, self._path(blob_id))
+        except Exception:
+            return None
+
+    async def _exists(self, blob_id: str) -> bool:
+        try:
+            return await asyncio.to_thread(self.bucket.exists, self._path(blob_id))
+        except Exception:
+            return False
+
+
+def create_blob_store(supabase_client=None) -> BlobStore:
+    backend = os.getenv("BLOB_STORE", "supabase" if supabase_client else "local")
+    if backend == 'supabase' and supabase_client:
+        return SupabaseBlobStore(supabase_client, os.getenv("BLOB_STORE_BUCKET", "figures"))
+    return LocalBlobStore(os.getenv("BLOB_STORE_DIR", "blobs"))
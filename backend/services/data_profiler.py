@@ -0,0 +1,258 @@
+import io
+import json
+import os
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
+import numpy as np
+import pandas as pd
+
+
+PROFILE_CHUNK_ROWS = int(os.getenv("PROFILE_CHUNK_ROWS", "50000"))
+SAMPLE_SIZE = 5
+DISTINCT_SKETCH_SIZE = 1024
+
+SUPPORTED_EXTENSIONS = ('csv', 'json', 'jsonl', 'ndjson', 'xlsx', 'parquet')
+
+
+class ColumnProfile:
+    def __init__(self, name: str):
+        self.name = name
+        self.dtype: Optional[str] = None
+        self.count = 0
+        self.nulls = 0
+        self.minimum: Any = None
+        self.maximum: Any = None
+        self.total = 0.0
+        self._numeric_count = 0
+        # K-minimum-values sketch over 64-bit value hashes for distinct-count estimates
+        self._sketch = np.empty(0, dtype=np.uint64)
+
+    def update(self, values: pd.Series) -> None:
+        self.dtype = self._merge_dtype(self.dtype, values.dtype)
+        nulls = int(values.isna().sum())
+        self.count += len(values)
+        self.nulls += nulls
+
+        present = values.dropna()
+        if present.empty:
+            return
+
+        if pd.api.types.is_numeric_dtype(present) and not pd.api.types.is_bool_dtype(present):
+            self._update_range(present.min(), present.max())
+            self.total += float(present.sum())
+            self._numeric_count += len(present)
+        elif pd.api.types.is_datetime64_any_dtype(present):
+            self._update_range(present.min(), present.max())
+
+        hashes = pd.util.hash_pandas_object(present, index=False).to_numpy(dtype=np.uint64)
+        self._sketch = np.unique(np.concatenate([self._sketch, hashes]))[:DISTINCT_SKETCH_SIZE]
+
+    def distinct_estimate(self) -> int:
+        if len(self._sketch) < DISTINCT_SKETCH_SIZE:
+            return int(len(self._sketch))
+        kth = float(self._sketch[-1]) / float(np.iinfo(np.uint64).max)
+        return int((DISTINCT_SKETCH_SIZE - 1) / kth)
+
+    def summary(self) -> Dict[str, Any]:
+        summary = {
+            'dtype': self.dtype,
+            'count': self.count,
+            'nulls': self.nulls,
+            'distinct_estimate': self.distinct_estimate()
+        }
+        if self.minimum is not None:
+            summary['min'] = _to_json_value(self.minimum)
+            summary['max'] = _to_json_value(self.maximum)
+        if self._numeric_count:
+            summary['mean'] = self.total / self._numeric_count
+        return summary
+
+    def _update_range(self, minimum: Any, maximum: Any) -> None:
+        try:
+            self.minimum = minimum if self.minimum is None else min(self.minimum, minimum)
+            self.maximum = maximum if self.maximum is None else max(self.maximum, maximum)
+        except TypeError:
+            # Chunks disagreed on the column's type; the range is no longer meaningful
+            self.minimum = self.maximum = None
+
+    @staticmethod
+    def _merge_dtype(current: Optional[str], dtype) -> str:
+        dtype = str(dtype)
+        if current is None or current == dtype:
+            return dtype
+        numeric = ('int', 'uint', 'float')
+        if current.startswith(numeric) and dtype.startswith(numeric):
+            return 'float64'
+        return 'object'
+
+
+class DatasetProfile:
+    def __init__(self, sample_size: int = SAMPLE_SIZE, seed: int = 0):
+        self.columns: Dict[str, ColumnProfile] = {}
+        self.row_count = 0
+        self.sample_size = sample_size
+        self.sample: List[Dict[str, Any]] = []
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        for name in chunk.columns:
+            key = str(name)
+            if key not in self.columns:
+                self.columns[key] = ColumnProfile(key)
+            self.columns[key].update(chunk[name])
+
+        self._update_sample(chunk)
+        self.row_count += len(chunk)
+
+    def _update_sample(self, chunk: pd.DataFrame) -> None:
+        # Reservoir sampling (Algorithm R) applied chunk-wise: row i of the stream
+        # replaces slot j = randint(0, i) when j falls inside the reservoir.
+        positions = np.arange(len(chunk))
+        stream_index = self.row_count + positions
+
+        fill = positions[stream_index < self.sample_size]
+        if len(fill):
+            self.sample.extend(_records(chunk.iloc[fill]))
+
+        rest = positions[stream_index >= self.sample_size]
+        if len(rest):
+            slots = self._rng.integers(0, stream_index[rest] + 1)
+            chosen = slots < self.sample_size
+            for position, slot in zip(rest[chosen], slots[chosen]):
+                self.sample[slot] = _records(chunk.iloc[[position]])[0]
+
+    def to_data_info(self) -> Dict[str, Any]:
+        return {
+            'columns': list(self.columns.keys()),
+            'row_count': self.row_count,
+            'dtypes': [column.dtype for column in self.columns.values()],
+            'sample': self.sample,
+            'column_stats': {name: column.summary() for name, column in self.columns.items()}
+        }
+
+
+def _to_json_value(value: Any) -> Any:
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _records(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    return json.loads(frame.to_json(orient='records', date_format='iso'))
+
+
+def _iter_json_array(fileobj: BinaryIO, read_size: int = 1 << 16) -> Iterator[Any]:
+    decoder = json.JSONDecoder()
+    reader = io.TextIOWrapper(fileobj, encoding='utf-8')
+    buffer = ''
+    started = False
+    eof = False
+
+    try:
+        while not eof:
+            chunk = reader.read(read_size)
+            eof = not chunk
+            buffer += chunk
+            position = 0
+
+            if not started:
+                buffer = buffer.lstrip()
+                if not buffer:
+                    continue
+                if buffer[0] != '[':
+                    found = 'an object' if buffer[0] == '{' else 'a single value'
+                    raise ValueError(
+                        f"JSON uploads must be an array of records, but this file holds {found}. "
+                        "Wrap the records in [ ] or upload them as JSONL."
+                    )
+                started = True
+                position = 1
+
+            while True:
+                while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                    position += 1
+                if position < len(buffer) and buffer[position] == ']':
+                    return
+                try:
+                    item, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    break
+                # A value that runs to the end of the buffer may still be incomplete
+                if end == len(buffer) and not eof:
+                    break
+                yield item
+                position = end
+
+            buffer = buffer[position:]
+
+        if buffer.strip():
+            raise ValueError("Truncated JSON document")
+    finally:
+        # Leave the caller's file open
+        reader.detach()
+
+
+def _chunk_records(records: Iterator[Any], chunk_rows: int) -> Iterator[pd.DataFrame]:
+    batch = []
+    for record in records:
+        batch.append(record if isinstance(record, dict) else {'value': record})
+        if len(batch) >= chunk_rows:
+            yield pd.DataFrame.from_records(batch)
+            batch = []
+    if batch:
+        yield pd.DataFrame.from_records(batch)
+
+
+def _iter_xlsx(fileobj: BinaryIO, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(name) if name is not None else f"column_{index}" for index, name in enumerate(header)]
+
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunk_rows:
+                yield pd.DataFrame.from_records(batch, columns=columns)
+                batch = []
+        if batch:
+            yield pd.DataFrame.from_records(batch, columns=columns)
+    finally:
+        workbook.close()
+
+
+def _iter_parquet(fileobj: BinaryIO, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(fileobj)
+    for batch in parquet_file.iter_batches(batch_size=chunk_rows):
+        yield batch.to_pandas()
+
+
+def iter_chunks(fileobj: BinaryIO, extension: str, chunk_rows: int = PROFILE_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    if extension == 'csv':
+        yield from pd.read_csv(fileobj, chunksize=chunk_rows)
+    elif extension in ('jsonl', 'ndjson'):
+        yield from pd.read_json(fileobj, lines=True, chunksize=chunk_rows)
+    elif extension == 'json':
+        yield from _chunk_records(_iter_json_array(fileobj), chunk_rows)
+    elif extension == 'xlsx':
+        yield from _iter_xlsx(fileobj, chunk_rows)
+    elif extension == 'parquet':
+        yield from _iter_parquet(fileobj, chunk_rows)
+    else:
+        raise ValueError(f"Unsupported file type: {extension}")
+
+
+def profile_file(fileobj: BinaryIO, extension: str, chunk_rows: int = PROFILE_CHUNK_ROWS) -> Dict[str, Any]:
+    fileobj.seek(0)
+    profile = DatasetProfile()
+    for chunk in iter_chunks(fileobj, extension, chunk_rows):
+        profile.update(chunk)
+    return profile.to_data_info()
@@ -0,0 +1,126 @@
+import hashlib
+import os
+import re
+from typing import Any, BinaryIO, Dict, Optional
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from .data_profiler import DatasetProfile, PROFILE_CHUNK_ROWS, iter_chunks
+
+
+DATASET_STORE_DIR = os.getenv("DATASET_STORE_DIR", "datasets")
+
+DATASET_ID_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+def _arrow_type(dtype: Optional[str]) -> pa.DataType:
+    # dtype is the profiler's merge over every chunk, so a column that changes
+    # type partway through the file is already 'object' here and stored as text
+    if dtype is None:
+        return pa.string()
+    if dtype.startswith(('int', 'uint')):
+        return pa.from_numpy_dtype(np.dtype(dtype))
+    if dtype.startswith('float'):
+        return pa.float64()
+    if dtype == 'bool':
+        return pa.bool_()
+    if dtype.startswith('datetime64') and ',' not in dtype:
+        return pa.from_numpy_dtype(np.dtype(dtype))
+    return pa.string()
+
+
+def _schema(profile: DatasetProfile) -> pa.Schema:
+    return pa.schema([pa.field(name, _arrow_type(column.dtype)) for name, column in profile.columns.items()])
+
+
+def _as_text(values: pd.Series) -> pa.Array:
+    present = values.notna()
+    return pa.array(values.astype(object).where(present, None).map(str, na_action='ignore'), type=pa.string())
+
+
+def _to_array(values: pd.Series, data_type: pa.DataType) -> pa.Array:
+    if pa.types.is_string(data_type):
+        return _as_text(values)
+    # Integer columns only get here when every chunk was integer, so this
+    # never widens them; int chunks of a float column convert exactly up to 2**53
+    return pa.array(values, type=data_type, from_pandas=True, safe=not pa.types.is_floating(data_type))
+
+
+def _conform(chunk: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    chunk.columns = [str(name) for name in chunk.columns]
+    columns = [
+        _to_array(chunk[field.name], field.type)
+        if field.name in chunk.columns else pa.nulls(len(chunk), field.type)
+        for field in schema
+    ]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+class DatasetStore:
+    def __init__(self, root: str = DATASET_STORE_DIR):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, dataset_id: str) -> Optional[str]:
+        if not DATASET_ID_PATTERN.match(dataset_id or ''):
+            return None
+        path = os.path.join(self.root, f"{dataset_id}.arrow")
+        return path if os.path.exists(path) else None
+
+    def ingest(
+        self,
+        fileobj: BinaryIO,
+        extension: str,
+        chunk_rows: int = PROFILE_CHUNK_ROWS
+    ) -> Dict[str, Any]:
+        dataset_id = self._content_hash(fileobj, extension)
+        path = os.path.join(self.root, f"{dataset_id}.arrow")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+
+        # The profile pass settles every column's type across the whole file
+        # before the second pass converts it to Arrow IPC, which render workers
+        # can memory-map without parsing. A type fixed from the first chunk
+        # breaks on columns that change type or only appear later.
+        fileobj.seek(0)
+        profile = DatasetProfile()
+        for chunk in iter_chunks(fileobj, extension, chunk_rows):
+            profile.update(chunk)
+
+        writer = None
+        try:
+            if not os.path.exists(path) and profile.columns:
+                schema = _schema(profile)
+                writer = pa.ipc.new_file(tmp_path, schema)
+                fileobj.seek(0)
+                for chunk in iter_chunks(fileobj, extension, chunk_rows):
+                    writer.write_table(_conform(chunk, schema))
+                writer.close()
+                writer = None
+                os.replace(tmp_path, path)
+        finally:
+            if writer is not None:
+                writer.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        data_info = profile.to_data_info()
+        if os.path.exists(path):
+            data_info['dataset_id'] = dataset_id
+        return data_info
+
+    def _content_hash(self, fileobj: BinaryIO, extension: str) -> str:
+        digest = hashlib.sha256(extension.encode('utf-8') + b'\0')
+        fileobj.seek(0)
+        for block in iter(lambda: fileobj.read(1 << 20), b''):
+            digest.update(block)
+        return digest.hexdigest()
+
+
+_dataset_store: Optional[DatasetStore] = None
+
+
+def get_dataset_store() -> DatasetStore:
+    global _dataset_store
+    if _dataset_store is None:
+        _dataset_store = DatasetStore()
+    return _dataset_store
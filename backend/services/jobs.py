@@ -0,0 +1,302 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_right
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, TextIO, Tuple
+from .metrics import CANCELLATIONS, GENERATIONS
+
+
+logger = logging.getLogger(__name__)
+
+JOB_LOG_DIR = os.getenv("JOB_LOG_DIR", "jobs")
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+JOB_ORPHAN_GRACE_SECONDS = float(os.getenv("JOB_ORPHAN_GRACE_SECONDS", "30"))
+
+TERMINAL_EVENTS = ('complete', 'error', 'cancelled')
+
+
+class Job:
+    def __init__(
+        self,
+        job_id: str,
+        key: Optional[str] = None,
+        log_path: Optional[str] = None,
+        detached: bool = False,
+        orphan_grace: float = JOB_ORPHAN_GRACE_SECONDS
+    ):
+        self.id = job_id
+        self.key = key
+        self.log_path = log_path
+        self.detached = detached
+        self.orphan_grace = orphan_grace
+        self.followers = 0
+        self.cancel_reason: Optional[str] = None
+        self.status = 'running'
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.events: List[Dict[str, Any]] = []
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+        # Event ids stay stable when token deltas are dropped from events
+        self._ids: List[int] = []
+        self._next_id = 0
+        self._log: Optional[TextIO] = None
+        self._log_closed = False
+        self._log_lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.status != 'running'
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+            'event_count': self._next_id
+        }
+
+    async def append(self, event: Dict[str, Any]) -> None:
+        # Token deltas only matter to clients following live; they are not
+        # logged and are dropped from memory once their agent's result is in
+        if self.log_path and event.get('type') != 'agent_delta':
+            try:
+                await asyncio.to_thread(self._write, self._next_id, event)
+            except OSError as e:
+                logger.warning("Could not write event log for job %s: %s", self.id, e)
+        self._publish(event)
+
+    def cancel(self, reason: str) -> bool:
+        if self.finished or self.task is None or self.task.done():
+            return False
+        self.cancel_reason = reason
+        self.task.cancel()
+        return True
+
+    async def follow(self, after: int = -1) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        # Event ids increase monotonically, so resuming is a search for the
+        # first id after the client's last one; the list can shrink between
+        # yields when deltas are dropped, so the search is repeated each time
+        last = after
+        self.followers += 1
+        try:
+            while True:
+                changed = self._changed
+                index = bisect_right(self._ids, last)
+                while index < len(self.events):
+                    last = self._ids[index]
+                    yield last, self.events[index]
+                    index = bisect_right(self._ids, last)
+                if self.finished:
+                    return
+                await changed.wait()
+        finally:
+            self.followers -= 1
+            if self.followers == 0 and not self.finished and not self.detached:
+                # Give a dropped client time to reconnect before giving up on the work
+                asyncio.get_running_loop().call_later(self.orphan_grace, self._cancel_if_orphaned)
+
+    def _cancel_if_orphaned(self) -> None:
+        if self.followers == 0:
+            self.cancel("Every client disconnected")
+
+    def _publish(self, event: Dict[str, Any], event_id: Optional[int] = None) -> None:
+        event_id = self._next_id if event_id is None else event_id
+        self._next_id = event_id + 1
+        if event.get('type') == 'agent_complete':
+            self._drop_deltas(event.get('data') or {})
+
+        self.events.append(event)
+        self._ids.append(event_id)
+        if event.get('type') in TERMINAL_EVENTS:
+            self.status = event['type']
+            self.finished_at = time.time()
+            self._drop_deltas(None)
+            self._close_log()
+
+        # Wake every follower; later waits pick up a fresh event
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _drop_deltas(self, completed: Optional[Dict[str, Any]]) -> None:
+        # Batch figures stream concurrently, so deltas are matched on figure too
+        def dropped(event: Dict[str, Any]) -> bool:
+            if event.get('type') != 'agent_delta':
+                return False
+            if completed is None:
+                return True
+            data = event['data']
+            return data.get('agent') == completed.get('agent') and data.get('figure') == completed.get('figure')
+
+        kept = [index for index, event in enumerate(self.events) if not dropped(event)]
+        if len(kept) != len(self.events):
+            self.events = [self.events[index] for index in kept]
+            self._ids = [self._ids[index] for index in kept]
+
+    def _write(self, event_id: int, event: Dict[str, Any]) -> None:
+        # One handle per job, flushed per event so a restart loses nothing written
+        with self._log_lock:
+            if self._log_closed:
+                return
+            if self._log is None:
+                self._log = open(self.log_path, 'a', encoding='utf-8')
+            self._log.write(json.dumps({'id': event_id, **event}) + '\n')
+            self._log.flush()
+
+    def _close_log(self) -> None:
+        with self._log_lock:
+            self._log_closed = True
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+
+class JobManager:
+    def __init__(self, log_dir: Optional[str] = JOB_LOG_DIR, retention_seconds: float = JOB_RETENTION_SECONDS):
+        self.log_dir = os.path.abspath(log_dir) if log_dir else None
+        self.retention_seconds = retention_seconds
+        self.stats = {'submitted': 0, 'deduplicated': 0, 'restored': 0, 'cancelled': 0}
+        self._jobs: Dict[str, Job] = {}
+        self._running_by_key: Dict[str, Job] = {}
+        self._last_prune = 0.0
+
+        if self.log_dir:
+            os.makedirs(self.log_dir, exist_ok=True)
+
+    def submit(
+        self,
+        run: Callable[[], AsyncIterator[Dict[str, Any]]],
+        key: Optional[str] = None,
+        detached: bool = False,
+        on_done: Optional[Callable[[], None]] = None
+    ) -> Job:
+        self._prune()
+
+        # An identical request already in flight gets the existing job, so
+        # retries and double submits do not start a second generation.
+        existing = self.running(key) if key else None
+        if existing is not None:
+            self.stats['deduplicated'] += 1
+            return existing
+
+        job_id = str(uuid.uuid4())
+        job = Job(job_id, key, os.path.join(self.log_dir, f"{job_id}.jsonl") if self.log_dir else None, detached)
+        self._jobs[job_id] = job
+        if key:
+            self._running_by_key[key] = job
+
+        job.task = asyncio.create_task(self._run(job, run))
+        # Done callbacks run even when the task is cancelled before its first
+        # step, which is the one case where neither _run nor the wrapped
+        # generator gets to clean up
+        job.task.add_done_callback(lambda task: self._teardown(job, on_done))
+        self.stats['submitted'] += 1
+        return job
+
+    def running(self, key: str) -> Optional[Job]:
+        job = self._running_by_key.get(key)
+        return job if job is not None and not job.finished else None
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is None and self.log_dir:
+            job = await asyncio.to_thread(self._restore, job_id)
+            if job is not None:
+                self._jobs[job_id] = job
+                self.stats['restored'] += 1
+        return job
+
+    def active(self) -> int:
+        return sum(1 for job in self._jobs.values() if not job.finished)
+
+    async def _run(self, job: Job, run: Callable[[], AsyncIterator[Dict[str, Any]]]) -> None:
+        try:
+            await job.append({'type': 'job', 'data': {'job_id': job.id}})
+            async for event in run():
+                await job.append(event)
+            if not job.finished:
+                await job.append({'type': 'error', 'data': {'message': 'Generation ended without a result'}})
+        except asyncio.CancelledError:
+            # Cancellation unwinds the orchestrator at its current await: pending
+            # LLM calls are abandoned, renders killed and nothing is saved.
+            self._record_cancelled(job)
+            raise
+        except Exception as e:
+            await job.append({'type': 'error', 'data': {'message': str(e)}})
+
+    def _record_cancelled(self, job: Job) -> None:
+        if job.finished:
+            return
+        self.stats['cancelled'] += 1
+        CANCELLATIONS.labels('job').inc()
+        event = {'type': 'cancelled', 'data': {'message': job.cancel_reason or 'Generation was cancelled'}}
+        if job.log_path:
+            try:
+                job._write(job._next_id, event)
+            except OSError as e:
+                logger.warning("Could not write event log for job %s: %s", job.id, e)
+        job._publish(event)
+
+    def _teardown(self, job: Job, on_done: Optional[Callable[[], None]]) -> None:
+        self._record_cancelled(job)
+        GENERATIONS.labels(job.status).inc()
+        if self._running_by_key.get(job.key) is job:
+            del self._running_by_key[job.key]
+        if on_done is not None:
+            try:
+                on_done()
+            except Exception:
+                logger.exception("Cleanup for job %s failed", job.id)
+
+    def _restore(self, job_id: str) -> Optional[Job]:
+        try:
+            uuid.UUID(job_id)
+        except ValueError:
+            return None
+
+        path = os.path.join(self.log_dir, f"{job_id}.jsonl")
+        try:
+            with open(path, encoding='utf-8') as f:
+                events = [json.loads(line) for line in f if line.strip()]
+            logged = [(event.pop('id'), event) for event in events]
+        except (OSError, ValueError, KeyError):
+            return None
+
+        job = Job(job_id, log_path=path)
+        job.created_at = os.path.getctime(path)
+        for event_id, event in logged:
+            job._publish(event, event_id)
+        if not job.finished:
+            # The process that ran this job is gone
+            event = {'type': 'error', 'data': {'message': 'Generation was interrupted by a server restart'}}
+            try:
+                job._write(job._next_id, event)
+            except OSError as e:
+                logger.warning("Could not write event log for job %s: %s", job.id, e)
+            job._publish(event)
+        job._close_log()
+        return job
+
+    def _prune(self) -> None:
+        now = time.time()
+        if now - self._last_prune < 60:
+            return
+        self._last_prune = now
+
+        cutoff = now - self.retention_seconds
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+        if self.log_dir:
+            for filename in os.listdir(self.log_dir):
+                path = os.path.join(self.log_dir, filename)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                except OSError:
+                    pass
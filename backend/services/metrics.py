@@ -0,0 +1,96 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+
+SPAN_SECONDS = Histogram(
+    'fourms_span_duration_seconds',
+    'Duration of orchestrator stages, LLM calls, renders and database calls',
+    ['kind', 'name'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+)
+LLM_TOKENS = Counter('fourms_llm_tokens_total', 'LLM tokens by agent and direction', ['agent', 'direction'])
+LLM_CACHE_HITS = Counter('fourms_llm_cache_hits_total', 'LLM responses served from the response cache', ['agent'])
+RENDER_CPU_TIME = Histogram(
+    'fourms_render_cpu_seconds',
+    'CPU time used by a render worker per render',
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60)
+)
+RENDER_PEAK_MEMORY = Histogram(
+    'fourms_render_peak_memory_bytes',
+    'Peak resident memory of the render worker after a render',
+    buckets=tuple(mb * 1024 * 1024 for mb in (64, 128, 256, 512, 1024, 2048, 4096))
+)
+IMAGE_BYTES = Histogram(
+    'fourms_image_bytes',
+    'Size of rendered outputs',
+    ['output'],
+    buckets=tuple(kb * 1024 for kb in (8, 32, 128, 512, 1024, 4096, 16384))
+)
+DB_WRITE_SECONDS = Histogram('fourms_db_write_duration_seconds', 'Batched Supabase writes', ['table'])
+SEMANTIC_CACHE_LOOKUPS = Counter('fourms_semantic_cache_lookups_total', 'Plan reuse lookups for near-duplicate requests', ['result'])
+CRITIC_SKIPS = Counter('fourms_critic_skipped_total', 'Critic calls answered by the figure linter', ['decision'])
+STYLE_PRESET_USES = Counter('fourms_style_presets_total', 'Styling passes answered by a style preset instead of the stylist', ['preset'])
+GENERATIONS = Counter('fourms_generations_total', 'Finished generation jobs by outcome', ['status'])
+CANCELLATIONS = Counter('fourms_cancellations_total', 'Work abandoned because its job was cancelled', ['kind'])
+
+
+class Trace:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+
+    def record(self, kind: str, name: str, start: float, duration: float, attributes: Dict[str, Any]) -> None:
+        self.spans.append({
+            'kind': kind,
+            'name': name,
+            'start_ms': round((start - self.started) * 1000, 1),
+            'duration_ms': round(duration * 1000, 1),
+            **attributes
+        })
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'duration_ms': round((time.perf_counter() - self.started) * 1000, 1),
+            'spans': sorted(self.spans, key=lambda span: span['start_ms'])
+        }
+
+
+# Context variables follow the request into tasks created with asyncio, so
+# spans opened inside agent tasks and gathered candidates land on the same trace.
+_current_trace: ContextVar[Optional[Trace]] = ContextVar('trace', default=None)
+_current_span: ContextVar[Optional[Dict[str, Any]]] = ContextVar('span', default=None)
+
+
+def start_trace() -> Trace:
+    trace = Trace()
+    _current_trace.set(trace)
+    return trace
+
+
+@contextmanager
+def span(kind: str, name: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+    start = time.perf_counter()
+    token = _current_span.set(attributes)
+    try:
+        yield attributes
+    finally:
+        _current_span.reset(token)
+        duration = time.perf_counter() - start
+        SPAN_SECONDS.labels(kind, name).observe(duration)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.record(kind, name, start, duration, attributes)
+
+
+def annotate(**attributes: Any) -> None:
+    current = _current_span.get()
+    if current is not None:
+        current.update(attributes)
+
+
+def render_metrics() -> bytes:
+    return generate_latest()
+
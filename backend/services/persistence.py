@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import httpx
+from postgrest.exceptions import APIError
+from .metrics import DB_WRITE_SECONDS
+
+
+logger = logging.getLogger(__name__)
+
+PERSIST_BATCH_SIZE = int(os.getenv("PERSIST_BATCH_SIZE", "50"))
+PERSIST_FLUSH_INTERVAL_SECONDS = float(os.getenv("PERSIST_FLUSH_INTERVAL_SECONDS", "0.5"))
+PERSIST_MAX_RETRIES = int(os.getenv("PERSIST_MAX_RETRIES", "5"))
+PERSIST_MAX_QUEUE_SIZE = int(os.getenv("PERSIST_MAX_QUEUE_SIZE", "5000"))
+
+# Postgres error classes worth retrying: connection, transaction rollback,
+# insufficient resources, operator intervention and system errors
+TRANSIENT_SQLSTATE_CLASSES = ('08', '40', '53', '57', '58')
+# PostgREST could not reach the database, load its schema cache or get a pooled connection
+TRANSIENT_POSTGREST_CODES = ('PGRST000', 'PGRST001', 'PGRST002', 'PGRST003')
+
+# A figure row plus the generation rows that reference it; a running figure
+# is enqueued once per iteration with that iteration's row
+PersistenceUnit = Tuple[Dict[str, Any], List[Dict[str, Any]]]
+
+
+def _is_transient_status(status: int) -> bool:
+    return status == 429 or status >= 500
+
+
+def _is_transient(error: Exception) -> bool:
+    if isinstance(error, APIError):
+        code = error.code
+        # PostgREST reports the HTTP status as the code when the error body is not JSON
+        if isinstance(code, int) or (isinstance(code, str) and code.isdigit() and len(code) == 3):
+            return _is_transient_status(int(code))
+        code = str(code or '')
+        return code in TRANSIENT_POSTGREST_CODES or code[:2] in TRANSIENT_SQLSTATE_CLASSES
+    if isinstance(error, httpx.HTTPStatusError):
+        return _is_transient_status(error.response.status_code)
+    return isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError))
+
+
+class PersistenceQueue:
+    def __init__(
+        self,
+        supabase_client,
+        batch_size: int = PERSIST_BATCH_SIZE,
+        flush_interval: float = PERSIST_FLUSH_INTERVAL_SECONDS,
+        max_retries: int = PERSIST_MAX_RETRIES,
+        max_queue_size: int = PERSIST_MAX_QUEUE_SIZE
+    ):
+        self.supabase = supabase_client
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.max_queue_size = max_queue_size
+        self.stats = {
+            'figures_written': 0,
+            'generations_written': 0,
+            'figures_dropped': 0,
+            'generations_dropped': 0,
+            'retries': 0,
+            'overflowed': 0
+        }
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def enqueue(self, figure: Dict[str, Any], generations: List[Dict[str, Any]]) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        try:
+            self._queue.put_nowait((figure, generations))
+        except asyncio.QueueFull:
+            # The database has been unreachable long enough to fill the queue; new
+            # units are dropped so an outage cannot grow memory without limit
+            self.stats['overflowed'] += 1
+            logger.error(
+                "Persistence queue full (%d pending), dropping figure %s and %d generations",
+                self._queue.qsize(), figure.get('id'), len(generations)
+            )
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def close(self) -> None:
+        if self._queue is not None:
+            await self._queue.join()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _flush(self, batch: List[PersistenceUnit]) -> None:
+        written = await self._write_units('figures', batch, lambda unit: [unit[0]])
+        # Generation rows reference their figure, so they are dropped with it
+        lost = [row for unit in batch if not any(unit is kept for kept in written) for row in unit[1]]
+        self.stats['generations_dropped'] += len(lost)
+        await self._write_units('generations', written, lambda unit: unit[1])
+
+    async def _write_units(
+        self,
+        table: str,
+        units: List[PersistenceUnit],
+        rows_of: Callable[[PersistenceUnit], List[Dict[str, Any]]]
+    ) -> List[PersistenceUnit]:
+        # A running figure is re-sent after every iteration, and one upsert
+        # cannot touch the same id twice, so only its latest row is kept
+        rows = list({row['id']: row for unit in units for row in rows_of(unit)}.values())
+        error = await self._write(table, rows)
+        if error is None:
+            self.stats[f'{table}_written'] += len(rows)
+            return units
+
+        if len(units) > 1 and not _is_transient(error):
+            # Isolate the unit the database rejects so it cannot sink everyone else's rows
+            written = []
+            for unit in units:
+                written.extend(await self._write_units(table, [unit], rows_of))
+            return written
+
+        self.stats[f'{table}_dropped'] += len(rows)
+        logger.error(
+            "Dropping %d %s rows for figures %s (%s error): %s",
+            len(rows), table,
+            sorted({figure.get('id') for figure, _ in units}),
+            'transient' if _is_transient(error) else 'permanent',
+            error
+        )
+        return []
+
+    async def _write(self, table: str, rows: List[Dict[str, Any]]) -> Optional[Exception]:
+        if not rows:
+            return None
+
+        for attempt in range(max(1, self.max_retries)):
+            try:
+                # Rows carry client-generated ids, so retrying an upsert is idempotent
+                with DB_WRITE_SECONDS.labels(table).time():
+                    await asyncio.to_thread(lambda: self.supabase.table(table).upsert(rows).execute())
+                return None
+            except Exception as e:
+                if not _is_transient(e):
+                    return e
+                logger.warning("Writing %d rows to %s failed (attempt %d): %s", len(rows), table, attempt + 1, e)
+                if attempt + 1 >= self.max_retries:
+                    return e
+                self.stats['retries'] += 1
+                await asyncio.sleep(min(0.5 * 2 ** attempt, 10))
+        return None
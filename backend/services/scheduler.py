@@ -0,0 +1,204 @@
+import asyncio
+import itertools
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, Optional
+
+
+GENERATION_MAX_CONCURRENCY = int(os.getenv("GENERATION_MAX_CONCURRENCY", "4"))
+GENERATION_MAX_QUEUE = int(os.getenv("GENERATION_MAX_QUEUE", "64"))
+GENERATION_MAX_QUEUED_PER_USER = int(os.getenv("GENERATION_MAX_QUEUED_PER_USER", "8"))
+
+# Lower value is served first
+PRIORITIES = {'interactive': 0, 'batch': 1}
+
+# Seed for the running estimate of how long a generation holds its slot
+DEFAULT_RUN_SECONDS = 60.0
+
+
+class QueueFull(Exception):
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Ticket:
+    _sequence = itertools.count()
+
+    def __init__(self, user_id: str, priority: str):
+        self.id = next(self._sequence)
+        self.user_id = user_id
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.granted = asyncio.Event()
+        self.released = False
+
+
+class GenerationScheduler:
+    def __init__(
+        self,
+        max_concurrency: int = GENERATION_MAX_CONCURRENCY,
+        max_queue: int = GENERATION_MAX_QUEUE,
+        max_queued_per_user: int = GENERATION_MAX_QUEUED_PER_USER
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queued_per_user = max_queued_per_user
+        self.stats = {'admitted': 0, 'rejected': 0, 'completed': 0}
+
+        # One round-robin ring of users per priority class; each user has a FIFO
+        self._queues: Dict[int, "OrderedDict[str, Deque[Ticket]]"] = {
+            rank: OrderedDict() for rank in sorted(PRIORITIES.values())
+        }
+        self._queued = 0
+        self._running = 0
+        self._run_seconds = DEFAULT_RUN_SECONDS
+        self._changed = asyncio.Event()
+
+    def check_admission(self, user_id: str, priority: str = 'interactive') -> None:
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority '{priority}'. Use one of: {', '.join(PRIORITIES)}")
+
+        user_queued = sum(len(queue.get(user_id, ())) for queue in self._queues.values())
+        if self._queued >= self.max_queue:
+            self._reject("The generation queue is full", self._queued)
+        if user_queued >= self.max_queued_per_user:
+            self._reject("Too many queued generations for this user", user_queued)
+
+    def reserve(self, user_id: str, priority: str = 'interactive') -> Ticket:
+        self.check_admission(user_id, priority)
+
+        ticket = Ticket(user_id, priority)
+        self._queues[PRIORITIES[priority]].setdefault(user_id, deque()).append(ticket)
+        self._queued += 1
+        self.stats['admitted'] += 1
+        self._dispatch()
+        # Fair queuing can place a new user ahead of tickets already waiting
+        self._notify()
+        return ticket
+
+    async def run(
+        self,
+        ticket: Ticket,
+        generate: Callable[[], AsyncIterator[Dict[str, Any]]]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        try:
+            last_position = None
+            while not ticket.granted.is_set():
+                changed = self._changed
+                position = self.position(ticket)
+                if position != last_position:
+                    last_position = position
+                    yield {
+                        'type': 'queued',
+                        'data': {
+                            'position': position,
+                            'priority': ticket.priority,
+                            'message': f"Waiting for a free slot (position {position} in queue)..."
+                        }
+                    }
+                await changed.wait()
+
+            async for event in generate():
+                yield event
+        finally:
+            self.release(ticket)
+
+    async def run_reserved(
+        self,
+        user_id: str,
+        priority: str,
+        generate: Callable[[], AsyncIterator[Dict[str, Any]]]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        # Reserves on the first iteration, so a caller cancelled before then holds nothing
+        ticket = self.reserve(user_id, priority)
+        try:
+            async for event in self.run(ticket, generate):
+                yield event
+        finally:
+            self.release(ticket)
+
+    def release(self, ticket: Ticket) -> None:
+        if ticket.released:
+            return
+        ticket.released = True
+
+        if ticket.started_at is None:
+            queue = self._queues[PRIORITIES[ticket.priority]]
+            user_queue = queue.get(ticket.user_id)
+            if user_queue and ticket in user_queue:
+                user_queue.remove(ticket)
+                self._queued -= 1
+                if not user_queue:
+                    del queue[ticket.user_id]
+        else:
+            self._running -= 1
+            self.stats['completed'] += 1
+            duration = time.monotonic() - ticket.started_at
+            self._run_seconds = 0.8 * self._run_seconds + 0.2 * duration
+
+        self._dispatch()
+        self._notify()
+
+    def position(self, ticket: Ticket) -> int:
+        for position, queued in enumerate(self._dispatch_order(), start=1):
+            if queued is ticket:
+                return position
+        return 0
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'running': self._running,
+            'queued': self._queued,
+            'max_concurrency': self.max_concurrency,
+            'estimated_run_seconds': round(self._run_seconds, 1)
+        }
+
+    def _dispatch(self) -> None:
+        dispatched = False
+        while self._running < self.max_concurrency and self._queued:
+            ticket = self._pop_next()
+            ticket.started_at = time.monotonic()
+            ticket.granted.set()
+            self._running += 1
+            dispatched = True
+        if dispatched:
+            self._notify()
+
+    def _pop_next(self) -> Ticket:
+        for queue in self._queues.values():
+            if not queue:
+                continue
+            user_id, user_queue = next(iter(queue.items()))
+            ticket = user_queue.popleft()
+            # The user goes to the back of the ring so others get a turn
+            del queue[user_id]
+            if user_queue:
+                queue[user_id] = user_queue
+            self._queued -= 1
+            return ticket
+        raise IndexError("No queued generations")
+
+    def _dispatch_order(self) -> Iterator[Ticket]:
+        # Mirrors _pop_next: strict priority between classes, one ticket per
+        # user per round within a class.
+        for queue in self._queues.values():
+            user_queues = list(queue.values())
+            depth = max((len(user_queue) for user_queue in user_queues), default=0)
+            for round_index in range(depth):
+                for user_queue in user_queues:
+                    if round_index < len(user_queue):
+                        yield user_queue[round_index]
+
+    def _reject(self, message: str, queued_ahead: int) -> None:
+        self.stats['rejected'] += 1
+        waves = (queued_ahead + self.max_concurrency) / max(self.max_concurrency, 1)
+        raise QueueFull(message, max(1, math.ceil(waves * self._run_seconds)))
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
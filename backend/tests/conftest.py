@@ -0,0 +1,33 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from agents import llm_client
+from agents.base_agent import AgentResult
+from agents.orchestrator import DiagramOrchestrator
+from benchmarks.fakes import FakeGenerativeModel, FakeSupabase, LatencyModel
+
+
+@pytest.fixture
+def orchestrator(monkeypatch):
+    latency = LatencyModel(1, 0.1, 0)
+    llm_client.set_model_factory(lambda name: FakeGenerativeModel(name, latency, refine_rate=0, seed=0))
+    database = FakeSupabase()
+    database.seed_references(5)
+    orchestrator = DiagramOrchestrator(database, blob_store=object())
+    orchestrator.semantic_cache = None
+
+    async def visualize(input_data):
+        return AgentResult(success=True, data={
+            'code': 'plt.plot([1, 2])',
+            'image': {'id': 'preview', 'url': '/preview', 'format': 'png', 'size': 1},
+            'thumbnail': None,
+            'reduction': None,
+            'lint': None
+        })
+
+    monkeypatch.setattr(orchestrator.visualizer, 'execute', visualize)
+    yield orchestrator
+    llm_client.set_model_factory(None)
@@ -0,0 +1,109 @@
+import asyncio
+import os
+import pytest
+from fastapi.testclient import TestClient
+from services import blob_store as blob_module
+from services.blob_store import LocalBlobStore, SupabaseBlobStore
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00\x00\x00\rIHDR' + (640).to_bytes(4, 'big') + (480).to_bytes(4, 'big') + b'rest'
+
+
+class FakeBucket:
+    def __init__(self):
+        self.objects = {}
+        self.uploads = 0
+
+    def upload(self, path, data, options):
+        self.uploads += 1
+        self.objects[path] = data
+
+    def download(self, path):
+        return self.objects[path]
+
+    def exists(self, path):
+        return path in self.objects
+
+
+class FakeStorage:
+    def __init__(self, bucket):
+        self.bucket = bucket
+
+    def from_(self, name):
+        return self.bucket
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.storage = FakeStorage(FakeBucket())
+
+
+def test_local_store_is_content_addressed(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+
+    async def scenario():
+        first = await store.put(PNG)
+        second = await store.put(PNG)
+        return first, second, await store.get(first['id'])
+
+    first, second, fetched = asyncio.run(scenario())
+    assert first == second
+    assert first['url'] == f"/api/blobs/{first['id']}"
+    assert (first['width'], first['height']) == (640, 480)
+    assert fetched == (PNG, 'image/png')
+
+
+def test_ids_outside_the_pattern_are_not_read(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+    (tmp_path / 'secret.png').write_bytes(b'x')
+
+    assert asyncio.run(store.get('../secret.png')) is None
+    assert not asyncio.run(store.exists('../secret.png'))
+
+
+def test_supabase_store_remembers_a_bounded_set_of_uploads(monkeypatch):
+    monkeypatch.setattr(blob_module, 'UPLOAD_MEMO_SIZE', 2)
+    client = FakeSupabase()
+    store = SupabaseBlobStore(client, 'figures')
+
+    async def scenario():
+        refs = [await store.put(bytes([index])) for index in range(3)]
+        await store.put(bytes([2]))
+        await store.put(bytes([0]))
+        return refs
+
+    refs = asyncio.run(scenario())
+    assert len(store._uploaded) == 2
+    # The repeat of the newest upload is skipped; the evicted first one is uploaded again
+    assert client.storage.bucket.uploads == 4
+    assert asyncio.run(store.exists(refs[1]['id']))
+    assert not asyncio.run(store.exists(f"{'0' * 64}.png"))
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    import main
+
+    store = LocalBlobStore(str(tmp_path))
+    monkeypatch.setattr(main, 'blob_store', store)
+    return TestClient(main.app), store
+
+
+def test_blob_endpoint_serves_and_revalidates(client):
+    http, store = client
+    ref = asyncio.run(store.put(PNG))
+
+    response = http.get(ref['url'])
+    assert response.status_code == 200
+    assert response.content == PNG
+    etag = response.headers['etag']
+
+    assert http.get(ref['url'], headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_deleted_blob_is_not_revalidated(client):
+    http, store = client
+    ref = asyncio.run(store.put(PNG))
+    os.remove(store._path(ref['id']))
+
+    response = http.get(ref['url'], headers={'If-None-Match': f'"{ref["id"]}"'})
+    assert response.status_code == 404
@@ -0,0 +1,65 @@
+import asyncio
+from agents.critic_agent import CriticAgent
+
+
+class FixedLLM:
+    def __init__(self, text: str):
+        self.text = text
+
+    async def generate(self, prompt: str) -> str:
+        return self.text
+
+
+def _compare(response: str, count: int = 3, iteration: int = 1) -> dict:
+    critic = CriticAgent()
+    critic.cache = None
+    critic.llm = FixedLLM(response)
+    candidates = [{'code': f'plt.plot([{index}])', 'has_image': True} for index in range(count)]
+    result = asyncio.run(critic.execute({'iteration': iteration, 'max_iterations': 3, 'candidates': candidates}))
+    return result.data
+
+
+def test_best_candidate_is_the_highest_score():
+    data = _compare('{"candidate_scores": [6, 9, 7], "accept": true, "improvements": []}')
+
+    assert data['candidate_scores'] == [6, 9, 7]
+    assert data['best_candidate'] == 1
+    assert data['quality_score'] == 9
+    assert not data['should_refine']
+
+
+def test_ties_go_to_the_first_candidate():
+    data = _compare('{"candidate_scores": [7, 8, 8], "accept": false, "improvements": ["Add units"]}')
+
+    assert data['best_candidate'] == 1
+    assert data['should_refine']
+    assert data['improvements'] == ['Add units']
+
+
+def test_prose_scores_fall_back_to_the_regex():
+    data = _compare(
+        "Candidate 1: clear axes, 7/10\n"
+        "Candidate #2 scores 5 / 10\n"
+        "Candidate 3 - best layout, 8/10\n"
+        "Improvements:\n- Enlarge the tick labels"
+    )
+
+    assert data['candidate_scores'] == [7, 5, 8]
+    assert data['best_candidate'] == 2
+    # The regex fallback accepts at 8 or more
+    assert not data['should_refine']
+    assert data['improvements'] == ['Enlarge the tick labels']
+
+
+def test_score_list_of_the_wrong_length_is_reparsed():
+    data = _compare('{"candidate_scores": [9], "accept": true} Candidate 2: 6/10', count=2)
+
+    assert data['candidate_scores'] == [0, 6]
+    assert data['best_candidate'] == 1
+    assert data['should_refine']
+
+
+def test_fallback_keeps_the_first_score_per_candidate_and_caps_it():
+    critic = CriticAgent()
+
+    assert critic._parse_candidate_scores("Candidate 1: 12/10. Candidate 1 again: 3/10. Candidate 4: 9/10", 2) == [10, 0]
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from agents.data_reduction import reduce_frame
+
+
+def _plan(budget):
+    return {'kind': 'line', 'x': 'x', 'y': 'y', 'budget': budget}
+
+
+def test_monotonic_line_keeps_extremes_in_order():
+    x = np.arange(10_000, dtype=float)
+    y = np.sin(x / 500)
+    y[4321] = 50.0
+    frame = pd.DataFrame({'x': x, 'y': y})
+
+    reduced = reduce_frame(frame, _plan(200))
+
+    assert len(reduced) <= 200
+    assert reduced['x'].is_monotonic_increasing
+    assert reduced['y'].max() == 50.0
+    assert reduced['x'].iloc[0] == 0 and reduced['x'].iloc[-1] == 9_999
+
+
+def test_decreasing_line_is_reduced_in_row_order():
+    x = np.arange(10_000, dtype=float)[::-1]
+    frame = pd.DataFrame({'x': x, 'y': np.cos(x / 300)})
+
+    reduced = reduce_frame(frame, _plan(200))
+
+    assert len(reduced) <= 200
+    assert reduced['x'].is_monotonic_decreasing
+
+
+def test_non_monotonic_line_keeps_row_order():
+    # A hysteresis loop: x sweeps up then back down along a different branch
+    t = np.linspace(0, 2 * np.pi, 10_000)
+    frame = pd.DataFrame({'x': np.cos(t), 'y': np.sin(t) + 0.2 * np.cos(t), 'step': np.arange(10_000)})
+
+    reduced = reduce_frame(frame, _plan(200))
+
+    assert len(reduced) == 200
+    assert reduced['step'].is_monotonic_increasing
+    assert reduced['step'].iloc[0] == 0 and reduced['step'].iloc[-1] == 9_999
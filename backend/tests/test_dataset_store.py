@@ -0,0 +1,71 @@
+import io
+import json
+import pyarrow as pa
+import pytest
+from services.dataset_store import DatasetStore
+
+
+def _stored(store: DatasetStore, data_info: dict) -> pa.Table:
+    with pa.memory_map(store.path(data_info['dataset_id'])) as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def test_csv_column_that_turns_to_text_is_stored_as_text(tmp_path):
+    rows = ['a,b'] + [f"{i},{i}" for i in range(4)] + ['4,high', '5,']
+    store = DatasetStore(str(tmp_path))
+
+    data_info = store.ingest(io.BytesIO('\n'.join(rows).encode()), 'csv', chunk_rows=2)
+
+    table = _stored(store, data_info)
+    assert table.schema.field('b').type == pa.string()
+    assert table.column('b').to_pylist() == ['0', '1', '2', '3', 'high', None]
+    assert table.schema.field('a').type == pa.int64()
+
+
+def test_csv_all_empty_column_that_fills_later(tmp_path):
+    rows = ['a,b', '1,', '2,', '3,x', '4,y']
+    store = DatasetStore(str(tmp_path))
+
+    data_info = store.ingest(io.BytesIO('\n'.join(rows).encode()), 'csv', chunk_rows=2)
+
+    assert _stored(store, data_info).column('b').to_pylist() == [None, None, 'x', 'y']
+
+
+def test_json_keys_first_seen_in_later_chunks_are_kept(tmp_path):
+    records = [{'a': 1}, {'a': 2}, {'a': 3, 'b': 'late'}]
+    store = DatasetStore(str(tmp_path))
+
+    data_info = store.ingest(io.BytesIO(json.dumps(records).encode()), 'json', chunk_rows=2)
+
+    table = _stored(store, data_info)
+    assert data_info['columns'] == ['a', 'b']
+    assert table.column_names == data_info['columns']
+    assert table.column('b').to_pylist() == [None, None, 'late']
+
+
+def test_large_integers_keep_their_precision(tmp_path):
+    big = 2 ** 53 + 1
+    rows = ['id'] + [str(big + i) for i in range(4)]
+    store = DatasetStore(str(tmp_path))
+
+    data_info = store.ingest(io.BytesIO('\n'.join(rows).encode()), 'csv', chunk_rows=2)
+
+    assert _stored(store, data_info).column('id').to_pylist() == [big + i for i in range(4)]
+
+
+def test_integer_column_with_missing_values_becomes_float(tmp_path):
+    rows = ['a,b', '1,x', '2,x', ',x', '4,x']
+    store = DatasetStore(str(tmp_path))
+
+    data_info = store.ingest(io.BytesIO('\n'.join(rows).encode()), 'csv', chunk_rows=2)
+
+    table = _stored(store, data_info)
+    assert pa.types.is_floating(table.schema.field('a').type)
+    assert table.column('a').to_pylist() == [1.0, 2.0, None, 4.0]
+
+
+def test_json_object_upload_is_rejected_with_a_clear_message(tmp_path):
+    store = DatasetStore(str(tmp_path))
+
+    with pytest.raises(ValueError, match="array of records, but this file holds an object"):
+        store.ingest(io.BytesIO(b'{"a": 1, "b": [1, 2]}'), 'json')
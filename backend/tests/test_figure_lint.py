@@ -0,0 +1,104 @@
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+from agents.figure_lint import _visible_texts, lint_figure
+
+
+@pytest.fixture(autouse=True)
+def close_figures():
+    yield
+    plt.close('all')
+
+
+def _checks(figure) -> set:
+    return {issue['check'] for issue in lint_figure(figure)['issues']}
+
+
+def test_clean_figure_has_no_issues():
+    figure, ax = plt.subplots()
+    ax.plot([1, 2, 3], [1, 4, 9], label='squares')
+    ax.plot([1, 2, 3], [1, 2, 3], label='linear')
+    ax.set_xlabel('x (m)')
+    ax.set_ylabel('y (m)')
+    ax.legend()
+
+    result = lint_figure(figure)
+    assert result['issues'] == []
+    assert result['score'] == 10
+
+
+def test_labelled_series_without_legend_is_an_error():
+    figure, ax = plt.subplots()
+    ax.plot([1, 2], [1, 2], label='a')
+    ax.plot([1, 2], [2, 1], label='b')
+    ax.set_xlabel('x')
+    ax.set_ylabel('y')
+
+    assert 'missing_legend' in _checks(figure)
+    assert lint_figure(figure)['errors'] == 1
+
+
+def test_missing_axis_labels_are_reported():
+    figure, ax = plt.subplots()
+    ax.plot([1, 2, 3], [3, 1, 2])
+
+    assert 'missing_axis_label' in _checks(figure)
+
+
+@pytest.mark.parametrize('scale,limits', [('linear', (0, 5)), ('log', (1, 10)), ('linear', (5, 0))])
+def test_labels_of_ticks_outside_the_view_are_ignored(scale, limits):
+    # Ticks set far past the view limits keep visible labels that are never drawn
+    figure, ax = plt.subplots()
+    x = np.linspace(1, 5, 20)
+    ax.plot(x, x ** 2)
+    ax.set_xscale(scale)
+    ax.set_xticks([1, 2, 3, 4, 5, 1000, 5000])
+    ax.set_xlim(*limits)
+    figure.draw_without_rendering()
+
+    texts = [text.get_text() for text in _visible_texts(figure, [ax])]
+    assert not any('1000' in text or '5000' in text for text in texts)
+    assert any('2' in text for text in texts)
+
+
+def test_text_past_the_canvas_is_not_reported():
+    # Renders are saved with bbox_inches='tight', so this text is kept in the output
+    figure, ax = plt.subplots(figsize=(4, 3))
+    ax.plot([1, 2], [1, 2])
+    ax.set_xlabel('x (m)')
+    ax.set_ylabel('y (m)')
+    ax.text(1.6, 1.5, 'a long annotation that runs well past the right edge of the canvas')
+
+    assert lint_figure(figure)['issues'] == []
+
+
+def test_axes_switched_off_are_not_empty():
+    figure, (plot_ax, legend_ax) = plt.subplots(1, 2)
+    plot_ax.plot([1, 2], [1, 2], label='a')
+    plot_ax.plot([1, 2], [2, 1], label='b')
+    plot_ax.set_xlabel('x (m)')
+    plot_ax.set_ylabel('y (m)')
+    legend_ax.legend(*plot_ax.get_legend_handles_labels())
+    legend_ax.axis('off')
+
+    assert lint_figure(figure)['issues'] == []
+
+
+def test_empty_axes_with_axis_on_are_an_error():
+    figure, (plot_ax, spare_ax) = plt.subplots(1, 2)
+    plot_ax.plot([1, 2], [1, 2])
+    plot_ax.set_xlabel('x (m)')
+    plot_ax.set_ylabel('y (m)')
+
+    assert 'empty_axes' in _checks(figure)
+
+
+def test_overlapping_tick_labels_are_an_error():
+    figure, ax = plt.subplots(figsize=(2, 2))
+    ax.bar(range(20), range(20))
+    ax.set_xticks(range(20), [f"category {index}" for index in range(20)])
+    ax.set_ylabel('count')
+
+    assert 'overlapping_text' in _checks(figure)
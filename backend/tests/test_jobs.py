@@ -0,0 +1,159 @@
+import asyncio
+import json
+import uuid
+from services.jobs import Job, JobManager
+
+
+async def _events(count: int, delay: float = 0):
+    for index in range(count):
+        await asyncio.sleep(delay)
+        yield {'type': 'status', 'data': {'index': index}}
+    yield {'type': 'complete', 'data': {}}
+
+
+def test_cleanup_runs_when_cancelled_before_first_event(tmp_path):
+    async def scenario():
+        manager = JobManager(str(tmp_path))
+        released = []
+        job = manager.submit(lambda: _events(3), key='k', on_done=lambda: released.append(True))
+        # The task has not taken its first step yet
+        assert job.cancel('Cancelled by the user')
+        await asyncio.sleep(0)
+        await asyncio.gather(job.task, return_exceptions=True)
+        return manager, job, released
+
+    manager, job, released = asyncio.run(scenario())
+    assert released == [True]
+    assert job.status == 'cancelled'
+    assert manager.running('k') is None
+    assert manager.stats['cancelled'] == 1
+
+
+def test_cleanup_runs_when_cancelled_mid_stream(tmp_path):
+    async def scenario():
+        manager = JobManager(str(tmp_path))
+        released = []
+        job = manager.submit(lambda: _events(100, 0.01), on_done=lambda: released.append(True))
+        await asyncio.sleep(0.05)
+        job.cancel('Cancelled by the user')
+        await asyncio.gather(job.task, return_exceptions=True)
+        return job, released
+
+    job, released = asyncio.run(scenario())
+    assert released == [True]
+    assert job.status == 'cancelled'
+    assert job.events[-1]['type'] == 'cancelled'
+
+
+def test_cleanup_runs_once_on_completion(tmp_path):
+    async def scenario():
+        manager = JobManager(str(tmp_path))
+        released = []
+        job = manager.submit(lambda: _events(2), on_done=lambda: released.append(True))
+        await job.task
+        return job, released
+
+    job, released = asyncio.run(scenario())
+    assert released == [True]
+    assert job.status == 'complete'
+
+
+def test_orphaned_job_is_cancelled_and_cleaned_up(tmp_path):
+    async def scenario():
+        manager = JobManager(str(tmp_path))
+        released = []
+        job = manager.submit(lambda: _events(100, 0.01), on_done=lambda: released.append(True))
+        job.orphan_grace = 0.01
+
+        async def follow_briefly():
+            async for _ in job.follow():
+                return
+
+        await follow_briefly()
+        await asyncio.gather(job.task, return_exceptions=True)
+        return job, released
+
+    job, released = asyncio.run(scenario())
+    assert released == [True]
+    assert job.status == 'cancelled'
+
+
+def test_restored_job_replays_log(tmp_path):
+    async def scenario():
+        manager = JobManager(str(tmp_path))
+        job = manager.submit(lambda: _events(2))
+        await job.task
+        return job.id, len(job.events)
+
+    job_id, count = asyncio.run(scenario())
+    restored = asyncio.run(JobManager(str(tmp_path)).get(job_id))
+    assert restored.status == 'complete'
+    assert len(restored.events) == count
+
+
+def _write_log(tmp_path, job_id, lines):
+    with open(tmp_path / f"{job_id}.jsonl", 'w', encoding='utf-8') as f:
+        f.write(''.join(json.dumps(line) + '\n' for line in lines))
+
+
+def test_interrupted_job_is_restored_when_its_log_cannot_be_written(tmp_path, monkeypatch):
+    job_id = str(uuid.uuid4())
+    _write_log(tmp_path, job_id, [{'id': 0, 'type': 'status', 'data': {}}])
+
+    def read_only(self, event_id, event):
+        raise PermissionError("read-only file system")
+
+    monkeypatch.setattr(Job, '_write', read_only)
+    restored = asyncio.run(JobManager(str(tmp_path)).get(job_id))
+
+    assert restored.status == 'error'
+    assert restored.events[-1]['data']['message'] == 'Generation was interrupted by a server restart'
+
+
+def test_log_without_event_ids_is_not_restored(tmp_path):
+    job_id = str(uuid.uuid4())
+    _write_log(tmp_path, job_id, [{'type': 'status', 'data': {}}, {'type': 'complete', 'data': {}}])
+
+    assert asyncio.run(JobManager(str(tmp_path)).get(job_id)) is None
+
+
+async def _streaming_events():
+    yield {'type': 'status', 'data': {}}
+    for token in ('a', 'b', 'c'):
+        yield {'type': 'agent_delta', 'data': {'agent': 'PlannerAgent', 'delta': token}}
+    yield {'type': 'agent_complete', 'data': {'agent': 'PlannerAgent', 'data': {'specification': 'abc'}}}
+    yield {'type': 'complete', 'data': {}}
+
+
+def test_deltas_are_not_logged_or_kept_after_their_agent_completes(tmp_path):
+    async def scenario():
+        manager = JobManager(str(tmp_path))
+        job = manager.submit(_streaming_events)
+        await job.task
+        replay = [item async for item in job.follow()]
+        resumed = [item async for item in job.follow(after=2)]
+        return job, replay, resumed
+
+    job, replay, resumed = asyncio.run(scenario())
+    assert [event['type'] for _, event in replay] == ['job', 'status', 'agent_complete', 'complete']
+    # Ids keep counting the dropped deltas, so a client that saw some of them resumes correctly
+    assert [event_id for event_id, _ in replay] == [0, 1, 5, 6]
+    assert [event_id for event_id, _ in resumed] == [5, 6]
+    assert job.summary()['event_count'] == 7
+
+    with open(job.log_path, encoding='utf-8') as f:
+        logged = f.read()
+    assert 'agent_delta' not in logged
+
+    restored = asyncio.run(JobManager(str(tmp_path)).get(job.id))
+    assert restored._ids == [0, 1, 5, 6]
+
+
+def test_live_followers_receive_deltas(tmp_path):
+    async def scenario():
+        manager = JobManager(str(tmp_path))
+        job = manager.submit(_streaming_events)
+        return [event['type'] async for _, event in job.follow()]
+
+    types = asyncio.run(scenario())
+    assert types.count('agent_delta') == 3
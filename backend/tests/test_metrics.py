@@ -0,0 +1,60 @@
+import asyncio
+from fastapi.testclient import TestClient
+from services.metrics import annotate, render_metrics, span, start_trace
+
+
+def test_spans_and_annotations_land_on_the_trace():
+    async def request():
+        trace = start_trace()
+        with span('stage', 'render', outputs=['png']):
+            annotate(cpu_seconds=0.5)
+            with span('llm', 'CriticAgent'):
+                annotate(prompt_tokens=12)
+        # Outside any span, annotations have nowhere to go
+        annotate(ignored=True)
+        return trace.to_dict()
+
+    trace = asyncio.run(request())
+
+    spans = {item['name']: item for item in trace['spans']}
+    outer, inner = spans['render'], spans['CriticAgent']
+    assert (outer['kind'], outer['name']) == ('stage', 'render')
+    assert outer['outputs'] == ['png'] and outer['cpu_seconds'] == 0.5
+    assert (inner['kind'], inner['name'], inner['prompt_tokens']) == ('llm', 'CriticAgent', 12)
+    assert 'prompt_tokens' not in outer
+    assert inner['start_ms'] >= outer['start_ms']
+
+
+def test_trace_follows_tasks_and_stays_per_request():
+    async def request(name):
+        trace = start_trace()
+
+        async def candidate(index):
+            with span('llm', name, candidate=index):
+                await asyncio.sleep(0)
+
+        await asyncio.gather(*[candidate(index) for index in range(3)])
+        return trace.to_dict()
+
+    async def concurrent_requests():
+        return await asyncio.gather(
+            asyncio.create_task(request('first')),
+            asyncio.create_task(request('second'))
+        )
+
+    first, second = asyncio.run(concurrent_requests())
+
+    assert sorted((item['name'], item['candidate']) for item in first['spans']) == [('first', 0), ('first', 1), ('first', 2)]
+    assert sorted((item['name'], item['candidate']) for item in second['spans']) == [('second', 0), ('second', 1), ('second', 2)]
+
+
+def test_span_durations_are_exported():
+    with span('db', 'metrics-test'):
+        pass
+
+    assert b'fourms_span_duration_seconds_count{kind="db",name="metrics-test"} 1.0' in render_metrics()
+
+    import main
+    response = TestClient(main.app).get('/metrics')
+    assert response.status_code == 200
+    assert 'name="metrics-test"' in response.text
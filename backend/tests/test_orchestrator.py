@@ -0,0 +1,118 @@
+import asyncio
+from agents.base_agent import AgentResult
+from agents.orchestrator import DiagramOrchestrator
+
+
+class StreamingAgent:
+    agent_name = 'StreamingAgent'
+
+    def __init__(self, chunks, release=None):
+        self.chunks = chunks
+        self.release = release
+        self.cancelled = False
+
+    async def execute(self, input_data):
+        try:
+            for chunk in self.chunks:
+                input_data['on_chunk'](chunk)
+                await asyncio.sleep(0)
+            if self.release is not None:
+                await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return AgentResult(success=True, data={'text': ''.join(self.chunks)})
+
+
+def _run(orchestrator: DiagramOrchestrator):
+    async def collect():
+        events = [event async for event in orchestrator.generate_diagram(
+            prompt='Line plot of loss', diagram_type='statistical', domain='mind', user_id='u'
+        )]
+        await orchestrator.persistence.close()
+        return events
+
+    return asyncio.run(collect())
+
+
+def test_failed_final_render_is_an_error_not_the_preview(orchestrator, monkeypatch):
+    async def finalize(*args, **kwargs):
+        raise Exception("Code execution failed: worker died")
+
+    monkeypatch.setattr(orchestrator.visualizer, 'finalize', finalize)
+
+    events = _run(orchestrator)
+
+    assert events[-1]['type'] == 'error'
+    assert 'Final render failed' in events[-1]['data']['message']
+    assert not any(event['type'] == 'complete' for event in events)
+
+    # The iteration that was reviewed is kept, under a figure marked failed
+    tables = orchestrator.supabase.tables
+    [figure] = tables['figures'].values()
+    assert figure['status'] == 'failed'
+    assert [row['figure_id'] for row in tables['generations'].values()] == [figure['id']]
+
+
+def test_final_render_is_the_completed_image(orchestrator, monkeypatch):
+    async def finalize(*args, **kwargs):
+        return {'full': {'id': 'full', 'url': '/full', 'format': 'png', 'size': 2}}
+
+    monkeypatch.setattr(orchestrator.visualizer, 'finalize', finalize)
+
+    events = _run(orchestrator)
+
+    assert events[-1]['type'] == 'complete'
+    assert events[-1]['data']['data']['image']['id'] == 'full'
+
+    figure = orchestrator.supabase.tables['figures'][events[-1]['data']['figure_id']]
+    assert figure['status'] == 'completed'
+    assert figure['file_url'] == '/full'
+
+
+def test_cancelled_run_keeps_its_reviewed_iterations(orchestrator):
+    async def cancel_while_finalizing():
+        events = orchestrator.generate_diagram(
+            prompt='Line plot of loss', diagram_type='statistical', domain='mind', user_id='u'
+        )
+        async for event in events:
+            if event['data'].get('stage') == 'finalizing':
+                break
+        await events.aclose()
+        await orchestrator.persistence.close()
+
+    asyncio.run(cancel_while_finalizing())
+
+    tables = orchestrator.supabase.tables
+    assert [figure['status'] for figure in tables['figures'].values()] == ['failed']
+    assert len(tables['generations']) == 1
+
+
+def test_stream_agent_yields_deltas_then_the_result(orchestrator):
+    agent = StreamingAgent(['{"score": ', '9}'])
+
+    async def collect():
+        return [item async for item in orchestrator._stream_agent(agent, {}, iteration=2, stage='critique')]
+
+    *events, result = asyncio.run(collect())
+
+    assert events == [
+        {'type': 'agent_delta', 'data': {'agent': 'StreamingAgent', 'delta': '{"score": ', 'iteration': 2}},
+        {'type': 'agent_delta', 'data': {'agent': 'StreamingAgent', 'delta': '9}', 'iteration': 2}}
+    ]
+    assert result.data == {'text': '{"score": 9}'}
+
+
+def test_closing_the_stream_cancels_the_agent(orchestrator):
+    async def scenario():
+        agent = StreamingAgent(['partial'], release=asyncio.Event())
+        stream = orchestrator._stream_agent(agent, {})
+        first = await stream.__anext__()
+        await stream.aclose()
+        await asyncio.sleep(0)
+        return first, agent
+
+    first, agent = asyncio.run(scenario())
+
+    assert first['data'] == {'agent': 'StreamingAgent', 'delta': 'partial'}
+    assert agent.cancelled
@@ -0,0 +1,152 @@
+import asyncio
+
+import httpx
+from postgrest.exceptions import APIError
+
+from services import persistence
+from services.persistence import PersistenceQueue
+
+
+class FakeTable:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self.rows = None
+
+    def upsert(self, rows):
+        self.rows = rows
+        return self
+
+    def execute(self):
+        self.client.calls.append((self.name, [row['id'] for row in self.rows]))
+        error = self.client.fail(self.name, self.rows)
+        if error is not None:
+            raise error
+        self.client.written.setdefault(self.name, []).extend(self.rows)
+
+
+class FakeSupabase:
+    def __init__(self, fail=lambda table, rows: None):
+        self.fail = fail
+        self.calls = []
+        self.written = {}
+
+    def table(self, name):
+        return FakeTable(self, name)
+
+
+def _unit(figure_id):
+    return {'id': figure_id}, [{'id': f"{figure_id}-g", 'figure_id': figure_id}]
+
+
+async def _no_sleep(seconds):
+    pass
+
+
+def _run(queue, units):
+    async def scenario():
+        for figure, generations in units:
+            queue.enqueue(figure, generations)
+        await queue.close()
+
+    asyncio.run(scenario())
+
+
+def test_transient_classification():
+    assert persistence._is_transient(httpx.ConnectError("refused"))
+    assert persistence._is_transient(APIError({'code': 'PGRST003', 'message': 'pool timeout'}))
+    assert persistence._is_transient(APIError({'code': '40001', 'message': 'serialization failure'}))
+    assert persistence._is_transient(APIError({'code': 503, 'message': 'JSON could not be generated'}))
+    assert persistence._is_transient(APIError({'code': 429, 'message': 'JSON could not be generated'}))
+    assert not persistence._is_transient(APIError({'code': '23503', 'message': 'foreign key violation'}))
+    assert not persistence._is_transient(APIError({'code': 'PGRST204', 'message': 'unknown column'}))
+    assert not persistence._is_transient(APIError({'code': 400, 'message': 'JSON could not be generated'}))
+    assert not persistence._is_transient(ValueError("bad row"))
+
+
+def test_permanent_error_is_not_retried_and_only_drops_its_unit(monkeypatch):
+    monkeypatch.setattr(persistence.asyncio, 'sleep', _no_sleep)
+
+    def fail(table, rows):
+        if any(row['id'] == 'bad' for row in rows):
+            return APIError({'code': '42703', 'message': 'column does not exist'})
+
+    client = FakeSupabase(fail)
+    queue = PersistenceQueue(client, batch_size=10, flush_interval=0.01, max_retries=5)
+    _run(queue, [_unit('a'), _unit('bad'), _unit('b')])
+
+    assert [row['id'] for row in client.written['figures']] == ['a', 'b']
+    assert [row['id'] for row in client.written['generations']] == ['a-g', 'b-g']
+    assert queue.stats['retries'] == 0
+    assert queue.stats['figures_dropped'] == 1
+    assert queue.stats['generations_dropped'] == 1
+    # One batch attempt, then one attempt per isolated unit
+    assert sum(1 for table, ids in client.calls if 'bad' in ids) == 2
+
+
+def test_transient_error_is_retried(monkeypatch):
+    monkeypatch.setattr(persistence.asyncio, 'sleep', _no_sleep)
+    failures = [httpx.ReadTimeout("timed out"), APIError({'code': 502, 'message': 'bad gateway'})]
+
+    client = FakeSupabase(lambda table, rows: failures.pop(0) if failures else None)
+    queue = PersistenceQueue(client, batch_size=10, flush_interval=0.01, max_retries=5)
+    _run(queue, [_unit('a')])
+
+    assert [row['id'] for row in client.written['figures']] == ['a']
+    assert queue.stats['retries'] == 2
+    assert queue.stats['figures_dropped'] == 0
+
+
+def test_outage_drops_batch_without_retrying_each_unit(monkeypatch):
+    monkeypatch.setattr(persistence.asyncio, 'sleep', _no_sleep)
+
+    client = FakeSupabase(lambda table, rows: httpx.ConnectError("refused"))
+    queue = PersistenceQueue(client, batch_size=10, flush_interval=0.01, max_retries=3)
+    _run(queue, [_unit('a'), _unit('b')])
+
+    assert len(client.calls) == 3
+    assert queue.stats['figures_dropped'] == 2
+    assert queue.stats['generations_dropped'] == 2
+
+
+def test_failed_generations_do_not_drop_their_figures(monkeypatch):
+    monkeypatch.setattr(persistence.asyncio, 'sleep', _no_sleep)
+
+    def fail(table, rows):
+        if table == 'generations':
+            return APIError({'code': '23502', 'message': 'null value in column'})
+
+    client = FakeSupabase(fail)
+    queue = PersistenceQueue(client, batch_size=10, flush_interval=0.01)
+    _run(queue, [_unit('a'), _unit('b')])
+
+    assert queue.stats['figures_written'] == 2
+    assert queue.stats['figures_dropped'] == 0
+    assert queue.stats['generations_dropped'] == 2
+    # The figures are not written again while the generations are isolated
+    assert sum(1 for table, _ in client.calls if table == 'figures') == 1
+
+
+def test_running_figure_is_written_once_per_batch_with_its_latest_row():
+    client = FakeSupabase()
+    queue = PersistenceQueue(client, batch_size=10, flush_interval=0.01)
+    _run(queue, [
+        ({'id': 'a', 'status': 'generating'}, [{'id': 'a-1', 'figure_id': 'a'}]),
+        ({'id': 'a', 'status': 'generating'}, [{'id': 'a-2', 'figure_id': 'a'}]),
+        ({'id': 'a', 'status': 'completed'}, [])
+    ])
+
+    assert client.written['figures'] == [{'id': 'a', 'status': 'completed'}]
+    assert [row['id'] for row in client.written['generations']] == ['a-1', 'a-2']
+
+
+def test_full_queue_drops_new_units():
+    client = FakeSupabase()
+    queue = PersistenceQueue(client, batch_size=10, flush_interval=0.01, max_queue_size=2)
+    # Nothing is written until the loop runs, so the third unit overflows
+    _run(queue, [_unit('a'), _unit('b'), _unit('c')])
+
+    assert [row['id'] for row in client.written['figures']] == ['a', 'b']
+    assert queue.stats['overflowed'] == 1
+    assert queue.pending() == 0
+
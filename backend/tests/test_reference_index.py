@@ -0,0 +1,58 @@
+import asyncio
+from agents.reference_index import ReferenceIndex
+from benchmarks.fakes import FakeSupabase
+
+
+def _row(row_id, description, diagram_type='chart', domain='mind'):
+    return {'id': row_id, 'type': diagram_type, 'domain': domain, 'description': description, 'metadata': {}}
+
+
+def test_search_ranks_by_similarity_within_domain():
+    index = ReferenceIndex(None)
+    index.upsert([
+        _row('a', 'spiking neuron membrane potential'),
+        _row('b', 'reaction energy profile', domain='matter'),
+        _row('c', 'network of neuron layers'),
+        _row('d', 'flow of survey answers', diagram_type='diagram')
+    ])
+
+    results = index.search('neuron membrane', 'chart', 'mind', k=2)
+
+    assert [row['id'] for row, _ in results] == ['a', 'c']
+    assert results[0][1] > results[1][1]
+
+
+def test_upsert_replaces_an_edited_row():
+    index = ReferenceIndex(None)
+    index.upsert([_row('a', 'heat map of gene expression'), _row('b', 'phase portrait')])
+    index.upsert([_row('a', 'orbital trajectory of a satellite')])
+
+    assert len(index.rows) == 2
+    assert index.search('gene expression', 'chart', 'mind', k=1)[0][0]['id'] == 'b'
+    assert index.search('satellite orbital trajectory', 'chart', 'mind', k=1)[0][0]['id'] == 'a'
+
+
+def test_term_storage_grows_with_row_text_not_vocabulary():
+    index = ReferenceIndex(None)
+    index.upsert([_row(str(i), f"unique{i} term{i} words{i}") for i in range(500)])
+
+    # Three description tokens plus type and domain per row, with no rows x vocabulary matrix
+    assert len(index._vocabulary) > 1000
+    assert len(index._term_weights) == 500 * 5
+
+
+def test_incremental_refresh_picks_up_rows_sharing_the_latest_timestamp():
+    database = FakeSupabase()
+    database.seed_references(3)
+    index = ReferenceIndex(database, refresh_seconds=0, full_refresh_seconds=3600)
+    asyncio.run(index.refresh(force=True))
+
+    latest = max(row['created_at'] for row in index.rows)
+    database.tables['diagram_references']['late'] = {
+        **_row('late', 'committed after the last fetch', diagram_type='statistical'),
+        'created_at': latest
+    }
+    asyncio.run(index.refresh())
+
+    assert sorted(index._positions) == ['late', 'ref-0', 'ref-1', 'ref-2']
+    assert len(index.rows) == 4
@@ -0,0 +1,44 @@
+import asyncio
+from agents.critic_agent import CriticAgent
+from agents.token_budget import TokenBudget
+
+
+class FixedLLM:
+    def __init__(self, text: str):
+        self.text = text
+
+    async def generate(self, prompt: str) -> str:
+        return self.text
+
+
+def _critique(iteration: int, max_iterations: int) -> dict:
+    critic = CriticAgent()
+    critic.cache = None
+    critic.llm = FixedLLM('{"score": 6, "accept": false, "improvements": ["Label the y axis"]}')
+    result = asyncio.run(critic.execute({'iteration': iteration, 'max_iterations': max_iterations}))
+    return result.data
+
+
+def test_critic_refines_until_the_orchestrators_last_iteration():
+    assert _critique(3, 5)['should_refine']
+    assert not _critique(5, 5)['should_refine']
+    assert not _critique(1, 1)['should_refine']
+
+
+def test_refinement_keeps_the_whole_specification():
+    specification = '\n'.join(f"{index}. Panel {index} plots column_{index} against time" for index in range(2000))
+    budget = TokenBudget(budget=100, max_improvements=2)
+
+    refined = budget.refinement_spec(specification, ['Label the y axis', 'Add units', 'Move the legend'])
+
+    assert refined.startswith(specification)
+    assert refined.endswith("1. Label the y axis\n2. Add units")
+
+
+def test_feedback_is_held_to_the_budget():
+    budget = TokenBudget(budget=20, max_improvements=5)
+
+    selected = budget.select_improvements(['x' * 400, 'Add units'])
+
+    assert len(selected) == 1
+    assert len(selected[0]) < 100
@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+from agents.render_pool import RenderPool
+
+
+class SlowSendConnection:
+    # Stands in for a pipe whose buffer is full until the worker reads it
+    def __init__(self, conn, delay: float):
+        self.conn = conn
+        self.delay = delay
+
+    def send(self, request):
+        time.sleep(self.delay)
+        self.conn.send(request)
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+
+def test_blocked_send_does_not_stall_event_loop():
+    pool = RenderPool(size=1)
+
+    async def scenario():
+        await pool.warm_up()
+        worker = pool._idle[0]
+        worker.conn = SlowSendConnection(worker.conn, 0.5)
+        request = {
+            'code': "fig, ax = plt.subplots()\nax.plot([0, 1], [0, 1])",
+            'outputs': [{'name': 'full', 'format': 'png', 'dpi': 20}]
+        }
+        gaps = []
+
+        async def ticker():
+            last = time.monotonic()
+            while True:
+                await asyncio.sleep(0.01)
+                now = time.monotonic()
+                gaps.append(now - last)
+                last = now
+
+        ticking = asyncio.create_task(ticker())
+        await asyncio.sleep(0.05)
+        try:
+            result = await pool.render(request)
+        finally:
+            ticking.cancel()
+        return result, gaps
+
+    try:
+        result, gaps = asyncio.run(scenario())
+    finally:
+        pool.close()
+
+    assert result['outputs']['full'].startswith(b'\x89PNG')
+    assert max(gaps) < 0.25
@@ -0,0 +1,74 @@
+import asyncio
+from agents.cache import ContentCache, bypass_response_cache
+from agents.visualizer_agent import VisualizerAgent
+
+
+class CountingLLM:
+    def __init__(self, text: str):
+        self.text = text
+        self.calls = 0
+
+    async def generate(self, prompt: str) -> str:
+        self.calls += 1
+        return self.text
+
+
+def _agent(tmp_path, code: str = "import matplotlib.pyplot as plt\nplt.plot([1, 2])"):
+    agent = VisualizerAgent(blob_store=object())
+    agent.llm = CountingLLM(code)
+    agent.cache = ContentCache('test', disk_dir=str(tmp_path))
+    return agent
+
+
+def test_code_that_fails_to_render_is_not_replayed(tmp_path, monkeypatch):
+    agent = _agent(tmp_path)
+
+    async def crash(*args, **kwargs):
+        raise Exception("Code execution failed: NameError")
+
+    monkeypatch.setattr(agent, '_execute_code', crash)
+
+    async def scenario():
+        first = await agent.execute({'enhanced_specification': 'A line plot'})
+        second = await agent.execute({'enhanced_specification': 'A line plot'})
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert not first.success and not second.success
+    assert agent.llm.calls == 2
+    assert agent.cache.summary()['entries'] == 0
+
+
+def test_responses_are_cached_until_bypassed(tmp_path):
+    agent = _agent(tmp_path)
+
+    async def generate_twice(bypass: bool):
+        if bypass:
+            bypass_response_cache()
+        await agent.generate_content("prompt")
+        await agent.generate_content("prompt")
+
+    asyncio.run(generate_twice(False))
+    assert agent.llm.calls == 1
+
+    agent.llm.text = "fresh"
+    asyncio.run(generate_twice(True))
+    assert agent.llm.calls == 3
+
+    # The bypass only applies to the context that asked for it, and the
+    # fresh response replaced the stale one
+    assert asyncio.run(agent.generate_content("prompt")) == "fresh"
+    assert agent.llm.calls == 3
+
+
+def test_delete_removes_memory_and_disk_entries(tmp_path):
+    cache = ContentCache('test', disk_dir=str(tmp_path))
+
+    async def scenario():
+        key = cache.make_key('a')
+        await cache.set(key, b'value')
+        await cache.delete(key)
+        cache.clear()
+        return await cache.get(key)
+
+    assert asyncio.run(scenario()) is None
@@ -0,0 +1,112 @@
+import asyncio
+import pytest
+from services.jobs import JobManager
+from services.scheduler import GenerationScheduler, QueueFull
+
+
+async def _events(count: int, delay: float = 0):
+    for index in range(count):
+        await asyncio.sleep(delay)
+        yield {'type': 'status', 'data': {'index': index}}
+    yield {'type': 'complete', 'data': {}}
+
+
+def _submit(manager: JobManager, scheduler: GenerationScheduler, user_id: str, count: int = 2, delay: float = 0):
+    ticket = scheduler.reserve(user_id)
+    job = manager.submit(
+        lambda: scheduler.run(ticket, lambda: _events(count, delay)),
+        on_done=lambda: scheduler.release(ticket)
+    )
+    return ticket, job
+
+
+def test_slot_is_released_when_job_is_cancelled_before_first_event(tmp_path):
+    async def scenario():
+        scheduler = GenerationScheduler(max_concurrency=1)
+        manager = JobManager(str(tmp_path))
+        _, first = _submit(manager, scheduler, 'alice')
+        first.cancel('Cancelled by the user')
+        await asyncio.gather(first.task, return_exceptions=True)
+        after_cancel = scheduler.summary()
+
+        _, second = _submit(manager, scheduler, 'alice')
+        await asyncio.wait_for(second.task, 1)
+        return after_cancel, second, scheduler.summary()
+
+    after_cancel, second, summary = asyncio.run(scenario())
+    assert after_cancel['running'] == 0
+    assert after_cancel['queued'] == 0
+    assert second.status == 'complete'
+    assert summary['running'] == 0
+
+
+def test_queued_ticket_is_removed_when_its_job_is_cancelled(tmp_path):
+    async def scenario():
+        scheduler = GenerationScheduler(max_concurrency=1)
+        manager = JobManager(str(tmp_path))
+        _, running = _submit(manager, scheduler, 'alice', count=20, delay=0.01)
+        _, waiting = _submit(manager, scheduler, 'bob')
+        await asyncio.sleep(0.02)
+        assert scheduler.summary()['queued'] == 1
+        waiting.cancel('Cancelled by the user')
+        await asyncio.gather(waiting.task, return_exceptions=True)
+        queued = scheduler.summary()['queued']
+        await running.task
+        return queued, scheduler.summary()
+
+    queued, summary = asyncio.run(scenario())
+    assert queued == 0
+    assert summary['running'] == 0
+
+
+def test_users_are_served_round_robin():
+    async def scenario():
+        scheduler = GenerationScheduler(max_concurrency=1)
+        first = scheduler.reserve('alice')
+        queued = [scheduler.reserve('alice'), scheduler.reserve('alice'), scheduler.reserve('bob')]
+        order = [scheduler.position(ticket) for ticket in queued]
+        scheduler.release(first)
+        return first, queued, order
+
+    first, queued, order = asyncio.run(scenario())
+    assert first.granted.is_set()
+    # bob's first ticket goes ahead of alice's second
+    assert order == [1, 3, 2]
+    assert queued[0].granted.is_set()
+
+
+def test_per_user_queue_limit():
+    async def scenario():
+        scheduler = GenerationScheduler(max_concurrency=1, max_queued_per_user=1)
+        scheduler.reserve('alice')
+        scheduler.reserve('alice')
+        with pytest.raises(QueueFull):
+            scheduler.reserve('alice')
+        scheduler.reserve('bob')
+
+    asyncio.run(scenario())
+
+
+def test_run_reserved_counts_each_unit_against_the_cap():
+    async def scenario():
+        scheduler = GenerationScheduler(max_concurrency=1)
+        active = []
+        peak = []
+
+        async def work():
+            active.append(1)
+            peak.append(len(active))
+            await asyncio.sleep(0.01)
+            active.pop()
+            yield {'type': 'complete', 'data': {}}
+
+        async def consume():
+            return [event['type'] async for event in scheduler.run_reserved('alice', 'batch', work)]
+
+        results = await asyncio.gather(*[consume() for _ in range(3)])
+        return results, peak, scheduler.summary()
+
+    results, peak, summary = asyncio.run(scenario())
+    assert max(peak) == 1
+    assert all(events[-1] == 'complete' for events in results)
+    assert summary['completed'] == 3 and summary['running'] == 0
@@ -0,0 +1,81 @@
+import pytest
+from agents.semantic_cache import SemanticCache, embed, signature
+
+
+# Calibration pairs for the default threshold: rewordings that mean the same
+# figure must hit, requests for a different figure must miss
+SAME_FIGURE = [
+    ("Bar chart comparing accuracy of three models on CIFAR-10",
+     "Bar chart comparing the accuracy of three models on CIFAR-10"),
+    ("Schematic of a neural network with 3 hidden layers",
+     "schematic of a neural network with 3 hidden layers."),
+    ("Flowchart of the sample preparation protocol",
+     "Flowchart showing the sample preparation protocol"),
+    ("Show a histogram of reaction times", "Show a histogram of the reaction times"),
+]
+DIFFERENT_FIGURE = [
+    ("Neural network with 3 layers", "Neural network with 5 layers"),
+    ("Bar chart of salaries for men", "Bar chart of salaries for women"),
+    ("Line plot of accuracy, no legend", "Line plot of accuracy, with legend"),
+    ("Training accuracy over epochs", "Training loss over epochs"),
+    ("Scatter plot of height versus weight", "Scatter plot of weight versus height"),
+    ("Histogram of reaction times for the control group",
+     "Histogram of reaction times for the treatment group"),
+    ("Plot the accuracy of the model per epoch",
+     "Plot the accuracy of the model per epoch, in log scale"),
+    ("Network with two branches", "Network with three branches"),
+]
+
+
+def _cache() -> SemanticCache:
+    return SemanticCache(max_entries=8, threshold=0.95, dimensions=2048)
+
+
+@pytest.mark.parametrize('stored,request_text', SAME_FIGURE)
+def test_rewordings_of_the_same_figure_hit(stored, request_text):
+    cache = _cache()
+    cache.store(stored, 'scope', {'specification': 'plan'})
+    assert cache.lookup(request_text, 'scope') is not None
+
+
+@pytest.mark.parametrize('stored,request_text', DIFFERENT_FIGURE)
+def test_different_figures_miss(stored, request_text):
+    cache = _cache()
+    cache.store(stored, 'scope', {'specification': 'plan'})
+    assert cache.lookup(request_text, 'scope') is None
+
+
+def test_numbers_and_negations_must_match():
+    assert signature("3 layers, no legend") == signature("no legend and 3 layers")
+    assert signature("3 layers") != signature("5 layers")
+    assert signature("with a legend") != signature("without a legend")
+
+
+def test_lookup_is_limited_to_its_scope():
+    cache = _cache()
+    cache.store("Phase diagram of water", 'alice', {'specification': 'plan'})
+    assert cache.lookup("Phase diagram of water", 'bob') is None
+    assert cache.lookup("Phase diagram of water", 'alice') is not None
+
+
+def test_entries_of_a_batch_do_not_answer_the_same_batch():
+    cache = _cache()
+    cache.store("Bar chart of yield by catalyst", 'scope', {'specification': 'plan'}, group='batch-1')
+    assert cache.lookup("Bar chart of yield by catalyst", 'scope', exclude_group='batch-1') is None
+    assert cache.lookup("Bar chart of yield by catalyst", 'scope', exclude_group='batch-2') is not None
+
+
+def test_update_after_eviction_is_ignored():
+    cache = SemanticCache(max_entries=1, threshold=0.95, dimensions=256)
+    first = cache.store("Phase diagram of water", 'scope', {'specification': 'a'})
+    cache.store("Phase diagram of carbon dioxide", 'scope', {'specification': 'b'})
+    cache.update(first, enhanced_specification='stale')
+
+    entry_id, _, value = cache.lookup("Phase diagram of carbon dioxide", 'scope')
+    assert entry_id != first
+    assert 'enhanced_specification' not in value
+
+
+def test_embedding_is_normalized():
+    vector = embed("Phase diagram of water")
+    assert abs(float(vector @ vector) - 1) < 1e-6
@@ -0,0 +1,75 @@
+import asyncio
+import pytest
+from agents.semantic_cache import SemanticCache
+from agents.style_presets import get_style_preset, wants_custom_style
+
+
+@pytest.mark.parametrize('request_text', [
+    'dark matter density profile of a galaxy halo',
+    'scatter of cells colored by expression level',
+    'bar chart with a color for each condition',
+    'the layer style of a convolutional network'
+])
+def test_data_descriptions_keep_the_preset(request_text):
+    assert not wants_custom_style(request_text)
+
+
+@pytest.mark.parametrize('request_text', [
+    'use a dark theme',
+    'xkcd-style sketch of a pendulum',
+    'plot it in grayscale for print',
+    'set the font to Times New Roman',
+    'a bar chart in the style of The Economist',
+    'pick a different color scheme'
+])
+def test_style_requests_take_the_stylist(request_text):
+    assert wants_custom_style(request_text)
+
+
+def test_presets_resolve_domain_aliases_and_figure_category():
+    assert get_style_preset('Physics', 'time_series')['name'] == 'motion-chart'
+    assert get_style_preset('biology', 'flowchart')['name'] == 'mind-diagram'
+    assert get_style_preset('astrology', 'plot')['name'] == 'general-chart'
+    assert get_style_preset('math', 'plot')['rc_params']['font.family'] == 'serif'
+
+
+def _visualizer_inputs(orchestrator, monkeypatch, prompt):
+    inputs = []
+    visualize = orchestrator.visualizer.execute
+
+    async def record(input_data):
+        inputs.append(input_data)
+        return await visualize(input_data)
+
+    monkeypatch.setattr(orchestrator.visualizer, 'execute', record)
+
+    async def collect():
+        [event async for event in orchestrator.generate_diagram(
+            prompt=prompt, diagram_type='statistical', domain='mind', user_id='u'
+        )]
+        await orchestrator.persistence.close()
+
+    asyncio.run(collect())
+    return inputs
+
+
+def test_preset_styles_a_plain_request(orchestrator, monkeypatch):
+    inputs = _visualizer_inputs(orchestrator, monkeypatch, 'Line plot of loss')
+
+    assert inputs[0]['rc_params'] == get_style_preset('mind', 'statistical')['rc_params']
+    assert 'Style preset: Mind chart' in inputs[0]['enhanced_specification']
+
+
+def test_cached_styling_takes_precedence_over_the_preset(orchestrator, monkeypatch):
+    prompt = 'Line plot of training loss per epoch'
+    orchestrator.semantic_cache = SemanticCache()
+    scope = orchestrator._cache_scope('u', 'statistical', 'mind', None)
+    orchestrator.semantic_cache.store(prompt, scope, {
+        'specification': 'Plan: loss against epoch',
+        'enhanced_specification': 'Plan: loss against epoch, in neon on black'
+    })
+
+    inputs = _visualizer_inputs(orchestrator, monkeypatch, prompt)
+
+    assert inputs[0]['enhanced_specification'] == 'Plan: loss against epoch, in neon on black'
+    assert inputs[0]['rc_params'] is None
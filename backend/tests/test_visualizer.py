@@ -0,0 +1,73 @@
+import asyncio
+from agents.cache import ContentCache
+from agents.visualizer_agent import VisualizerAgent
+
+
+CODE = "fig, ax = plt.subplots()\nax.plot([1, 2])\nax.set_title('Old')"
+
+
+class ScriptedLLM:
+    def __init__(self, *responses: str):
+        self.responses = list(responses)
+        self.prompts = []
+
+    async def generate(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        return self.responses.pop(0)
+
+
+def _agent(tmp_path, *responses: str) -> VisualizerAgent:
+    agent = VisualizerAgent(blob_store=object())
+    agent.llm = ScriptedLLM(*responses)
+    agent.cache = ContentCache('test', disk_dir=str(tmp_path))
+    return agent
+
+
+def _block(search: str, replace: str) -> str:
+    return f"<<<<<<< SEARCH\n{search}\n=======\n{replace}\n>>>>>>> REPLACE"
+
+
+def test_apply_patch_replaces_each_block_once():
+    agent = VisualizerAgent(blob_store=object())
+    patch = '\n'.join([
+        _block("ax.set_title('Old')", "ax.set_title('New')"),
+        _block("ax.plot([1, 2])", "ax.plot([1, 2], marker='o')")
+    ])
+
+    assert agent._apply_patch(CODE, patch) == (
+        "fig, ax = plt.subplots()\nax.plot([1, 2], marker='o')\nax.set_title('New')"
+    )
+
+
+def test_apply_patch_rejects_unknown_search_text_and_prose():
+    agent = VisualizerAgent(blob_store=object())
+
+    assert agent._apply_patch(CODE, _block("ax.legend()", "ax.legend(loc='best')")) is None
+    assert agent._apply_patch(CODE, "Add a legend and a larger title.") is None
+
+
+def test_failed_patch_regenerates_with_the_feedback(tmp_path, monkeypatch):
+    spec = 'A line plot of two points'
+    agent = _agent(tmp_path, CODE, 'Add a legend.', CODE.replace('Old', 'New'))
+
+    async def render(*args, **kwargs):
+        return {}
+
+    monkeypatch.setattr(agent, '_execute_code', render)
+
+    async def scenario():
+        first = await agent.execute({'enhanced_specification': spec})
+        second = await agent.execute({
+            'enhanced_specification': spec,
+            'previous_code': first.data['code'],
+            'improvements': '1. Add a legend for the series'
+        })
+        return first, second
+
+    first, second = asyncio.run(scenario())
+
+    assert second.success and second.data['refinement'] == 'regenerate'
+    assert second.data['code'] != first.data['code']
+    regenerate_prompt = agent.llm.prompts[2]
+    assert regenerate_prompt != agent.llm.prompts[0]
+    assert 'Add a legend for the series' in regenerate_prompt
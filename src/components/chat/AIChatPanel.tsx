@@ -42,6 +42,15 @@ export function AIChatPanel({ isOpen, onToggle }: AIChatPanelProps) {
     return () => { document.body.style.overflow = ''; };
   }, [isMobile, isOpen]);
 
+  useEffect(() => {
+    if (!diagramState.isGenerating || !diagramState.streamingText) return;
+    setMessages(prev => {
+      const lastMessage = prev[prev.length - 1];
+      if (!lastMessage || lastMessage.role !== 'assistant') return prev;
+      return [...prev.slice(0, -1), { ...lastMessage, content: diagramState.streamingText }];
+    });
+  }, [diagramState.isGenerating, diagramState.streamingText]);
+
   useEffect(() => {
     if (!diagramState.isGenerating && messages.length > 0) {
       const lastMessage = messages[messages.length - 1];
@@ -1,4 +1,4 @@
-import { useState, useCallback } from 'react';
+import { useState, useCallback, useRef } from 'react';
 
 export interface DiagramGenerationState {
   isGenerating: boolean;
@@ -8,6 +8,8 @@ export interface DiagramGenerationState {
   imageData: string | null;
   error: string | null;
   figureId: string | null;
+  streamingAgent: string | null;
+  streamingText: string;
 }
 
 export interface GenerationEvent {
@@ -15,6 +17,23 @@ export interface GenerationEvent {
   data: any;
 }
 
+export interface ImageRef {
+  id: string;
+  url: string;
+  format: string;
+  size: number;
+  width?: number;
+  height?: number;
+}
+
+const apiUrl = import.meta.env.VITE_BACKEND_URL || '';
+
+const MAX_RECONNECTS = 5;
+const RECONNECT_DELAY_MS = 1000;
+
+const imageUrl = (image?: ImageRef | null): string | null =>
+  image ? `${apiUrl}${image.url}` : null;
+
 export function useDiagramGeneration() {
   const [state, setState] = useState<DiagramGenerationState>({
     isGenerating: false,
@@ -24,7 +43,11 @@ export function useDiagramGeneration() {
     imageData: null,
     error: null,
     figureId: null,
+    streamingAgent: null,
+    streamingText: '',
   });
+  // Retrying a request that just failed asks the server to skip its caches
+  const failedRequest = useRef<string | null>(null);
 
   const generateDiagram = useCallback(
     async (
@@ -35,6 +58,8 @@ export function useDiagramGeneration() {
       projectId?: string,
       dataInfo?: any
     ) => {
+      const requestKey = JSON.stringify([prompt, type, domain, userId, projectId, dataInfo]);
+      const refresh = failedRequest.current === requestKey;
       setState({
         isGenerating: true,
         currentStage: 'init',
@@ -43,11 +68,62 @@ export function useDiagramGeneration() {
         imageData: null,
         error: null,
         figureId: null,
+        streamingAgent: null,
+        streamingText: '',
       });
 
+      const handleEvent = (event: GenerationEvent) => {
+        if (event.type === 'status') {
+          setState((prev) => ({
+            ...prev,
+            currentStage: event.data.stage || '',
+            message: event.data.message || '',
+            iteration: event.data.iteration || prev.iteration,
+          }));
+        } else if (event.type === 'queued') {
+          setState((prev) => ({
+            ...prev,
+            currentStage: 'queued',
+            message: event.data.message || '',
+          }));
+        } else if (event.type === 'agent_delta') {
+          setState((prev) => ({
+            ...prev,
+            streamingAgent: event.data.agent,
+            streamingText:
+              prev.streamingAgent === event.data.agent
+                ? prev.streamingText + event.data.delta
+                : event.data.delta,
+          }));
+        } else if (event.type === 'image_preview') {
+          setState((prev) => ({
+            ...prev,
+            imageData: imageUrl(event.data.image),
+            iteration: event.data.iteration || prev.iteration,
+          }));
+        } else if (event.type === 'complete') {
+          failedRequest.current = null;
+          setState((prev) => ({
+            ...prev,
+            isGenerating: false,
+            imageData: imageUrl(event.data.data.image) || prev.imageData,
+            figureId: event.data.figure_id,
+            message: 'Complete!',
+          }));
+        } else if (event.type === 'error' || event.type === 'cancelled') {
+          if (event.type === 'error') {
+            failedRequest.current = requestKey;
+          }
+          setState((prev) => ({
+            ...prev,
+            isGenerating: false,
+            error: event.data.message,
+          }));
+        }
+      };
+
       try {
-        const apiUrl = import.meta.env.VITE_BACKEND_URL || '';
-        const response = await fetch(`${apiUrl}/api/figures/generate-stream`, {
+        let response = await fetch(`${apiUrl}/api/figures/generate-stream`, {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
@@ -59,65 +135,78 @@ export function useDiagramGeneration() {
             user_id: userId,
             project_id: projectId,
             data_info: dataInfo,
+            refresh,
           }),
         });
 
-        if (!response.ok || !response.body) {
-          throw new Error('Failed to start generation');
-        }
-
-        const reader = response.body.getReader();
-        const decoder = new TextDecoder();
+        const jobId = response.headers.get('X-Job-Id');
+        let lastEventId: string | null = null;
+        let finished = false;
+        let reconnects = 0;
 
         while (true) {
-          const { done, value } = await reader.read();
-
-          if (done) break;
-
-          const chunk = decoder.decode(value);
-          const lines = chunk.split('\n');
-
-          for (const line of lines) {
-            if (line.startsWith('data: ')) {
-              const jsonStr = line.slice(6);
-              try {
-                const event: GenerationEvent = JSON.parse(jsonStr);
-
-                if (event.type === 'status') {
-                  setState((prev) => ({
-                    ...prev,
-                    currentStage: event.data.stage || '',
-                    message: event.data.message || '',
-                    iteration: event.data.iteration || prev.iteration,
-                  }));
-                } else if (event.type === 'image_preview') {
-                  setState((prev) => ({
-                    ...prev,
-                    imageData: event.data.image_data,
-                    iteration: event.data.iteration || prev.iteration,
-                  }));
-                } else if (event.type === 'complete') {
-                  setState((prev) => ({
-                    ...prev,
-                    isGenerating: false,
-                    imageData: event.data.data.image_data || prev.imageData,
-                    figureId: event.data.figure_id,
-                    message: 'Complete!',
-                  }));
-                } else if (event.type === 'error') {
-                  setState((prev) => ({
-                    ...prev,
-                    isGenerating: false,
-                    error: event.data.message,
-                  }));
+          if (response.status === 429) {
+            const retryAfter = response.headers.get('Retry-After');
+            throw new Error(
+              `The server is busy. Please try again${retryAfter ? ` in ${retryAfter} seconds` : ' shortly'}.`
+            );
+          }
+          if (!response.ok || !response.body) {
+            throw new Error('Failed to start generation');
+          }
+
+          const reader = response.body.getReader();
+          const decoder = new TextDecoder();
+          let buffer = '';
+
+          try {
+            while (true) {
+              const { done, value } = await reader.read();
+
+              if (done) break;
+
+              buffer += decoder.decode(value, { stream: true });
+              const lines = buffer.split('\n');
+              buffer = lines.pop() || '';
+
+              for (const line of lines) {
+                if (line.startsWith('id: ')) {
+                  lastEventId = line.slice(4);
+                } else if (line.startsWith('data: ')) {
+                  const jsonStr = line.slice(6);
+                  try {
+                    const event: GenerationEvent = JSON.parse(jsonStr);
+                    if (['complete', 'error', 'cancelled'].includes(event.type)) {
+                      finished = true;
+                    }
+                    handleEvent(event);
+                  } catch (e) {
+                    console.error('Failed to parse SSE event:', e);
+                  }
                 }
-              } catch (e) {
-                console.error('Failed to parse SSE event:', e);
               }
             }
+          } catch (e) {
+            console.warn('Generation stream interrupted:', e);
           }
+
+          if (finished || !jobId || reconnects >= MAX_RECONNECTS) {
+            break;
+          }
+
+          // The job keeps running server-side; pick the stream back up where it dropped
+          reconnects += 1;
+          await new Promise((resolve) => setTimeout(resolve, RECONNECT_DELAY_MS * reconnects));
+          response = await fetch(`${apiUrl}/api/figures/jobs/${jobId}/events`, {
+            headers: lastEventId ? { 'Last-Event-ID': lastEventId } : {},
+          });
+        }
+
+        if (!finished) {
+          throw new Error('Lost connection to the generation stream');
         }
       } catch (error) {
+        failedRequest.current = requestKey;
         setState((prev) => ({
           ...prev,
           isGenerating: false,
@@ -137,6 +226,8 @@ export function useDiagramGeneration() {
       imageData: null,
       error: null,
       figureId: null,
+      streamingAgent: null,
+      streamingText: '',
     });
   }, []);
 